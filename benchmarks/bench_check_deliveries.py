@@ -0,0 +1,151 @@
+"""
+Offline benchmark of the package deliveries scan.
+
+Generates synthetic mailboxes of the given sizes, serves them from the in-process IMAP
+stand-in and reports the time per scan stage, the bytes transferred and the peak RSS:
+
+    python benchmarks/bench_check_deliveries.py --sizes 100 1000 10000
+    python benchmarks/bench_check_deliveries.py --sizes 100000 --search_mode client --incremental
+    python benchmarks/bench_check_deliveries.py --sizes 100000 --delivery_ratio 0.5 --backfill --workers 4
+    python benchmarks/bench_check_deliveries.py --sizes 10000 --status
+
+With --status the parcels of the first size are then tracked against the local status stub.
+"""
+
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "custom_components", "package_deliveries", "custom_scripts"))
+
+import check_package_deliveries as engine  # noqa: E402
+from corpus import generate_corpus, write_eml  # noqa: E402
+from fake_imap import FakeConnectionPool, FakeIMAP4  # noqa: E402
+from status_stub import StubStatusServer  # noqa: E402
+
+
+STAGES = ["search", "fetch_headers", "classify", "fetch_bodies", "decode", "extract", "merge", "sort"]
+
+
+def peak_rss_mb():
+    # ru_maxrss is reported in KiB on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_scan(mail, args, state, parse_executor=None):
+    stats = engine.ScanStats()
+    bytes_before = mail.bytes_sent
+    started = time.perf_counter()
+    deliveries = engine.scan_sources([args], state, FakeConnectionPool(mail), stats=stats, parse_executor=parse_executor)
+    total = time.perf_counter() - started
+    return deliveries, stats.as_dict(), total, mail.bytes_sent - bytes_before
+
+
+def run_local_scan(args, state):
+    stats = engine.ScanStats()
+    started = time.perf_counter()
+    deliveries = engine.scan_sources([args], state, stats=stats)
+    return deliveries, stats.as_dict(), time.perf_counter() - started, 0
+
+
+def print_row(label, size, deliveries, stats, total, transferred):
+    timings = stats["timings_ms"]
+    counters = stats["counters"]
+    columns = " ".join(f"{timings.get(stage, 0.0):>9.1f}" for stage in STAGES)
+    print(f"{label:<12} {size:>7} {columns} {total * 1000:>9.1f} {transferred / 1024:>10.0f} "
+          f"{counters.get('delivery_emails', 0):>6} {len(deliveries):>6} {peak_rss_mb():>8.0f}")
+
+
+def run_status_rounds(deliveries, rounds):
+    """
+    Tracks the parcels against the status stub. Every round looks up all parcels not yet
+    delivered (TTL 0), the stub advances each one per lookup; a last round with the default
+    TTL is served from the cache.
+    """
+    with StubStatusServer() as stub:
+        provider = engine.JsonStatusProvider(stub.url, rate=0)
+        tracker = engine.StatusTracker([provider], ttl=0)
+        for round_number in range(1, rounds + 2):
+            if round_number > rounds:
+                tracker.ttl = engine.DEFAULT_TTL
+            stats = engine.ScanStats()
+            requests_before = stub.requests
+            started = time.perf_counter()
+            statuses = tracker.update(deliveries, stats)
+            total = time.perf_counter() - started
+            delivered = sum(1 for status in statuses.values() if status.delivered)
+            label = "cached" if round_number > rounds else f"round {round_number}"
+            print(f"status {label:<8} {len(statuses):>6} numbers {stats.counters.get('status_lookups', 0):>6} lookups "
+                  f"{stub.requests - requests_before:>5} requests {stats.counters.get('status_cache_hits', 0):>6} cached "
+                  f"{delivered:>6} delivered {total * 1000:>9.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark check_deliveries on a synthetic mailbox.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000], help="Mailbox sizes to benchmark.")
+    parser.add_argument("--delivery_ratio", type=float, default=0.1, help="Share of delivery notifications in the corpus.")
+    parser.add_argument("--last_days", type=int, default=30, help="Search window, the corpus spans the same number of days.")
+    parser.add_argument("--search_mode", default="server", choices=["server", "client"], help="Search mode of the scan.")
+    parser.add_argument("--max_message_bytes", type=int, default=engine.DEFAULT_MAX_MESSAGE_BYTES, help="Body cap per email.")
+    parser.add_argument("--incremental", action="store_true", help="Use a sync state file and run a second, incremental scan.")
+    parser.add_argument("--write_eml", default=None, help="Also write the corpus of the first size as .eml files to this directory.")
+    parser.add_argument("--backfill", action="store_true", help="Also run the scan with the bodies parsed in worker processes.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Number of worker processes of the backfill run.")
+    parser.add_argument("--status", action="store_true", help="Track the parcels of the first size against the local status stub.")
+    parser.add_argument("--status_rounds", type=int, default=5, help="Lookup rounds of --status.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the corpus generator.")
+    args = parser.parse_args()
+    parse_executor = ProcessPoolExecutor(max_workers=args.workers) if args.backfill else None
+
+    print(f"{'run':<12} {'emails':>7} " + " ".join(f"{stage[:9]:>9}" for stage in STAGES)
+          + f" {'total ms':>9} {'KiB sent':>10} {'notif':>6} {'parcels':>6} {'RSS MiB':>8}")
+
+    tracked_deliveries = None
+    for index, size in enumerate(args.sizes):
+        corpus = generate_corpus(size, args.delivery_ratio, days=args.last_days, seed=args.seed)
+        if args.write_eml and index == 0:
+            write_eml(corpus, args.write_eml)
+
+        mail = FakeIMAP4(corpus)
+        scan_args = engine.scan_options(
+            "bench@example.com", "secret", imap_server="bench.local", last_days=args.last_days,
+            last_emails=size, search_mode=args.search_mode, max_message_bytes=args.max_message_bytes,
+            workers=args.workers,
+        )
+
+        with tempfile.TemporaryDirectory() as state_dir:
+            state = engine.SyncStateStore(os.path.join(state_dir, "state.db"), engine.PARSER_VERSION) if args.incremental else None
+            result = run_scan(mail, scan_args, state)
+            print_row("full", size, *result)
+            if index == 0:
+                tracked_deliveries = result[0]
+            if state is not None:
+                print_row("incremental", size, *run_scan(mail, scan_args, state))
+                state.close()
+        if args.write_eml and index == 0:
+            # The same corpus read from disk, the second run only stats the unchanged files
+            local_args = engine.source_options(scan_args, local_path=args.write_eml)
+            with tempfile.TemporaryDirectory() as state_dir:
+                state = engine.SyncStateStore(os.path.join(state_dir, "state.db"), engine.PARSER_VERSION)
+                print_row("local eml", size, *run_local_scan(local_args, state))
+                print_row("local again", size, *run_local_scan(local_args, state))
+                state.close()
+        if parse_executor is not None:
+            # Decode and extract are summed over the worker processes, total ms is the wall time
+            print_row(f"backfill x{args.workers}", size, *run_scan(mail, scan_args, None, parse_executor))
+
+    if parse_executor is not None:
+        parse_executor.shutdown()
+
+    if args.status:
+        print()
+        run_status_rounds(tracked_deliveries, args.status_rounds)
+
+
+if __name__ == "__main__":
+    main()
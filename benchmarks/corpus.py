@@ -0,0 +1,141 @@
+"""
+Synthetic mailbox corpus for benchmarking the package deliveries scan.
+
+Delivery notifications (Amazon, DHL, DPD, Hermes, GLS, UPS) are rendered per message
+with their own tracking numbers; the noise mails (newsletters, HTML marketing, mails
+with PDF attachments) share a small set of pre-rendered bodies to keep large corpora cheap.
+"""
+
+import os
+import random
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+from email.utils import format_datetime, make_msgid
+
+
+GERMAN_WEEKDAYS = ["Montag", "Dienstag", "Mittwoch", "Donnerstag", "Freitag", "Samstag", "Sonntag"]
+GERMAN_MONTHS = ["Januar", "Februar", "März", "April", "Mai", "Juni", "Juli", "August", "September", "Oktober", "November", "Dezember"]
+ITEMS = ["USB-C Ladekabel 2m", "Kaffeebohnen 1kg Espresso", "Taschenbuch: Der Prozess", "LED Leuchtmittel E27 4er Pack",
+         "Zahnbürstenaufsätze 8 Stück", "HDMI Kabel 4K", "Notizbuch A5 kariert", "Batterien AA 20 Stück"]
+
+
+class CorpusMessage:
+    """One message of the corpus, split into its header block and its (possibly shared) body."""
+
+    __slots__ = ("date", "headers", "body")
+
+    def __init__(self, date, headers, body):
+        self.date = date
+        self.headers = headers
+        self.body = body
+
+    def as_bytes(self):
+        return self.headers + b"\r\n" + self.body
+
+
+def _split(message):
+    raw = message.as_bytes(policy=message.policy.clone(linesep="\r\n"))
+    headers, _, body = raw.partition(b"\r\n\r\n")
+    return headers + b"\r\n", body
+
+
+def _render(sender, subject, date, mime_headers, body):
+    headers = (
+        f"From: {sender}\r\n"
+        f"Subject: {subject}\r\n"
+        f"Date: {format_datetime(date)}\r\n"
+        f"Message-ID: {make_msgid(domain='bench.local')}\r\n"
+    ).encode("utf-8") + mime_headers
+    return CorpusMessage(date, headers, body)
+
+
+def _delivery_message(rng, kind, date, tracking=None):
+    tracking = tracking or "".join(rng.choice("0123456789") for _ in range(20))
+    eta = date + timedelta(days=rng.randint(1, 3))
+    message = EmailMessage()
+    if kind == "Amazon":
+        order = f"30{rng.randint(2, 9)}-{rng.randint(1000000, 9999999)}-{rng.randint(1000000, 9999999)}"
+        items = "\n".join(rng.sample(ITEMS, rng.randint(1, 3)))
+        text = (f"Hallo,\nIhre Bestellung wurde versandt.\nZustellung: {eta.day} {GERMAN_MONTHS[eta.month - 1]}\n"
+                f"Bestellnummer: {order}\nPaketverfolgungsnummern: {tracking}.\n"
+                f"Gesamtbetrag der Bestellung: {rng.randint(5, 200)},{rng.randint(0, 99):02d} €\n"
+                f"Bestellübersicht\n{items}\nVerkauft von Amazon EU S.a.r.L.\n")
+        message.set_content(text)
+        message.add_alternative("<html><body>" + text.replace("\n", "<br>") * 20 + "</body></html>", subtype="html")
+        sender, subject = '"Amazon.de" <versandbestaetigung@amazon.de>', "Ihre Amazon.de Bestellung wurde versandt!"
+    elif kind == "DHL":
+        message.set_content(f"Ihre Sendung kommt voraussichtlich am {GERMAN_WEEKDAYS[eta.weekday()]}, den {eta:%d.%m.}\n"
+                            f"https://www.dhl.de/de/privatkunden/pakete-empfangen/verfolgen.html?piececode={tracking}&lang=de\n")
+        sender, subject = "DHL Paket <noreply@dhl.de>", "Ihre Amazon Sendung ist unterwegs"
+    elif kind == "DPD":
+        html = (f"<p>Versender &amp; Paketnummer:</p><b>Shop GmbH</b><i>{tracking[:14]}</i>"
+                f"<p>Ihr Paket kommt in 1-2 Werktagen.</p>")
+        message.set_content(f"Paket {tracking[:14]} kommt in 1-2 Werktagen")
+        message.add_alternative(html, subtype="html")
+        sender, subject = "DPD <noreply@dpd.de>", "Bald ist Ihr DPD Paket da"
+    elif kind == "Hermes":
+        message.set_content(f"Sendungsnummer: H{tracking[:19]}\nZustellung voraussichtlich am {eta:%d.%m.}\n")
+        sender, subject = "Hermes <noreply@paketankuendigung.myhermes.de>", "Ihre Hermes Sendung ist unterwegs"
+    elif kind == "GLS":
+        message.set_content(f"Paketnummer: {tracking[:11]}\nZustellung am {eta:%d.%m.}\n")
+        sender, subject = "GLS <noreply@gls-pakete.de>", "Ihr GLS Paket kommt"
+    else:
+        ups = "1Z" + "".join(rng.choice("0123456789ABCDEFGHJKLMNPRSTUVWXYZ") for _ in range(16))
+        message.set_content(f"Sendung {ups}\nVoraussichtliche Zustellung: {eta:%d.%m.}\n")
+        sender, subject = "UPS <mcinfo@ups.com>", "UPS Update: Paketzustellung"
+    mime_headers, body = _split(message)
+    return _render(sender, subject, date, mime_headers, body)
+
+
+def _noise_templates(rng, count=40):
+    templates = []
+    for index in range(count):
+        message = EmailMessage()
+        paragraphs = rng.randint(20, 2000)
+        message.set_content(f"Newsletter {index}\n" + "Angebote der Woche.\n" * paragraphs)
+        message.add_alternative("<html><body>" + "<div class='promo'><img src='cid:x'>Rabatt!</div>" * paragraphs
+                                + "</body></html>", subtype="html")
+        if index % 5 == 0:
+            message.add_attachment(rng.randbytes(300 * 1024), maintype="application", subtype="pdf", filename="rechnung.pdf")
+        templates.append(_split(message))
+    return templates
+
+
+def generate_corpus(size, delivery_ratio=0.1, days=30, seed=0, now=None):
+    """
+    Returns size CorpusMessages sorted by date (oldest first, like UIDs), spread over the last days.
+    """
+    rng = random.Random(seed)
+    now = now or datetime.now(timezone.utc)
+    noise = _noise_templates(rng)
+    kinds = ["Amazon", "DHL", "DPD", "Hermes", "GLS", "UPS"]
+    senders = ["newsletter@shop.example", "info@verein.example", "noreply@bank.example", "team@social.example"]
+
+    dates = sorted(now - timedelta(seconds=rng.randint(0, days * 86400)) for _ in range(size))
+    messages = []
+    amazon_parcels = []
+    for date in dates:
+        if rng.random() < delivery_ratio:
+            kind = rng.choice(kinds)
+            tracking = None
+            if kind == "Amazon":
+                tracking = "".join(rng.choice("0123456789") for _ in range(20))
+                amazon_parcels.append(tracking)
+            elif kind == "DHL" and amazon_parcels and rng.random() < 0.5:
+                # Half of the DHL notifications announce a parcel Amazon shipped before, these get merged
+                tracking = amazon_parcels.pop()
+            messages.append(_delivery_message(rng, kind, date, tracking))
+        else:
+            mime_headers, body = rng.choice(noise)
+            messages.append(_render(rng.choice(senders), f"Angebote KW {date.isocalendar()[1]}", date, mime_headers, body))
+    return messages
+
+
+def write_eml(messages, directory):
+    """
+    Writes the corpus as numbered .eml files.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for index, message in enumerate(messages, start=1):
+        with open(os.path.join(directory, f"{index:06d}.eml"), "wb") as eml_file:
+            eml_file.write(message.as_bytes())
@@ -0,0 +1,186 @@
+"""
+In-process stand-in for an IMAP server, implementing the part of the imaplib.IMAP4 API the
+scan engine uses (SELECT, UID SEARCH, UID FETCH, NOOP, LOGOUT) over a CorpusMessage list.
+It counts the bytes it returns so benchmarks can report transfer volume.
+"""
+
+import re
+from contextlib import contextmanager
+from functools import lru_cache
+from datetime import datetime
+from email.header import decode_header, make_header
+
+
+TOKEN_PATTERN = re.compile(r'\(|\)|"(?:[^"\\]|\\.)*"|[^\s()]+')
+HEADER_FIELDS_PATTERN = re.compile(r'BODY\.PEEK\[HEADER\.FIELDS \(([^)]*)\)\]')
+PARTIAL_PATTERN = re.compile(r'BODY\.PEEK\[\]<0\.(\d+)>')
+
+
+def _parse_search(tokens):
+    """
+    Parses a token list into a nested criteria list; strings are unquoted.
+    """
+    criteria = []
+    while tokens:
+        token = tokens.pop(0)
+        if token == "(":
+            criteria.append(_parse_search(tokens))
+        elif token == ")":
+            return criteria
+        elif token.startswith('"'):
+            criteria.append(re.sub(r'\\(.)', r'\1', token[1:-1]))
+        else:
+            criteria.append(token)
+    return criteria
+
+
+@lru_cache(maxsize=None)
+def _parse_date(value):
+    return datetime.strptime(value, "%d-%b-%Y").date()
+
+
+class _MailboxMessage:
+    __slots__ = ("uid", "message", "date", "fields", "search_values")
+
+    def __init__(self, uid, message):
+        self.uid = uid
+        self.message = message
+        self.date = message.date.date()
+        self.fields = {}
+        for line in re.split(rb'\r\n(?![ \t])', message.headers):
+            name, _, value = line.partition(b":")
+            if value:
+                self.fields.setdefault(name.decode().strip().upper(), line + b"\r\n")
+        # Decoded once, so SEARCH timings reflect the scan rather than this stand-in
+        self.search_values = {name: self._header_value(name).lower() for name in ("FROM", "SUBJECT")}
+
+    def _header_value(self, name):
+        line = self.fields.get(name)
+        if line is None:
+            return ""
+        value = line.split(b":", 1)[1].decode("utf-8", errors="replace").strip()
+        try:
+            return str(make_header(decode_header(value)))
+        except (LookupError, UnicodeError):
+            # Like a real server, search the raw header if its encoded-words cannot be decoded
+            return value
+
+
+class FakeIMAP4:
+    """
+    Behaves like a logged-in imaplib.IMAP4 connection on a single folder.
+    """
+
+    capabilities = ("IMAP4REV1", "IDLE")
+
+    def __init__(self, messages, uidvalidity=1):
+        self.uidvalidity = uidvalidity
+        self.messages = {}
+        self.bytes_sent = 0
+        self.commands = 0
+        self._responses = {}
+        for message in messages:
+            self.append(message)
+
+    def append(self, message):
+        uid = max(self.messages, default=0) + 1
+        self.messages[uid] = _MailboxMessage(uid, message)
+        return uid
+
+    def login(self, user, password):
+        return "OK", [b"LOGIN completed"]
+
+    def select(self, mailbox="INBOX", readonly=False):
+        self.commands += 1
+        self._responses["UIDVALIDITY"] = [str(self.uidvalidity).encode()]
+        return "OK", [str(len(self.messages)).encode()]
+
+    def response(self, code):
+        return code, self._responses.pop(code, [None])
+
+    def noop(self):
+        return "OK", [b"NOOP completed"]
+
+    def logout(self):
+        return "BYE", [b"LOGOUT"]
+
+    def uid(self, command, *args):
+        self.commands += 1
+        command = command.upper()
+        if command == "SEARCH":
+            criteria = _parse_search(TOKEN_PATTERN.findall(args[-1]))
+            uids = [uid for uid, message in self.messages.items() if self._matches(message, list(criteria))]
+            data = " ".join(str(uid) for uid in uids).encode()
+            self.bytes_sent += len(data)
+            return "OK", [data]
+        if command == "FETCH":
+            return "OK", self._fetch(args[0], args[1])
+        raise NotImplementedError(command)
+
+    def _matches(self, message, criteria):
+        while criteria:
+            if not self._match_key(message, criteria):
+                return False
+        return True
+
+    def _match_key(self, message, criteria):
+        key = criteria.pop(0)
+        if isinstance(key, list):
+            return self._matches(message, list(key))
+        key = key.upper()
+        if key == "ALL":
+            return True
+        if key == "SINCE":
+            return message.date >= _parse_date(criteria.pop(0))
+        if key in ("FROM", "SUBJECT"):
+            return criteria.pop(0).lower() in message.search_values[key]
+        if key == "OR":
+            first = self._match_key(message, criteria)
+            second = self._match_key(message, criteria)
+            return first or second
+        raise NotImplementedError(key)
+
+    def _uids(self, uid_set):
+        for part in uid_set.split(","):
+            if ":" in part:
+                start, end = part.split(":")
+                yield from (uid for uid in range(int(start), int(end) + 1) if uid in self.messages)
+            elif int(part) in self.messages:
+                yield int(part)
+
+    def _fetch(self, uid_set, items):
+        header_fields = HEADER_FIELDS_PATTERN.search(items)
+        partial = PARTIAL_PATTERN.search(items)
+        response = []
+        for sequence, uid in enumerate(self._uids(uid_set), start=1):
+            message = self.messages[uid]
+            if header_fields:
+                names = header_fields.group(1).upper().split()
+                data = b"".join(message.fields.get(name, b"") for name in names) + b"\r\n"
+                item = f"BODY[HEADER.FIELDS ({' '.join(names)})]"
+            else:
+                data = message.message.as_bytes()
+                item = "BODY[]"
+                if partial:
+                    data = data[:int(partial.group(1))]
+                    item = "BODY[]<0>"
+            self.bytes_sent += len(data)
+            response.append((f"{sequence} (UID {uid} {item} {{{len(data)}}}".encode(), data))
+            response.append(b")")
+        return response
+
+
+class FakeConnectionPool:
+    """
+    Drop-in for ImapConnectionPool handing out the same FakeIMAP4 for every account.
+    """
+
+    def __init__(self, mail):
+        self.mail = mail
+
+    @contextmanager
+    def connection(self, imap_server, account, password):
+        yield self.mail
+
+    def close(self):
+        pass
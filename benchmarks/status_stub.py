@@ -0,0 +1,112 @@
+"""
+Local stand-in for a tracking service speaking the JSON protocol of JsonStatusProvider:
+GET /track?tracking_numbers=A,B answers {"A": {"status": "...", "description": "..."}, ...}.
+
+Every lookup advances a parcel by one status (pre_transit, transit, out_for_delivery,
+delivered), so repeated lookups show delivered parcels dropping out of polling. One in ten
+numbers is unknown to the stub and left out of the answer. It counts requests and looked up
+numbers and rejects batches larger than max_batch. Run it on its own for the CLI:
+
+    python benchmarks/status_stub.py --port 8080
+    python check_package_deliveries.py ... --status_url http://127.0.0.1:8080/track
+"""
+
+import argparse
+import json
+import threading
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+PROGRESSION = [
+    ("pre_transit", "Die Sendung wurde elektronisch angekündigt."),
+    ("transit", "Die Sendung wurde im Start-Paketzentrum bearbeitet."),
+    ("out_for_delivery", "Die Sendung wurde in das Zustellfahrzeug geladen."),
+    ("delivered", "Die Sendung wurde erfolgreich zugestellt."),
+]
+
+
+class StubStatusServer:
+    """Serves tracking statuses on 127.0.0.1 from a background thread, port 0 picks a free port."""
+
+    def __init__(self, port=0, max_batch=20):
+        self.max_batch = max_batch
+        self.requests = 0
+        self.lookups = 0
+        self._lookups_by_number = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}/track"
+
+    def statuses(self, numbers):
+        """Advances and returns the status of each known number."""
+        with self._lock:
+            self.requests += 1
+            self.lookups += len(numbers)
+            answer = {}
+            for number in numbers:
+                if zlib.crc32(number.encode()) % 10 == 0:
+                    continue
+                step = self._lookups_by_number.get(number, 0)
+                self._lookups_by_number[number] = step + 1
+                status, description = PROGRESSION[min(step, len(PROGRESSION) - 1)]
+                answer[number] = {"status": status, "description": description}
+            return answer
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                numbers = [number for number in parse_qs(url.query).get("tracking_numbers", [""])[0].split(",") if number]
+                if url.path != "/track" or not numbers:
+                    self.send_error(404)
+                    return
+                if len(numbers) > stub.max_batch:
+                    self.send_error(400, f"At most {stub.max_batch} tracking numbers per request")
+                    return
+                body = json.dumps(stub.statuses(numbers)).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve stub tracking statuses for JsonStatusProvider.")
+    parser.add_argument("--port", type=int, default=8080, help="Port to listen on.")
+    parser.add_argument("--max_batch", type=int, default=20, help="Tracking numbers accepted per request.")
+    args = parser.parse_args()
+    server = StubStatusServer(args.port, args.max_batch)
+    print(f"Serving tracking statuses at {server.url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
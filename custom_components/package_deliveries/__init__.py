@@ -9,16 +9,34 @@ Licensed under MIT. All rights reserved.
 
 import logging
 import voluptuous as vol
-from homeassistant.helpers.entity_registry import async_get as async_get_entity_registry
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+from homeassistant.core import SupportsResponse
+from homeassistant.exceptions import ServiceValidationError
 from homeassistant.helpers import config_validation as cv
 
-DOMAIN = "package_deliveries"
+from .coordinator import DOMAIN, IMAP_POOL, PackageDeliveriesCoordinator, slugify_name
+from .metrics import async_register_metrics_view
+
 _LOGGER = logging.getLogger(__name__)
 
+PLATFORMS = ["sensor"]
+
 # Define the schema for the service
 UPDATE_DELIVERIES_SCHEMA = vol.Schema({
     vol.Required("name"): cv.string,
 })
+GET_DELIVERIES_SCHEMA = vol.Schema({
+    vol.Required("name"): cv.string,
+})
+
+
+def get_coordinator(hass, sensor_name):
+    """Find the coordinator of a sensor by its name, set up from YAML or a config entry."""
+    unique_id = slugify_name(sensor_name)
+    for coordinator in hass.data.get(DOMAIN, {}).values():
+        if coordinator.slug == unique_id:
+            return coordinator
+    return None
 
 
 async def async_setup(hass, config):
@@ -32,23 +50,26 @@ async def async_setup(hass, config):
             _LOGGER.error("Service call missing required 'name' parameter.")
             return
 
-        # Convert the sensor name into its unique ID
-        unique_id = sensor_name.lower().replace(" ", "_")
-
-        # Access the entity registry to find the sensor
-        registry = async_get_entity_registry(hass)
-        entity = registry.async_get(f"sensor.{unique_id}")
-
-        if entity:
-            # Retrieve the sensor from hass.data
-            sensor = hass.data[DOMAIN].get(unique_id)
-            if sensor:
-                sensor.schedule_update_ha_state(force_refresh=True)
-                _LOGGER.info(f"Updated sensor: {sensor_name}")
-            else:
-                _LOGGER.warning(f"Sensor '{sensor_name}' not found in hass.data.")
+        coordinator = get_coordinator(hass, sensor_name)
+        if coordinator:
+            # Joins a running scan and returns once fresh data is available
+            await coordinator.async_refresh_deliveries()
+            _LOGGER.info(f"Updated sensor: {sensor_name}")
         else:
-            _LOGGER.warning(f"Sensor '{sensor_name}' not found in the entity registry.")
+            _LOGGER.warning(f"Sensor '{sensor_name}' not found.")
+
+    async def handle_get_deliveries(call):
+        """Return the full details of all deliveries of a sensor as service response."""
+        sensor_name = call.data.get("name")
+        coordinator = get_coordinator(hass, sensor_name)
+        if coordinator is None:
+            raise ServiceValidationError(f"Sensor '{sensor_name}' not found.")
+
+        return {
+            "name": coordinator.name,
+            "count": len(coordinator.deliveries),
+            "deliveries": [coordinator.delivery_details(delivery) for delivery in coordinator.deliveries],
+        }
 
     # Register the service with the correct schema
     hass.services.async_register(
@@ -57,7 +78,58 @@ async def async_setup(hass, config):
         handle_update_deliveries,
         schema=UPDATE_DELIVERIES_SCHEMA,
     )
+    hass.services.async_register(
+        DOMAIN,
+        "get_deliveries",
+        handle_get_deliveries,
+        schema=GET_DELIVERIES_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
+
+    async def async_close_imap_pool(event):
+        """Log out of all pooled IMAP sessions when Home Assistant stops."""
+        await hass.async_add_executor_job(IMAP_POOL.close)
 
-    # Store sensor references for later use
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, async_close_imap_pool)
+
+    # Coordinators by config entry ID or, for YAML sensors, by their unique ID
     hass.data.setdefault(DOMAIN, {})
-    return True
\ No newline at end of file
+    return True
+
+
+async def async_setup_entry(hass, entry):
+    """Set up a mailbox added through the UI; all its entities share one coordinator."""
+    config = {**entry.data, **entry.options, "name": entry.title}
+    coordinator = PackageDeliveriesCoordinator(hass, config, entry.entry_id)
+    # The last known deliveries are shown right away, the first scan runs after Home Assistant started
+    await coordinator.async_restore()
+    hass.data.setdefault(DOMAIN, {})[entry.entry_id] = coordinator
+
+    await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+
+    coordinator.async_start_delayed()
+    entry.async_on_unload(entry.add_update_listener(async_reload_entry))
+
+    async def async_stop_coordinator(event):
+        """Log out of the IDLE sessions and close the sync state when Home Assistant stops."""
+        await coordinator.async_stop()
+
+    entry.async_on_unload(hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, async_stop_coordinator))
+
+    if config.get("metrics", False):
+        async_register_metrics_view(hass)
+    return True
+
+
+async def async_unload_entry(hass, entry):
+    """Unload a config entry and stop its coordinator."""
+    unloaded = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
+    if unloaded:
+        coordinator = hass.data[DOMAIN].pop(entry.entry_id)
+        await coordinator.async_stop()
+    return unloaded
+
+
+async def async_reload_entry(hass, entry):
+    """Reload a config entry after its options changed."""
+    await hass.config_entries.async_reload(entry.entry_id)
\ No newline at end of file
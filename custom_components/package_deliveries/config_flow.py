@@ -0,0 +1,88 @@
+"""
+Einrichtung über die Benutzeroberfläche: ein Eintrag je Postfach und Ordner.
+"""
+
+import imaplib
+import voluptuous as vol
+from homeassistant import config_entries
+from homeassistant.core import callback
+from homeassistant.helpers import selector
+
+from .coordinator import DOMAIN
+from .custom_scripts import check_package_deliveries as engine
+
+
+def _validate_login(data):
+    """Meldet sich einmal am IMAP-Server an, Fehler werden an den Dialog weitergereicht."""
+    mail = engine.init_imap_connection(engine.scan_options(
+        data["email"], data["password"], imap_server=data["imap_server"],
+    ))
+    try:
+        mail.logout()
+    except (imaplib.IMAP4.error, OSError):
+        pass
+
+
+class PackageDeliveriesConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
+    """Dialog zum Hinzufügen eines Postfachs."""
+
+    VERSION = 1
+
+    async def async_step_user(self, user_input=None):
+        """Fragt Zugangsdaten und Ordner ab und prüft die Anmeldung."""
+        errors = {}
+        if user_input is not None:
+            await self.async_set_unique_id(f"{user_input['email']}_{user_input['imap_folder']}".lower())
+            self._abort_if_unique_id_configured()
+            try:
+                await self.hass.async_add_executor_job(_validate_login, user_input)
+            except imaplib.IMAP4.error:
+                errors["base"] = "invalid_auth"
+            except OSError:
+                errors["base"] = "cannot_connect"
+            else:
+                data = {key: value for key, value in user_input.items() if key != "name"}
+                return self.async_create_entry(title=user_input["name"], data=data)
+
+        schema = vol.Schema({
+            vol.Required("name", default="Package Deliveries"): str,
+            vol.Required("email"): str,
+            vol.Required("password"): selector.TextSelector(
+                selector.TextSelectorConfig(type=selector.TextSelectorType.PASSWORD)
+            ),
+            vol.Required("imap_server", default="imap.gmail.com"): str,
+            vol.Required("imap_folder", default="INBOX"): str,
+        })
+        return self.async_show_form(
+            step_id="user", data_schema=self.add_suggested_values_to_schema(schema, user_input), errors=errors
+        )
+
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry):
+        """Gibt den Dialog für die Optionen zurück."""
+        return PackageDeliveriesOptionsFlow()
+
+
+class PackageDeliveriesOptionsFlow(config_entries.OptionsFlow):
+    """
+    Optionen eines Postfachs, Änderungen laden den Eintrag neu.
+    Den Eintrag stellt Home Assistant als self.config_entry bereit.
+    """
+
+    async def async_step_init(self, user_input=None):
+        """Zeigt die Scan-Optionen mit den aktuellen Werten an."""
+        if user_input is not None:
+            return self.async_create_entry(title="", data=user_input)
+
+        options = self.config_entry.options
+        schema = vol.Schema({
+            vol.Required("last_days", default=options.get("last_days", 10)): vol.All(int, vol.Range(min=1)),
+            vol.Required("last_emails", default=options.get("last_emails", 50)): vol.All(int, vol.Range(min=1)),
+            vol.Required("scan_interval", default=options.get("scan_interval", 180)): vol.All(int, vol.Range(min=30)),
+            vol.Required("adaptive_scan", default=options.get("adaptive_scan", False)): bool,
+            vol.Required("push", default=options.get("push", False)): bool,
+            vol.Required("search_mode", default=options.get("search_mode", "server")): vol.In(["server", "client"]),
+            vol.Required("attributes", default=options.get("attributes", "full")): vol.In(["full", "compact"]),
+        })
+        return self.async_show_form(step_id="init", data_schema=schema)
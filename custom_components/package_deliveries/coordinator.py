@@ -0,0 +1,429 @@
+"""
+Gemeinsamer Scan je Postfach-Konfiguration, aus dem alle Entitäten ihre Daten beziehen.
+"""
+
+import asyncio
+import logging
+import imaplib
+import os
+import random
+import time
+from datetime import timedelta
+
+from homeassistant.core import callback
+from homeassistant.helpers.event import async_call_later, async_track_time_interval
+from homeassistant.helpers.start import async_at_started
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
+from homeassistant.util import dt as dt_util
+
+from .custom_scripts import check_package_deliveries as engine, resilience, tracking_status
+from .delivery_store import DeliveryStore
+from .scheduler import DEFAULT_MAX_INTERVAL, DEFAULT_NOTIFICATION_HOURS, AdaptiveScheduler
+
+_LOGGER = logging.getLogger(__name__)
+
+DOMAIN = "package_deliveries"
+DEFAULT_RECONCILE_INTERVAL = 1800  # Abgleich im Push-Modus in Sekunden
+DEFAULT_DEBOUNCE = 2  # Sekunden, in denen weitere Anfragen zum selben Scan zusammengefasst werden
+DEFAULT_STARTUP_DELAY = 30  # Sekunden nach dem Start von Home Assistant bis zum ersten Scan
+STARTUP_JITTER = 30  # Zufälliger Zuschlag, damit nicht alle Postfächer gleichzeitig anmelden
+EVENT_DELIVERIES_CHANGED = "package_deliveries_changed"
+
+# Gemeinsame IMAP-Sitzungen für alle Koordinatoren mit demselben Server und Konto
+IMAP_POOL = engine.ImapConnectionPool(timeout=engine.IMAP_TIMEOUT)
+
+# Rate-Limit und Circuit Breaker je Konto, gemeinsam für alle Koordinatoren
+ACCOUNT_GUARDS = engine.AccountGuards()
+
+
+def slugify_name(name):
+    """Wandelt den Sensornamen in die bisher verwendete eindeutige ID um."""
+    return name.lower().replace(" ", "_")
+
+
+class PackageDeliveriesCoordinator(DataUpdateCoordinator):
+    """
+    Scannt die Postfächer einer Konfiguration und benachrichtigt die Entitäten, sobald sich
+    Lieferungen, Zustand oder Fehler geändert haben. data enthält die sortierten Lieferungen.
+    """
+
+    def __init__(self, hass, config, storage_key):
+        """Initialisiere den Koordinator, storage_key benennt Zustandsdatei und Speicher."""
+        super().__init__(hass, _LOGGER, name=config["name"])
+        self.config = config
+        self.slug = slugify_name(config["name"])
+        self.data = []
+        # Im Speicherordner von Home Assistant, damit ein Update der Komponente den Stand nicht löscht
+        self.state_file_path = hass.config.path(".storage", DOMAIN, f"sync_state_{storage_key}.db")
+        self._legacy_state_file_path = hass.config.path(
+            "custom_components", "package_deliveries", "custom_scripts", f"sync_state_{storage_key}.db"
+        )
+        self.sync_state = None
+        self.startup_delay = float(config.get("startup_delay", DEFAULT_STARTUP_DELAY))
+        self._unsub_startup = None
+        scan_interval = config.get("scan_interval", 180)
+        if isinstance(scan_interval, timedelta):
+            self.scan_interval = scan_interval
+        else:
+            self.scan_interval = timedelta(seconds=int(scan_interval))
+
+        # Push-Modus: IMAP IDLE statt Polling, nur ein langsamer Abgleich bleibt periodisch
+        self.push = bool(config.get("push", False))
+        self.reconcile_interval = timedelta(seconds=int(config.get("reconcile_interval", DEFAULT_RECONCILE_INTERVAL)))
+        self._idle_watchers = []
+        self._unsub_timer = None
+
+        # Adaptiver Modus: scan_interval ist der kürzeste Abstand, der nächste Scan wird nach jedem Scan geplant
+        self._scheduler = None
+        self._scheduling = False
+        if config.get("adaptive_scan", False) and not self.push:
+            self._scheduler = AdaptiveScheduler(
+                self.scan_interval,
+                timedelta(seconds=int(config.get("max_scan_interval", DEFAULT_MAX_INTERVAL.total_seconds()))),
+                config.get("notification_hours", DEFAULT_NOTIFICATION_HOURS),
+            )
+
+        # Höchstens ein Scan je Koordinator: Anfragen schließen sich dem laufenden Scan an
+        self.debounce = float(config.get("debounce", DEFAULT_DEBOUNCE))
+        self._refresh_task = None
+        self._follow_up_task = None
+
+        # Sendungsstatus beim Paketdienst: nur Sendungen unterwegs, je Sendung höchstens einmal je status_ttl
+        self.statuses = {}
+        self._tracker = None
+        if config.get("status_url"):
+            provider = engine.JsonStatusProvider(
+                config["status_url"],
+                services=config.get("status_services", ()),
+                batch_size=int(config.get("status_batch_size", tracking_status.DEFAULT_BATCH_SIZE)),
+                rate=float(config.get("status_rate", tracking_status.DEFAULT_RATE)),
+                api_key=config.get("status_api_key"),
+            )
+            self._tracker = engine.StatusTracker([provider], int(config.get("status_ttl", engine.DEFAULT_TTL)))
+
+        # Eigene Rate-Limits der Konten dieser Konfiguration, sonst gelten die Standardwerte
+        limits = {
+            "rate": float(config["rate_limit_per_minute"]) / 60 if "rate_limit_per_minute" in config else None,
+            "capacity": int(config["rate_limit_burst"]) if "rate_limit_burst" in config else None,
+            "max_wait": float(config["rate_limit_max_wait"]) if "rate_limit_max_wait" in config else None,
+        }
+        for source in self._scan_sources():
+            if not source.local_path:
+                ACCOUNT_GUARDS.configure(source.imap_server, source.email, **limits)
+
+        # Stand des letzten Scans, um nur Änderungen zu melden
+        self._delivery_store = DeliveryStore(hass, storage_key)
+        self._deliveries_changed = False
+
+        # Ergebnis des letzten Scans: Anzahl oder "error"/"unavailable", dazu die Fehlermeldung
+        self.state = None
+        self.error = None
+        # Schlechtester Circuit Breaker der IMAP-Konten, None ohne IMAP-Konto
+        self.circuit_breaker = None
+
+        # Statistik des letzten Scans für Attribute, Log und Metrik-Endpunkt; mit scan_stats: true
+        # wird der Zustand nach jedem Scan geschrieben, damit das Attribut aktuell bleibt
+        self.scan_stats = None
+        self.write_scan_stats = bool(config.get("scan_stats", False))
+        self.scan_duration = 0.0
+        self.scan_succeeded = False
+
+    @property
+    def deliveries(self):
+        """Die vollständigen Lieferungen des letzten erfolgreichen Scans."""
+        return self.data
+
+    def delivery_details(self, delivery):
+        """
+        Die Lieferung als Dict mit Beträgen in der Sprache von Home Assistant, dazu der Status
+        des Paketdienstes, sofern er abgefragt wurde.
+        """
+        details = delivery.as_dict(self.hass.config.language)
+        status = engine.delivery_status(delivery, self.statuses)
+        if status is not None:
+            details["status"] = status.status
+            details["status_description"] = status.description
+        return details
+
+    async def async_restore(self):
+        """
+        Stellt die Lieferungen des letzten Scans und den Scan-Cursor wieder her, ohne zu scannen.
+        Der erste Scan lädt dadurch nur die seitdem eingegangenen E-Mails.
+        """
+        await self._delivery_store.async_load()
+        if self._delivery_store.deliveries:
+            self.data = engine.sort_deliveries(list(self._delivery_store.deliveries.values()))
+            self.state = len(self.data)
+        try:
+            await self.hass.async_add_executor_job(self._open_sync_state)
+        except Exception as e:
+            # Der erste Scan versucht es erneut und liest notfalls alle E-Mails
+            _LOGGER.warning(f"Could not open sync state {self.state_file_path}: {e}")
+
+    def _circuit_breakers(self):
+        """
+        Gibt den schlechtesten Circuit Breaker der IMAP-Konten zurück (state, failures, retry_in).
+        Ist er offen, liefern die Scans die zwischengespeicherten Lieferungen des Kontos.
+        """
+        breakers = [
+            ACCOUNT_GUARDS.breaker_state(args.imap_server, args.email)
+            for args in self._scan_sources()
+            if not args.local_path
+        ]
+        if not breakers:
+            return None
+        return max(breakers, key=lambda breaker: resilience.BREAKER_STATES.index(breaker["state"]))
+
+    def _open_sync_state(self):
+        """Öffnet die Zustandsdatei und übernimmt eine aus dem alten Ort im Komponentenordner."""
+        os.makedirs(os.path.dirname(self.state_file_path), exist_ok=True)
+        if not os.path.exists(self.state_file_path) and os.path.exists(self._legacy_state_file_path):
+            os.replace(self._legacy_state_file_path, self.state_file_path)
+        self.sync_state = engine.SyncStateStore(self.state_file_path, engine.PARSER_VERSION)
+        if self._tracker is not None:
+            self._tracker.state = self.sync_state
+
+    def async_start_delayed(self):
+        """
+        Startet Scans und IDLE-Sitzungen erst nach dem Start von Home Assistant, verzögert um
+        startup_delay und einen zufälligen Zuschlag. Bis dahin gilt der wiederhergestellte Stand.
+        Läuft Home Assistant bereits (neuer oder neu geladener Eintrag), wird sofort gescannt.
+        """
+        if self.hass.is_running:
+            self._unsub_startup = async_call_later(self.hass, 0, self._async_start_and_refresh)
+            return
+
+        delay = self.startup_delay + random.uniform(0, STARTUP_JITTER)
+
+        @callback
+        def async_schedule_start(hass):
+            self._unsub_startup = async_call_later(hass, delay, self._async_start_and_refresh)
+
+        self._unsub_startup = async_at_started(self.hass, async_schedule_start)
+
+    async def _async_start_and_refresh(self, now=None):
+        """Erster Scan nach dem Start, danach übernehmen Timer bzw. IDLE."""
+        self._unsub_startup = None
+        self.async_start()
+        await self.async_refresh_deliveries()
+
+    def async_start(self):
+        """Startet den periodischen Scan, im Push-Modus die IDLE-Sitzungen und den langsameren Abgleich."""
+        if self._scheduler is not None:
+            self._scheduling = True
+            self._async_schedule_next_scan()
+            return
+
+        interval = self.scan_interval
+        if self.push:
+            interval = self.reconcile_interval
+            for source in self._scan_sources():
+                if source.local_path:
+                    # Lokale Quellen werden beim Abgleich gelesen, unveränderte Dateien kosten nur ein stat()
+                    continue
+                watcher = engine.ImapIdleWatcher(
+                    source.imap_server, source.email, source.password, source.imap_folder, self._on_new_mail,
+                )
+                watcher.start()
+                self._idle_watchers.append(watcher)
+        self._unsub_timer = async_track_time_interval(self.hass, self._async_scheduled_refresh, interval)
+
+    async def async_stop(self):
+        """Beendet die IDLE-Sitzungen, den periodischen und einen laufenden Scan."""
+        self._scheduling = False
+        if self._unsub_startup is not None:
+            self._unsub_startup()
+            self._unsub_startup = None
+        if self._unsub_timer is not None:
+            self._unsub_timer()
+            self._unsub_timer = None
+        for task in (self._follow_up_task, self._refresh_task):
+            if task is not None:
+                task.cancel()
+        watchers, self._idle_watchers = self._idle_watchers, []
+        for watcher in watchers:
+            watcher.stop()
+        for watcher in watchers:
+            await self.hass.async_add_executor_job(watcher.join)
+        if self.sync_state is not None:
+            await self.hass.async_add_executor_job(self.sync_state.close)
+            self.sync_state = None
+
+    def _on_new_mail(self):
+        """Wird aus dem IDLE-Thread aufgerufen, sobald neue E-Mails eintreffen."""
+        self.hass.add_job(self.async_refresh_deliveries, True)
+
+    async def _async_scheduled_refresh(self, now=None):
+        """Periodischer Scan, im Push-Modus als Abgleich, falls eine Benachrichtigung verloren ging."""
+        await self.async_refresh_deliveries()
+
+    async def async_request_refresh(self):
+        """Aktualisierung über homeassistant.update_entity, über denselben Scan."""
+        await self.async_refresh_deliveries()
+
+    async def async_refresh_deliveries(self, new_mail=False):
+        """
+        Scannt die Postfächer und kehrt zurück, sobald aktuelle Daten vorliegen.
+
+        Gleichzeitige Anfragen schließen sich dem laufenden Scan an, Anfragen innerhalb des
+        Entprellfensters werden zu einem Scan zusammengefasst. Mit new_mail=True (IDLE) folgt
+        einem bereits laufenden Scan genau ein weiterer, da die neue E-Mail ihm fehlen kann.
+        """
+        task = self._refresh_task
+        if task is None or task.done():
+            task = self._refresh_task = self.hass.async_create_task(self._async_run_refresh())
+        elif new_mail:
+            if self._follow_up_task is None or self._follow_up_task.done():
+                self._follow_up_task = self.hass.async_create_task(self._async_follow_up(task))
+            task = self._follow_up_task
+        # Ein abgebrochener Aufrufer bricht den Scan der anderen nicht ab
+        await asyncio.shield(task)
+
+    async def _async_follow_up(self, task):
+        """Startet nach dem laufenden Scan einen weiteren."""
+        await asyncio.wait([task])
+        await self.async_refresh_deliveries()
+
+    async def _async_run_refresh(self):
+        """
+        Führt einen Scan aus und benachrichtigt die Entitäten, sofern sich etwas geändert hat.
+        Verglichen wird der ganze Circuit Breaker, auch failures und retry_in stehen in den Attributen.
+        """
+        await asyncio.sleep(self.debounce)
+        previous = (self.state, self.error, self.circuit_breaker)
+        await self._async_scan()
+        changed = self._deliveries_changed or previous != (self.state, self.error, self.circuit_breaker)
+        if changed or self.write_scan_stats:
+            self.async_set_updated_data(self.data)
+
+        if self._scheduler is not None and self._scheduling:
+            # Auch nach einem erzwungenen Scan den nächsten neu planen
+            self._scheduler.record_scan(self._deliveries_changed)
+            self._async_schedule_next_scan()
+
+    def _async_schedule_next_scan(self):
+        """Plant den nächsten Scan im adaptiven Modus und ersetzt einen bereits geplanten."""
+        if self._unsub_timer is not None:
+            self._unsub_timer()
+        delay = self._scheduler.next_interval(self.data, dt_util.now())
+        _LOGGER.debug(f"Next scan of {self.name} in {delay}")
+        self._unsub_timer = async_call_later(self.hass, delay, self._async_scheduled_refresh)
+
+    async def _async_scan(self):
+        """Scannt die Postfächer im Executor und meldet die Änderungen an den Lieferungen."""
+        previous_statuses = {number: status.status for number, status in self.statuses.items()}
+        deliveries = await self.hass.async_add_executor_job(self._scan)
+        self._deliveries_changed = False
+        if deliveries is None:
+            return
+
+        self.data = deliveries
+        if previous_statuses != {number: status.status for number, status in self.statuses.items()}:
+            self._deliveries_changed = True
+        changes = self._delivery_store.async_apply(deliveries, self.statuses)
+        if engine.has_changes(changes):
+            self._deliveries_changed = True
+            _LOGGER.info(
+                f"Deliveries of {self.name} changed: "
+                + ", ".join(f"{len(changes[kind])} {kind}" for kind in engine.CHANGE_KINDS)
+            )
+            # Nur die Änderungen, nicht die vollständige Liste
+            self.hass.bus.async_fire(EVENT_DELIVERIES_CHANGED, {
+                "name": self.name,
+                **{kind: [self.delivery_details(delivery) for delivery in changes[kind]] for kind in engine.CHANGE_KINDS},
+            })
+
+    def _scan_options(self):
+        """Erzeugt die Scan-Optionen aus der Konfiguration."""
+        return engine.scan_options(
+            self.config.get("email"),
+            self.config.get("password"),
+            imap_server=self.config.get("imap_server", "imap.gmail.com"),
+            last_days=int(self.config.get("last_days", 10)),
+            last_emails=int(self.config.get("last_emails", 50)),
+            imap_folder=self.config.get("imap_folder", "INBOX"),
+            local_path=self.config.get("local_path"),
+            search_mode=self.config.get("search_mode", "server"),
+            max_message_bytes=int(self.config.get("max_message_bytes", engine.DEFAULT_MAX_MESSAGE_BYTES)),
+        )
+
+    def _scan_sources(self):
+        """
+        Erzeugt die Scan-Optionen je Postfach. Einträge unter 'sources' überschreiben
+        email, password, imap_server und imap_folder der Konfiguration oder lesen mit
+        local_path ein lokales Maildir, mbox oder Verzeichnis mit .eml-Dateien.
+        """
+        args = self._scan_options()
+        sources = self.config.get("sources")
+        if not sources:
+            return [args]
+        return [
+            engine.source_options(args, **{
+                key: source[key]
+                for key in ("email", "password", "imap_server", "imap_folder", "local_path")
+                if key in source
+            })
+            for source in sources
+        ]
+
+    def _scan(self):
+        """
+        Scannt die Postfächer mit der Engine und übernimmt Zustand und Fehler.
+        Gibt die Lieferungen zurück, bei einem Fehler oder unvollständigen Scan None;
+        dann bleiben die Lieferungen des letzten vollständigen Scans stehen.
+        """
+        stats = engine.ScanStats()
+        started = time.monotonic()
+        succeeded = False
+        try:
+            if self.sync_state is None:
+                self._open_sync_state()
+
+            _LOGGER.info(f"Starting scan of {len(self._scan_sources())} mailbox(es) for {self.name}")
+
+            deliveries = engine.scan_sources(
+                self._scan_sources(), self.sync_state, IMAP_POOL,
+                max_workers=int(self.config.get("max_workers", engine.MAX_WORKERS)),
+                stats=stats,
+                guards=ACCOUNT_GUARDS,
+            )
+            succeeded = True
+            if self._tracker is not None:
+                # Fehler der Abfrage werden protokolliert, der Scan bleibt erfolgreich
+                self.statuses = self._tracker.update(deliveries, stats)
+
+            self.state = len(deliveries)
+            self.error = None
+            _LOGGER.info(f"Package deliveries updated: {len(deliveries)} deliveries found.")
+            return deliveries
+
+        except engine.IncompleteScanError as e:
+            # Nur vollständige Scans werden verglichen, sonst gälten die fehlenden Lieferungen als abgelaufen
+            self.error = f"Unvollständiger Scan: {e}"
+            _LOGGER.error(f"Scan of {self.name} incomplete, keeping the previous deliveries: {e}")
+
+        except TimeoutError as e:
+            self.state = "unavailable"
+            self.error = f"Zeitüberschreitung: {e}"
+            _LOGGER.error(f"IMAP connection timed out after {engine.IMAP_TIMEOUT} seconds: {e}")
+
+        except (imaplib.IMAP4.error, OSError) as e:
+            self.state = "error"
+            self.error = f"IMAP-Fehler: {e}"
+            _LOGGER.error(f"IMAP scan failed: {e}")
+
+        except Exception as e:
+            self.state = "error"
+            self.error = str(e)
+            _LOGGER.error(f"Unexpected error occurred: {e}")
+
+        finally:
+            self.circuit_breaker = self._circuit_breakers()
+            # Auch bei Fehlern zeigen, welche Stufe wie lange gedauert hat
+            self.scan_stats = stats
+            self.scan_duration = time.monotonic() - started
+            self.scan_succeeded = succeeded
+            log_level = logging.INFO if self.config.get("log_scan_stats", False) else logging.DEBUG
+            _LOGGER.log(log_level, f"Scan statistics for {self.name} ({self.scan_duration:.1f}s): {stats.as_log_line()}")
+
+        return None
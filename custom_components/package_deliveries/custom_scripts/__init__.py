@@ -0,0 +1 @@
+"""Email scanning engine of the Package Deliveries integration, also usable as a CLI script."""
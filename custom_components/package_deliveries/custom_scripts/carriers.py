@@ -0,0 +1,101 @@
+import re
+
+
+class CarrierParser:
+    """
+    A delivery service: the domains its notifications are sent from (case-insensitive, also
+    matching subdomains), phrases of their subjects (case-sensitive, starting at a word), the
+    text part its extractor reads ("plain" or "html") and the extractor turning one
+    notification into a delivery record.
+    """
+
+    def __init__(self, service, senders, subjects, extract, body="plain"):
+        self.service = service
+        self.body = body
+        self.senders = tuple(sender.lower() for sender in senders)
+        self.subjects = tuple(subjects)
+        self.extract = extract
+        # "UPS Update" must not match inside "GROUPS Update"
+        self.subject_pattern = re.compile("|".join(rf"(?<!\w){re.escape(subject)}" for subject in self.subjects))
+
+    def __repr__(self):
+        return f"CarrierParser({self.service!r})"
+
+
+class CarrierRegistry:
+    """
+    Ordered collection of CarrierParsers. The sender addresses of all carriers are compiled into
+    one regex, so an email is classified with a single pass over its sender; the subject is only
+    checked for carriers whose sender matched.
+    """
+
+    def __init__(self):
+        self._carriers = []
+        self._sender_pattern = None
+        self._raw_sender_pattern = None
+        self._carriers_by_sender = {}
+
+    def __iter__(self):
+        return iter(self._carriers)
+
+    def __len__(self):
+        return len(self._carriers)
+
+    def register(self, service, senders, subjects, body="plain"):
+        """
+        Decorator registering an extractor function(email_subject, email_msg, email_date).
+        Carriers are matched in registration order.
+        """
+        def decorator(extract):
+            self._carriers.append(CarrierParser(service, senders, subjects, extract, body))
+            self._compile()
+            return extract
+        return decorator
+
+    def _compile(self):
+        self._carriers_by_sender = {}
+        for carrier in self._carriers:
+            for sender in carrier.senders:
+                self._carriers_by_sender.setdefault(sender, []).append(carrier)
+        # Longest first, so "amazon.de" is not shadowed by a shorter sender it contains
+        senders = sorted(self._carriers_by_sender, key=len, reverse=True)
+        # Anchored to the domain: "ups.com" matches "@ups.com" and "@mail.ups.com", not "@googlegroups.com"
+        self._sender_pattern = re.compile(
+            r"[@.](" + "|".join(re.escape(sender) for sender in senders) + r")(?![\w.-])"
+        )
+        self._raw_sender_pattern = re.compile(b"|".join(re.escape(sender.encode("utf-8")) for sender in senders))
+
+    def mentions_sender(self, raw_headers):
+        """
+        Cheap check on the undecoded header bytes of an email: False if no sender domain of any
+        carrier occurs in them, so the headers need not be parsed at all. A True is only a
+        candidate, match() has the final say.
+        """
+        # Lower-casing the bytes and matching case-sensitively is faster than re.IGNORECASE
+        return self._raw_sender_pattern is not None and self._raw_sender_pattern.search(raw_headers.lower()) is not None
+
+    def match(self, email_from, email_subject):
+        """
+        Returns the first CarrierParser matching sender and subject, or None.
+        """
+        if self._sender_pattern is None or not email_from:
+            return None
+        email_subject = email_subject or ""
+
+        candidates = []
+        for sender_match in self._sender_pattern.finditer(email_from.lower()):
+            for carrier in self._carriers_by_sender[sender_match.group(1)]:
+                if carrier not in candidates:
+                    candidates.append(carrier)
+        if not candidates:
+            return None
+
+        for carrier in self._carriers:
+            if carrier in candidates and carrier.subject_pattern.search(email_subject):
+                return carrier
+        return None
+
+
+# Default registry the extractors in check_package_deliveries.py register with
+CARRIERS = CarrierRegistry()
+register_carrier = CARRIERS.register
@@ -1,5 +1,6 @@
 import imaplib
 import email
+import email.utils
 import json
 import re
 from email.header import decode_header
@@ -7,8 +8,43 @@ import html
 from datetime import datetime, timedelta, timezone
 from zoneinfo import ZoneInfo  # Python 3.9+ provides zoneinfo for timezone handling
 import argparse
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
 from urllib.parse import urlparse, parse_qs
 
+try:
+    from .carriers import CARRIERS, register_carrier
+    from .dates import format_date, resolve_date
+    from .delivery_diff import CHANGE_KINDS, delivery_key, diff_deliveries, has_changes
+    from .delivery_merge import merge_deliveries
+    from .delivery_record import Delivery
+    from .imap_idle import ImapIdleWatcher
+    from .imap_pool import ImapConnectionPool
+    from .local_mail import header_end, mapped_file, open_local_mailbox
+    from .resilience import AccountGuards, CircuitOpenError, RateLimitedError, ScanTokens
+    from .scan_stats import NO_STATS, ScanStats, format_prometheus
+    from .sync_state import SyncStateStore
+    from .tracking_status import DEFAULT_TTL, JsonStatusProvider, StatusTracker, delivery_status
+except ImportError:  # Executed as a standalone script
+    from carriers import CARRIERS, register_carrier
+    from dates import format_date, resolve_date
+    from delivery_diff import CHANGE_KINDS, delivery_key, diff_deliveries, has_changes
+    from delivery_merge import merge_deliveries
+    from delivery_record import Delivery
+    from imap_idle import ImapIdleWatcher
+    from imap_pool import ImapConnectionPool
+    from local_mail import header_end, mapped_file, open_local_mailbox
+    from resilience import AccountGuards, CircuitOpenError, RateLimitedError, ScanTokens
+    from scan_stats import NO_STATS, ScanStats, format_prometheus
+    from sync_state import SyncStateStore
+    from tracking_status import DEFAULT_TTL, JsonStatusProvider, StatusTracker, delivery_status
+
+_LOGGER = logging.getLogger(__name__)
+
 
 
 # ANSI escape codes for coloring
@@ -19,15 +55,60 @@ OKGREEN = '\033[92m'
 WARNING = '\033[93m'
 FAIL = '\033[91m'
 ENDC = '\033[0m'  # To reset color after printing
+ANSI_PATTERN = re.compile(r'\033\[\d+m')
+
+# Colored console output is only wanted when running as a CLI script, Home Assistant gets debug logs
+VERBOSE = False
 
 # Timezone definitions
 utc = timezone.utc
 cest = ZoneInfo("Europe/Berlin")  # CEST is part of Europe/Berlin
 
-# Get today's date
-today = datetime.now(cest).date()  # Using CEST time zone
+# Bump whenever an extractor changes its output, cached extraction results are discarded then
+PARSER_VERSION = 6
+
+# Socket timeout for IMAP commands in seconds
+IMAP_TIMEOUT = 30
+
+# Maximum number of sources scanned at the same time
+MAX_WORKERS = 4
+
+# Number of UIDs requested per UID FETCH command (headers / full bodies)
+FETCH_BATCH_SIZE = 100
+BODY_BATCH_SIZE = 20
+
+# Bytes of a message downloaded and parsed at most, the text parts come before attachments
+DEFAULT_MAX_MESSAGE_BYTES = 256 * 1024
+UID_PATTERN = re.compile(rb'UID (\d+)')
+
+# Extractor patterns, compiled once at import
+AMAZON_DELIVERY_DATE_PATTERN = re.compile(r'Zustellung[:\s]+(?:am\s)?(\w+,\s\d+\.?\s\w+|\d+\.?\s\w+|\w+)')
+LINE_BREAK_PATTERN = re.compile(r'[\n\r]+')
+URL_PATTERN = re.compile(r'(https?://[^\s]+)')
+NON_ALPHANUMERIC_PATTERN = re.compile(r'[^\w\d]')
+DHL_DELIVERY_DATE_PATTERN = re.compile(r'am\s\w+, den (\d{2})\.(\d{2})\.')
+DPD_SENDER_PATTERN = re.compile(r'Versender\s&\sPaketnummer.*?>([\w\s\/\.,-]+)<.*?(\d{10,20})')
+DPD_TRACKING_PATTERN = re.compile(r'(\d{10,20})')
+DPD_DELIVERY_WINDOW_PATTERN = re.compile(r'in\s(\d+)(?:-(\d+))?\sWerktagen')
+HERMES_TRACKING_PATTERN = re.compile(r'Sendungsnummer[:\s]+([A-Z0-9]{10,20})\b')
+GLS_TRACKING_PATTERN = re.compile(r'Paketnummer[:\s]+([A-Z0-9]{11,14})\b')
+UPS_TRACKING_PATTERN = re.compile(r'\b(1Z[0-9A-Z]{16})\b')
+NOTIFICATION_DELIVERY_DATE_PATTERN = re.compile(r'(?:Zustellung|zugestellt|Lieferung)\D{0,40}?(\d{2})\.(\d{2})\.')
+
+def log(message):
+    """
+    Prints colored progress output on the CLI, otherwise logs it at debug level.
+    """
+    if VERBOSE:
+        print(message)
+    else:
+        _LOGGER.debug(ANSI_PATTERN.sub('', message))
 
-deliveries = []
+def get_today():
+    """
+    Returns today's date in the CEST time zone. Evaluated per call, the engine may run for days.
+    """
+    return datetime.now(cest).date()
 
 def convert_to_cest(email_date_str):
     """
@@ -47,9 +128,19 @@ def convert_to_cest(email_date_str):
         # Return the datetime object formatted as a string
         return email_datetime_cest.strftime('%Y-%m-%d %H:%M')
     except Exception as e:
-        print(f"Error converting date to CEST: {e}")
+        log(f"Error converting date to CEST: {e}")
         return email_date_str  # Return original date in case of error
 
+def decode_text(data, charset):
+    """
+    Decodes bytes in the given charset. Undecodable bytes are replaced, unknown charsets
+    (e.g. "unknown-8bit") are read as UTF-8.
+    """
+    try:
+        return data.decode(charset or 'utf-8', errors='replace')
+    except LookupError:
+        return data.decode('utf-8', errors='replace')
+
 def decode_mime_subject(subject):
     """
     Decodes a MIME encoded subject to readable text.
@@ -60,132 +151,414 @@ def decode_mime_subject(subject):
     for part, encoding in decoded_subject_parts:
         if isinstance(part, bytes):
             # If the subject is encoded in bytes, decode it using the detected encoding
-            decoded_subject += part.decode(encoding or 'utf-8')
+            decoded_subject += decode_text(part, encoding)
         else:
             decoded_subject += part
 
     return decoded_subject
 
 
-def convert_relative_date(date_str):
-    weekdays = ["Montag", "Dienstag", "Mittwoch", "Donnerstag", "Freitag", "Samstag", "Sonntag"]
-    months = ["Januar", "Februar", "März", "April", "Mai", "Juni", "Juli", "August", "September", "Oktober", "November", "Dezember"]
+def email_day(email_date_str):
+    """
+    Returns the day an email was received ("2024-09-03 17:27"), the reference for the dates
+    announced in it. Falls back to today if the email date cannot be parsed.
+    """
+    try:
+        return datetime.strptime(email_date_str, '%Y-%m-%d %H:%M').date()
+    except (TypeError, ValueError):
+        return get_today()
 
-    today = datetime.now(cest).date()
+def convert_relative_date(date_str, email_date_str=None):
+    """
+    Resolves an announced delivery date ("Morgen", "Dienstag, 3 September", "03-09") relative
+    to the day of the email and returns it as datetime.date, or None if it contains no date.
+    """
+    return resolve_date(date_str, email_day(email_date_str))
 
-    try:
-        # Handle relative dates
-        if "Heute" in date_str:
-            date_obj = today
-        elif "Morgen" in date_str:
-            date_obj = today + timedelta(days=1)
-        elif "Übermorgen" in date_str:
-            date_obj = today + timedelta(days=2)
+def select_folder(mail, imap_folder):
+    """
+    Selects the IMAP folder and returns its UIDVALIDITY (or None if the server did not report it).
+    """
+    typ, data = mail.select(imap_folder)
+    if typ != 'OK':
+        raise imaplib.IMAP4.error(f"SELECT {imap_folder} failed: {data}")
+    typ, data = mail.response('UIDVALIDITY')
+    if data and data[0]:
+        return int(data[0])
+    return None
+
+def match_delivery_service(email_from, email_subject):
+    """
+    Returns the name of the delivery service whose notification rules match the sender and subject, or None.
+    """
+    carrier = CARRIERS.match(email_from, email_subject)
+    return carrier.service if carrier else None
+
+def quote_search_string(value):
+    """
+    Quotes a string for use in an IMAP SEARCH command.
+    """
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+def or_criteria(criteria):
+    """
+    Combines IMAP search keys with OR, which only takes two keys: OR a OR b c
+    """
+    combined = criteria[-1]
+    for criterion in reversed(criteria[:-1]):
+        combined = f'OR {criterion} {combined}'
+    return combined
+
+def build_search_query(since, carriers=None):
+    """
+    Compiles the senders and subjects of the registered carriers into one IMAP SEARCH query, e.g.
+    (SINCE 01-Sep-2024 OR (FROM "amazon.de" SUBJECT "versandt!") (FROM "dhl.de" SUBJECT "..."))
+
+    IMAP matches case-insensitively, so the server returns a superset of what
+    match_delivery_service accepts; the header filter still has the final say.
+    Non-ASCII subject terms are left to the client to avoid CHARSET negotiation.
+    """
+    carriers = CARRIERS if carriers is None else carriers
+    criteria = []
+    for carrier in carriers:
+        carrier_criteria = or_criteria([f'FROM {quote_search_string(sender)}' for sender in carrier.senders])
+        subjects = [f'SUBJECT {quote_search_string(subject)}' for subject in carrier.subjects]
+        if subjects and all(subject.isascii() for subject in carrier.subjects):
+            carrier_criteria += f' {or_criteria(subjects)}'
+        criteria.append(f'({carrier_criteria})')
+
+    if not criteria:
+        return f'(SINCE {since})'
+
+    return f'(SINCE {since} {or_criteria(criteria)})'
+
+def search_uids(mail, since, search_mode="server"):
+    """
+    Returns the UIDs received since the given date. In "server" mode the carrier rules are
+    pushed down into the SEARCH command; servers that reject it fall back to the plain
+    date search and client-side matching. Raises imaplib.IMAP4.error if the date search is
+    rejected too, e.g. by a server throttling the account.
+    """
+    if search_mode == "server":
+        try:
+            typ, sdata = mail.uid('SEARCH', None, build_search_query(since))
+            if typ == 'OK':
+                return [int(uid) for uid in sdata[0].split()]
+            log(f"{WARNING}Server-side search failed ({sdata}), falling back to client-side matching.{ENDC}")
+        except imaplib.IMAP4.error as e:
+            log(f"{WARNING}Server-side search failed ({e}), falling back to client-side matching.{ENDC}")
+
+    typ, sdata = mail.uid('SEARCH', None, f'(SINCE {since})')
+    if typ != 'OK':
+        raise imaplib.IMAP4.error(f"UID SEARCH failed: {sdata}")
+    return [int(uid) for uid in sdata[0].split()]
+
+def format_uid_set(uids):
+    """
+    Compresses a sorted list of UIDs into an IMAP sequence set, e.g. [1, 2, 3, 7] -> "1:3,7".
+    """
+    ranges = []
+    for uid in uids:
+        if ranges and uid == ranges[-1][1] + 1:
+            ranges[-1][1] = uid
         else:
-            # Handle date in the format like "Dienstag, 3 September"
-            date_match = re.search(r'(\d{1,2})\s(\w+)', date_str)
-            if date_match:
-                day = int(date_match.group(1))
-                month_name = date_match.group(2)
-                
-                # Find month number from the month name
-                month = months.index(month_name) + 1
-                current_year = today.year
-                date_obj = datetime(current_year, month, day)
-            else:
-                # Handle date in the format "DD-MM" (default case)
-                day, month = map(int, date_str.split('-'))
-                current_year = today.year
-                date_obj = datetime(current_year, month, day)
-
-        # Format the output as "Mittwoch, 4. September"
-        weekday_str = weekdays[date_obj.weekday()]
-        day_str = date_obj.day
-        month_str = months[date_obj.month - 1]
-
-        return f"{weekday_str}, {day_str}. {month_str}"
+            ranges.append([uid, uid])
+    return ",".join(f"{start}:{end}" if start != end else str(start) for start, end in ranges)
+
+def iter_fetch_uids(mail, uids, message_parts, batch_size=FETCH_BATCH_SIZE, stats=None, stage="fetch"):
+    """
+    Fetches message_parts with one UID FETCH per batch and yields (uid, bytes) as each batch
+    arrives, so only one batch is held in memory at a time.
+    """
+    stats = stats or NO_STATS
+    for offset in range(0, len(uids), batch_size):
+        batch = uids[offset:offset + batch_size]
+        with stats.stage(stage):
+            typ, data = mail.uid('FETCH', format_uid_set(batch), f'(UID {message_parts})')
+        if typ != 'OK':
+            raise imaplib.IMAP4.error(f"UID FETCH failed: {data}")
+        for index, response_part in enumerate(data):
+            if isinstance(response_part, tuple):
+                uid_match = UID_PATTERN.search(response_part[0])
+                # Some servers send the UID after the literal, e.g. b' UID 42)'
+                if not uid_match and index + 1 < len(data) and isinstance(data[index + 1], bytes):
+                    uid_match = UID_PATTERN.search(data[index + 1])
+                if uid_match:
+                    stats.count(f"{stage}_bytes", len(response_part[1]))
+                    yield int(uid_match.group(1)), response_part[1]
+
+def fetch_uids(mail, uids, message_parts, stats=None, stage="fetch"):
+    """
+    Fetches message_parts for all UIDs with one UID FETCH per batch and returns {uid: bytes}.
+    """
+    return dict(iter_fetch_uids(mail, uids, message_parts, stats=stats, stage=stage))
+
+def body_fetch_item(max_bytes):
+    """
+    Returns the FETCH item for a message body, limited to max_bytes by the server (0 = unlimited).
+    """
+    return f'BODY.PEEK[]<0.{max_bytes}>' if max_bytes else 'BODY.PEEK[]'
+
+def received_date(email_date_str):
+    """
+    Returns the ISO date an email was sent, used to expire cached emails. Falls back to today.
+    """
+    try:
+        return email.utils.parsedate_to_datetime(email_date_str).astimezone(cest).date().isoformat()
+    except (TypeError, ValueError):
+        return get_today().isoformat()
+
+def classify_headers(headers, stats=None):
+    """
+    Returns (message_id, received) if the header block belongs to a delivery notification,
+    otherwise None. Headers that cannot be parsed are logged and counted as unreadable_emails,
+    so one broken email does not fail the classification of the others.
+    """
+    try:
+        msg = email.message_from_bytes(headers)
+        email_subject = decode_mime_subject(msg['subject'] or "")
+        if not match_delivery_service(msg['from'], email_subject):
+            return None
+        message_id = (msg['message-id'] or "").strip() or None
+        return message_id, received_date(msg['date'])
     except Exception as e:
-        return "Unknown"
+        log(f"{WARNING}Skipping email with unreadable headers: {e}{ENDC}")
+        (stats or NO_STATS).count("unreadable_emails")
+        return None
 
-def check_deliveries(args, mail):
+def filter_delivery_uids(mail, uids, stats=None):
+    """
+    Downloads only the FROM/SUBJECT/DATE/MESSAGE-ID headers of the UIDs and returns
+    {uid: (message_id, received)} for those that match a delivery service.
+    """
+    stats = stats or NO_STATS
+    headers = fetch_uids(mail, uids, 'BODY.PEEK[HEADER.FIELDS (FROM SUBJECT DATE MESSAGE-ID)]', stats, "fetch_headers")
+    matching_uids = {}
+    with stats.stage("classify"):
+        for uid in uids:
+            if uid not in headers:
+                continue
+            classified = classify_headers(headers[uid], stats)
+            if classified is not None:
+                matching_uids[uid] = classified
+    return matching_uids
+
+def decode_part(part):
+    """
+    Decodes the payload of a single MIME part to text.
+    """
+    payload = part.get_payload(decode=True) or b''
+    return decode_text(payload, part.get_content_charset())
+
+def extract_text_body(msg, prefer="plain"):
+    """
+    Returns the first text part of the preferred subtype ("plain" or "html"), falling back to
+    the first text part of the other one. Attachments and non-text parts are skipped without
+    being decoded, and only the selected part is decoded at all.
+    """
+    fallback = None
+    for part in msg.walk():
+        if part.is_multipart() or part.get_content_maintype() != 'text':
+            continue
+        if part.get_content_disposition() == 'attachment':
+            continue
+        subtype = part.get_content_subtype()
+        if subtype == prefer:
+            return decode_part(part)
+        if fallback is None and subtype in ('plain', 'html'):
+            fallback = part
+        elif fallback is None and not msg.is_multipart():
+            fallback = part
+    return decode_part(fallback) if fallback is not None else ""
+
+def process_message(raw_email, max_bytes=DEFAULT_MAX_MESSAGE_BYTES, stats=None):
+    """
+    Parses one RFC822 message and returns the deliveries extracted from it.
+
+    The carrier is determined from the headers first; the body is only decoded for delivery
+    notifications and only from the text part the carrier's extractor needs. Messages longer
+    than max_bytes are cut (0 = unlimited), the MIME parser tolerates the missing end.
+    """
+    stats = stats or NO_STATS
+    if max_bytes and len(raw_email) > max_bytes:
+        raw_email = raw_email[:max_bytes]
+    decode_started = time.perf_counter()
+    msg = email.message_from_bytes(raw_email)
+
+    # Decode the subject using the helper function
+    raw_subject = msg['subject'] or ""
+    email_subject = decode_mime_subject(raw_subject)
+
+    email_from = msg['from']
+    email_date = msg['date']
+    email_date_cest = convert_to_cest(email_date)  # Convert the date to CEST
+
+    log(f"\n{HEADER_COLOR}Email Details:{ENDC}")
+    log(f"  {OKBLUE}From:{ENDC} {email_from}")
+    log(f"  {OKGREEN}Subject:{ENDC} {email_subject}")
+    log(f"  {OKCYAN}Date:{ENDC} {email_date_cest}")
+
+    carrier = CARRIERS.match(email_from, email_subject)
+    if not carrier:
+        stats.add_time("decode", time.perf_counter() - decode_started)
+        log(f"{WARNING}No matching delivery service for email: {email_subject}{ENDC}")
+        return []
+
+    email_msg = extract_text_body(msg, carrier.body)
+    stats.add_time("decode", time.perf_counter() - decode_started)
+
+    # Print the email body for debugging
+    log(f"{OKCYAN}Email Body (truncated):{ENDC} {email_msg[:100]}...")
+
+    log(f"{OKGREEN}Processing {carrier.service} delivery...{ENDC}")
+    extract_started = time.perf_counter()
+    delivery = carrier.extract(email_subject, email_msg, email_date_cest)
+    extract_time = time.perf_counter() - extract_started
+    stats.add_time("extract", extract_time)
+    stats.add_carrier_time(carrier.service, extract_time)
+
+    return [delivery] if delivery else []
+
+def parse_message(raw_email, max_bytes=DEFAULT_MAX_MESSAGE_BYTES, stats=None):
+    """
+    Like process_message, but an email that cannot be parsed is logged, counted as
+    unreadable_emails and yields no deliveries instead of failing the whole scan.
+    """
     try:
-        past_date = today - timedelta(days=args.last_days)
-        tfmt = past_date.strftime('%d-%b-%Y')
+        return process_message(raw_email, max_bytes, stats)
+    except Exception as e:
+        log(f"{WARNING}Skipping unreadable email: {e}{ENDC}")
+        (stats or NO_STATS).count("unreadable_emails")
+        return []
 
-        search_query = f'(SINCE {tfmt})'
-        type, sdata = mail.search(None, search_query)
-        mail_ids = sdata[0]
-        id_list = mail_ids.split()
+def parse_messages(messages, max_bytes):
+    """
+    Parses a batch of (uid, raw_email) in a worker process of a backfill. Returns the records per
+    UID with the decode and extraction times and counters, which the scan adds to its own statistics.
+    """
+    stats = ScanStats()
+    results = [(uid, parse_message(raw_email, max_bytes, stats)) for uid, raw_email in messages]
+    return results, stats.timings, stats.carriers, stats.counters
+
+def parse_bodies(bodies, max_bytes, stats=None, parse_executor=None, max_pending=2):
+    """
+    Yields (uid, records) for the downloaded (uid, raw_email) bodies in the order they were fetched.
 
-        if not id_list:
-            print(f"{WARNING}No emails found matching the search criteria.{ENDC}")
+    With a process pool (backfill) each batch of bodies is parsed by a worker process while the
+    next batch is downloaded; at most max_pending batches are in flight, which bounds the memory.
+    """
+    stats = stats or NO_STATS
+    if parse_executor is None:
+        for uid, raw_email in bodies:
+            yield uid, parse_message(raw_email, max_bytes, stats)
+        return
+
+    bodies = iter(bodies)
+    pending = deque()
+    while True:
+        batch = list(islice(bodies, BODY_BATCH_SIZE))
+        if batch:
+            pending.append(parse_executor.submit(parse_messages, batch, max_bytes))
+        # Results are taken from the oldest batch first, so they stream back in fetch order
+        while pending and (not batch or len(pending) > max_pending):
+            results, timings, carriers, counters = pending.popleft().result()
+            stats.add_worker_stats(timings, carriers, counters)
+            yield from results
+        if not batch:
             return
 
-        # Process up to LAST_EMAILS emails
-        id_list = id_list[:args.last_emails]
-
-        print(f"{OKCYAN}Processing {len(id_list)} emails...{ENDC}")
-
-
-        for i in id_list:
-            typ, data = mail.fetch(i, '(RFC822)')
-            for response_part in data:
-                if isinstance(response_part, tuple):
-                    msg = email.message_from_bytes(response_part[1])
-                    
-                    # Decode the subject using the helper function
-                    raw_subject = msg['subject']
-                    email_subject = decode_mime_subject(raw_subject)
-                    
-                    email_from = msg['from']
-                    email_date = msg['date']
-                    email_date_cest = convert_to_cest(email_date)  # Convert the date to CEST
-                    email_msg = ""
-
-                    print(f"\n{HEADER_COLOR}Email Details:{ENDC}")
-                    print(f"  {OKBLUE}From:{ENDC} {email_from}")
-                    print(f"  {OKGREEN}Subject:{ENDC} {email_subject}")
-                    print(f"  {OKCYAN}Date:{ENDC} {email_date_cest}")
-
-                    if msg.is_multipart():
-                        email_msg = None
-                        html_msg = None
-                        for part in msg.walk():
-                            if part.get_content_maintype() == 'multipart':
-                                continue
-                            if part.get_content_type() == 'text/plain':
-                                email_msg = part.get_payload(decode=True).decode(part.get_content_charset() or 'utf-8', errors='replace')
-                            elif part.get_content_type() == 'text/html':
-                                html_msg = part.get_payload(decode=True).decode(part.get_content_charset() or 'utf-8', errors='replace')
-                        if not email_msg and html_msg:
-                            email_msg = html_msg
-                    else:
-                        email_msg = msg.get_payload(decode=True).decode(msg.get_content_charset() or 'utf-8', errors='replace')
-
-                    # Print the email body for debugging
-                    print(f"{OKCYAN}Email Body (truncated):{ENDC} {email_msg[:100]}...")
-
-                    # Handle Amazon emails
-                    if "amazon.de" in email_from.lower() and "versandt!" in email_subject:
-                        print(f"{OKGREEN}Processing Amazon delivery...{ENDC}")
-                        extract_amazon_delivery(email_subject, email_msg, email_date_cest)
-
-                    # Handle DHL emails
-                    elif "dhl.de" in email_from.lower() and "Sendung ist unterwegs" in email_subject:
-                        print(f"{OKGREEN}Processing DHL delivery...{ENDC}")
-                        extract_dhl_delivery(email_subject, email_msg, email_date_cest)
-
-                    # Handle DPD emails
-                    elif "dpd.de" in email_from.lower() and "Bald ist Ihr DPD Paket da" in email_subject:
-                        print(f"{OKGREEN}Processing DPD delivery...{ENDC}")
-                        extract_dpd_delivery(email_subject, email_msg, email_date_cest)
-
-                    else:
-                        print(f"{WARNING}No matching delivery service for email: {email_subject}{ENDC}")
+def check_deliveries(args, mail, state=None, stats=None, parse_executor=None):
+    """
+    Scans the selected folder and returns the extracted deliveries.
+
+    With a SyncStateStore only UIDs above the stored cursor are downloaded; deliveries of
+    previously processed UIDs are taken from the store as long as they are still inside
+    the search window. New delivery notifications whose Message-ID is already cached
+    (e.g. moved from another folder) are not downloaded or decoded again.
 
-    except Exception as e:
-        print(f"{FAIL}Error checking deliveries: {e}{ENDC}")
+    With a ProcessPoolExecutor (backfill) the bodies are parsed in worker processes while the
+    next batch is downloaded.
 
+    Errors are not caught: connection problems, throttling and rejected commands are left to
+    the caller, which discards a broken session and counts the failure against the account.
+    The cursor is not advanced then, so the next scan processes the same emails again.
+    """
+    stats = stats or NO_STATS
+    found_deliveries = []
+    uidvalidity = select_folder(mail, args.imap_folder)
+    mailbox = None
+    if state is not None and uidvalidity is not None:
+        mailbox = (args.email, args.imap_server, args.imap_folder)
+
+    past_date = get_today() - timedelta(days=args.last_days)
+    tfmt = past_date.strftime('%d-%b-%Y')
+
+    if mailbox is not None:
+        # Cached emails outside the search window are no longer needed
+        state.evict(*mailbox, past_date)
+
+    with stats.stage("search"):
+        uid_list = search_uids(mail, tfmt, getattr(args, "search_mode", "server"))
+    stats.count("emails_found", len(uid_list))
+
+    if not uid_list:
+        log(f"{WARNING}No emails found matching the search criteria.{ENDC}")
+        return found_deliveries
+
+    # Process up to LAST_EMAILS emails
+    uid_list = uid_list[:args.last_emails]
+
+    if mailbox is not None:
+        last_uid = state.last_uid(*mailbox, uidvalidity)
+        new_uids = [uid for uid in uid_list if uid > last_uid]
+        # Only UIDs still inside the search window count, moved or deleted emails drop out
+        cached = state.cached_records(*mailbox, uidvalidity, [uid for uid in uid_list if uid <= last_uid])
+        for uid in sorted(cached):
+            found_deliveries.extend(cached[uid])
+        stats.count("cache_hits_uid", len(cached))
+        log(f"{OKCYAN}Reusing {len(uid_list) - len(new_uids)} cached emails...{ENDC}")
+    else:
+        new_uids = uid_list
+
+    stats.count("emails_new", len(new_uids))
+    log(f"{OKCYAN}Processing {len(new_uids)} emails...{ENDC}")
+
+    # Classify by headers first, only delivery notifications are downloaded in full
+    matching_uids = filter_delivery_uids(mail, new_uids, stats)
+    stats.count("delivery_emails", len(matching_uids))
+    log(f"{OKCYAN}{len(matching_uids)} of {len(new_uids)} emails are delivery notifications.{ENDC}")
+
+    records_by_uid = {}
+    if mailbox is not None:
+        for uid, (message_id, received) in matching_uids.items():
+            records = state.records_by_message_id(message_id)
+            if records is not None:
+                records_by_uid[uid] = records
+        stats.count("cache_hits_message_id", len(records_by_uid))
+
+    # Bodies are parsed batch by batch as they arrive, capped at max_message_bytes each
+    max_bytes = getattr(args, "max_message_bytes", DEFAULT_MAX_MESSAGE_BYTES)
+    download_uids = [uid for uid in matching_uids if uid not in records_by_uid]
+    bodies = iter_fetch_uids(mail, download_uids, body_fetch_item(max_bytes), BODY_BATCH_SIZE, stats, "fetch_bodies")
+    max_pending = 2 * (getattr(args, "workers", None) or 1)
+    for uid, records in parse_bodies(bodies, max_bytes, stats, parse_executor, max_pending):
+        records_by_uid[uid] = records
+
+    for uid in matching_uids:
+        if uid not in records_by_uid:
+            continue
+        found_deliveries.extend(records_by_uid[uid])
+        if mailbox is not None:
+            message_id, received = matching_uids[uid]
+            state.store_records(*mailbox, uidvalidity, uid, message_id, received, records_by_uid[uid])
+
+    if mailbox is not None and new_uids:
+        # Only advance the cursor once every new message has been processed
+        state.set_last_uid(*mailbox, uidvalidity, max(last_uid, max(new_uids)))
+
+    return found_deliveries
+
+@register_carrier("Amazon", senders=["amazon.de"], subjects=["versandt!"])
 def extract_amazon_delivery(email_subject, email_msg, email_date):
     try:
         # Extract the order number
@@ -199,12 +572,12 @@ def extract_amazon_delivery(email_subject, email_msg, email_date):
         total_amount = extract_between(email_msg, "Gesamtbetrag der Bestellung:", "\n").strip() or "N/A"
 
         # Extract the delivery date
-        delivery_date_match = re.search(r'Zustellung[:\s]+(?:am\s)?(\w+,\s\d+\s\w+|\d+\s\w+|\w+)', email_msg)
+        delivery_date_match = AMAZON_DELIVERY_DATE_PATTERN.search(email_msg)
         if delivery_date_match:
             delivery_date = delivery_date_match.group(1).strip()
-            delivery_date = convert_relative_date(delivery_date)
+            delivery_date = convert_relative_date(delivery_date, email_date)
         else:
-            delivery_date = "Unknown"
+            delivery_date = None
 
         # Extract the item list and convert to a single string, truncating each item to 45 characters
         items_section = extract_between(email_msg, "Bestellübersicht", "Verkauft von")
@@ -212,7 +585,7 @@ def extract_amazon_delivery(email_subject, email_msg, email_date):
 
         # Process each item, and if truncated, add "..." at the end
         items_list = []
-        for item in re.split(r'[\n\r]+', items_section.strip()):
+        for item in LINE_BREAK_PATTERN.split(items_section.strip()):
             item = item.strip()
             if item:
                 if len(item) > max_item_length:
@@ -221,38 +594,38 @@ def extract_amazon_delivery(email_subject, email_msg, email_date):
                     truncated_item = item
                 items_list.append(truncated_item)
 
-        items = '; '.join(items_list) if items_list else "No items found"
-
-        deliveries.append({
-            "service": "Amazon",
-            "order_number": order_number,
-            "tracking_number": tracking_number,
-            "total_amount": total_amount,
-            "delivery_date": delivery_date,
-            "items": items,
-            "email_date": email_date
-        })
-
-        print(f"{OKGREEN}Amazon Delivery Extracted:{ENDC}")
-        print(f"  {OKBLUE}Order Number:{ENDC} {order_number}")
-        print(f"  {OKBLUE}Tracking Number:{ENDC} {tracking_number}")
-        print(f"  {OKBLUE}Total Amount:{ENDC} {total_amount}")
-        print(f"  {OKBLUE}Delivery Date:{ENDC} {delivery_date}")
-        print(f"  {OKBLUE}Items:{ENDC} {items}")
 
-    except Exception as e:
-        print(f"{FAIL}Error extracting Amazon delivery: {e}{ENDC}")
+        delivery = Delivery.create(
+            "Amazon",
+            order_number=order_number,
+            tracking_number=tracking_number,
+            total_amount=total_amount,
+            delivery_date=delivery_date,
+            items=items_list,
+            email_date=email_date,
+        )
+
+        log(f"{OKGREEN}Amazon Delivery Extracted:{ENDC}")
+        log(f"  {OKBLUE}Order Number:{ENDC} {order_number}")
+        log(f"  {OKBLUE}Tracking Number:{ENDC} {tracking_number}")
+        log(f"  {OKBLUE}Total Amount:{ENDC} {total_amount}")
+        log(f"  {OKBLUE}Delivery Date:{ENDC} {format_date(delivery_date) or 'Unknown'}")
+        log(f"  {OKBLUE}Items:{ENDC} {'; '.join(items_list) or 'No items found'}")
+        return delivery
 
-import re
+    except Exception as e:
+        log(f"{FAIL}Error extracting Amazon delivery: {e}{ENDC}")
+        return None
 
+@register_carrier("DHL", senders=["dhl.de"], subjects=["Sendung ist unterwegs"])
 def extract_dhl_delivery(email_subject, email_msg, email_date):
     try:
         # Initialize default values
         tracking_number = "Unknown"
-        delivery_date = "Unknown"
+        delivery_date = None
 
         # Extract all URLs from the email message
-        urls = re.findall(r'(https?://[^\s]+)', email_msg)
+        urls = URL_PATTERN.findall(email_msg)
         
         for url in urls:
             # Parse each URL to extract query parameters
@@ -263,41 +636,41 @@ def extract_dhl_delivery(email_subject, email_msg, email_date):
             if 'piececode' in query_params:
                 tracking_number = query_params['piececode'][0]
                 # Clean the tracking number (remove any trailing or leading non-alphanumeric characters)
-                tracking_number = re.sub(r'[^\w\d]', '', tracking_number)
+                tracking_number = NON_ALPHANUMERIC_PATTERN.sub('', tracking_number)
                 break  # Stop after finding the first valid URL with 'piececode'
         
         # Extract estimated delivery date
-        delivery_date_match = re.search(r'am\s\w+, den (\d{2})\.(\d{2})\.', email_msg)
+        delivery_date_match = DHL_DELIVERY_DATE_PATTERN.search(email_msg)
         if delivery_date_match:
             day = delivery_date_match.group(1)
             month = delivery_date_match.group(2)
-            # Format date to "Mittwoch, 4 September" or similar
-            delivery_date = convert_relative_date(f"{day}-{month}")
+            delivery_date = convert_relative_date(f"{day}-{month}", email_date)
         else:
-            delivery_date = "Unknown"
+            delivery_date = None
 
         # Extract sender's name or details from the subject
         sender_details = extract_between(email_subject, "Ihre ", " Sendung ist unterwegs").strip() or "DHL Shipment"
 
-        deliveries.append({
-            "service": "DHL",
-            "order_number": "N/A",  # DHL emails don't have order numbers
-            "tracking_number": tracking_number,
-            "total_amount": "N/A",  # DHL emails don't have total amounts
-            "delivery_date": delivery_date,
-            "items": sender_details,
-            "email_date": email_date
-        })
-
-        print(f"{OKGREEN}DHL Delivery Extracted:{ENDC}")
-        print(f"  {OKBLUE}Tracking Number:{ENDC} {tracking_number}")
-        print(f"  {OKBLUE}Delivery Date:{ENDC} {delivery_date}")
-        print(f"  {OKBLUE}Sender Details:{ENDC} {sender_details}")
+        delivery = Delivery.create(
+            "DHL",
+            tracking_number=tracking_number,
+            delivery_date=delivery_date,
+            items=[sender_details],
+            email_date=email_date,
+        )
+
+        log(f"{OKGREEN}DHL Delivery Extracted:{ENDC}")
+        log(f"  {OKBLUE}Tracking Number:{ENDC} {tracking_number}")
+        log(f"  {OKBLUE}Delivery Date:{ENDC} {format_date(delivery_date) or 'Unknown'}")
+        log(f"  {OKBLUE}Sender Details:{ENDC} {sender_details}")
+        return delivery
 
     except Exception as e:
-        print(f"{FAIL}Error extracting DHL delivery: {e}{ENDC}")
+        log(f"{FAIL}Error extracting DHL delivery: {e}{ENDC}")
+        return None
 
 
+@register_carrier("DPD", senders=["dpd.de"], subjects=["Bald ist Ihr DPD Paket da"])
 def extract_dpd_delivery(email_subject, email_msg, email_date):
     try:
         # Parse email_date into a datetime object using the correct format
@@ -307,167 +680,440 @@ def extract_dpd_delivery(email_subject, email_msg, email_date):
         decoded_email_msg = html.unescape(email_msg)
 
         # Extract the tracking number (both are together under "Versender & Paketnummer:")
-        tracking_match = re.search(r'Versender\s&\sPaketnummer.*?>([\w\s\/\.,-]+)<.*?(\d{10,20})', decoded_email_msg)
+        tracking_match = DPD_SENDER_PATTERN.search(decoded_email_msg)
         if tracking_match:
             sender = tracking_match.group(1).strip()
         else:
             sender = "Unknown Sender"
 
         # Extract the tracking number (usually consists of digits)
-        tracking_number_match = re.search(r'(\d{10,20})', email_msg)
+        tracking_number_match = DPD_TRACKING_PATTERN.search(email_msg)
         tracking_number = tracking_number_match.group(1) if tracking_number_match else "Unknown Tracking Number"
 
         # Extract the delivery date (look for something like "in 1-2 Werktagen" or similar)
-        delivery_window_match = re.search(r'in\s(\d+)(?:-(\d+))?\sWerktagen', email_msg)
+        delivery_window_match = DPD_DELIVERY_WINDOW_PATTERN.search(email_msg)
         if delivery_window_match:
             # If there's a range, use the first number (earliest delivery day)
             delivery_days = int(delivery_window_match.group(1))  # Group 1 captures the first digit
-            delivery_date = (email_datetime + timedelta(days=delivery_days)).strftime("%A, %d. %B")
+            delivery_date = (email_datetime + timedelta(days=delivery_days)).date()
         else:
-            delivery_date = "Unknown"
-
-        # Append the extracted details to the deliveries list
-        deliveries.append({
-            "service": "DPD",
-            "order_number": "N/A",  # Not available in DPD emails
-            "tracking_number": tracking_number,
-            "total_amount": "N/A",  # Not available in DPD emails
-            "delivery_date": delivery_date,
-            "items": sender,  # Use sender as item description for DPD
-            "email_date": email_date
-        })
-
-        print(f"{OKGREEN}DPD Delivery Extracted:{ENDC}")
-        print(f"  {OKBLUE}Sender:{ENDC} {sender}")
-        print(f"  {OKBLUE}Tracking Number:{ENDC} {tracking_number}")
-        print(f"  {OKBLUE}Estimated Delivery Date:{ENDC} {delivery_date}")
+            delivery_date = None
+
+        delivery = Delivery.create(
+            "DPD",
+            tracking_number=tracking_number,
+            delivery_date=delivery_date,
+            items=[sender],  # Use sender as item description for DPD
+            email_date=email_date,
+        )
+
+        log(f"{OKGREEN}DPD Delivery Extracted:{ENDC}")
+        log(f"  {OKBLUE}Sender:{ENDC} {sender}")
+        log(f"  {OKBLUE}Tracking Number:{ENDC} {tracking_number}")
+        log(f"  {OKBLUE}Estimated Delivery Date:{ENDC} {format_date(delivery_date) or 'Unknown'}")
+        return delivery
 
     except Exception as e:
-        print(f"{FAIL}Error extracting DPD delivery: {e}{ENDC}")
+        log(f"{FAIL}Error extracting DPD delivery: {e}{ENDC}")
+        return None
 
-def extract_between(text, start, end):
+def extract_notification_delivery(service, tracking_pattern, email_subject, email_msg, email_date):
     """
-    Helper function to extract text between two substrings.
+    Shared extractor for carriers whose notifications only carry a tracking number and
+    an announced delivery date ("Zustellung voraussichtlich am Dienstag, 03.09."). Returns
+    None without a tracking number: the email is no parcel notification (e.g. a newsletter
+    of the carrier) and a record without one could not be merged with anything.
     """
     try:
-        return text.split(start)[1].split(end)[0]
-    except IndexError:
-        return ""
+        tracking_match = tracking_pattern.search(email_msg)
+        if not tracking_match:
+            log(f"{WARNING}No {service} tracking number found, skipping email: {email_subject}{ENDC}")
+            return None
+        tracking_number = tracking_match.group(1)
 
-def parse_delivery_date(delivery_date_str, email_date_str):
-    """
-    Parse the delivery_date if available, else use email_date.
-    Ensure both are compared as `datetime.date` objects.
-    """
-    try:
-        # Handle the 'delivery_date' format first
-        if delivery_date_str and delivery_date_str != "Unknown":
-            # Example: "Mittwoch, 4. September"
-            date_match = re.search(r'(\d{1,2})\.\s(\w+)', delivery_date_str)
-            if date_match:
-                day = int(date_match.group(1))
-                month_name = date_match.group(2)
-                months = ["Januar", "Februar", "März", "April", "Mai", "Juni", "Juli", "August", "September", "Oktober", "November", "Dezember"]
-                month = months.index(month_name) + 1
-                current_year = today.year
-                return datetime(current_year, month, day).date()  # Convert to datetime.date
-
-        # If no delivery date or 'Unknown', parse email date
-        email_date_obj = datetime.strptime(email_date_str, "%Y-%m-%d %H:%M")
-        return email_date_obj.date()  # Ensure we return only the date part (as datetime.date)
+        delivery_date_match = NOTIFICATION_DELIVERY_DATE_PATTERN.search(email_msg)
+        if delivery_date_match:
+            delivery_date = convert_relative_date(
+                f"{delivery_date_match.group(1)}-{delivery_date_match.group(2)}", email_date
+            )
+        else:
+            delivery_date = None
+
+        delivery = Delivery.create(
+            service,
+            tracking_number=tracking_number,
+            delivery_date=delivery_date,
+            items=[email_subject],
+            email_date=email_date,
+        )
+
+        log(f"{OKGREEN}{service} Delivery Extracted:{ENDC}")
+        log(f"  {OKBLUE}Tracking Number:{ENDC} {tracking_number}")
+        log(f"  {OKBLUE}Delivery Date:{ENDC} {format_date(delivery_date) or 'Unknown'}")
+        return delivery
 
     except Exception as e:
-        return None  # Return None if date parsing fails
+        log(f"{FAIL}Error extracting {service} delivery: {e}{ENDC}")
+        return None
+
+@register_carrier("Hermes", senders=["myhermes.de", "hermesworld.com"], subjects=["Hermes Sendung", "Sendung ist unterwegs"])
+def extract_hermes_delivery(email_subject, email_msg, email_date):
+    return extract_notification_delivery("Hermes", HERMES_TRACKING_PATTERN, email_subject, email_msg, email_date)
 
-def merge_duplicate_deliveries(deliveries):
+@register_carrier("GLS", senders=["gls-pakete.de", "gls-group.eu"], subjects=["GLS Paket"])
+def extract_gls_delivery(email_subject, email_msg, email_date):
+    return extract_notification_delivery("GLS", GLS_TRACKING_PATTERN, email_subject, email_msg, email_date)
+
+@register_carrier("UPS", senders=["ups.com"], subjects=["UPS Update"])
+def extract_ups_delivery(email_subject, email_msg, email_date):
+    return extract_notification_delivery("UPS", UPS_TRACKING_PATTERN, email_subject, email_msg, email_date)
+
+def extract_between(text, start, end):
     """
-    Merges duplicate deliveries based on tracking_number.
-    Prioritizes detailed info from Amazon but keeps the latest delivery date from DHL if present.
-    Extends the list of delivered items from Amazon with the same tracking number.
-    Updates total_amount by concatenating prices with 'ü'.
-    Separates order_number with a semicolon if there are multiple for the same tracking number.
+    Helper function to extract text between two substrings: from the first occurrence of start
+    up to the next end (or the next start, whichever comes first). Uses find() instead of
+    split() to avoid splitting the whole message for every field.
     """
-    unique_deliveries = {}
-    
-    for delivery in deliveries:
-        tracking_number = delivery.get("tracking_number")
-        
-        # If the tracking number already exists, merge the details
-        if tracking_number in unique_deliveries:
-            existing_delivery = unique_deliveries[tracking_number]
-            
-            # Prefer Amazon details but update with latest DHL delivery date if newer
-            if delivery["service"] == "DHL":
-                # Keep the DHL delivery date if it's more recent or Amazon's is "Unknown"
-                existing_delivery["delivery_date"] = delivery["delivery_date"]
-            elif delivery["service"] == "Amazon":
-                # Extend the items list with new items, if present
-                existing_items = existing_delivery.get("items", "")
-                new_items = delivery.get("items", "")
-                if existing_items and new_items:
-                    existing_delivery["items"] = f"{existing_items}; {new_items}"
-                elif new_items:
-                    existing_delivery["items"] = new_items
-
-                # Concatenate total amounts with a "ü" in between
-                existing_total_amount = existing_delivery.get("total_amount", "")
-                new_total_amount = delivery.get("total_amount", "")
-                if existing_total_amount and new_total_amount:
-                    existing_delivery["total_amount"] = f"{existing_total_amount} + {new_total_amount}"
-                elif new_total_amount:
-                    existing_delivery["total_amount"] = new_total_amount
-
-                # Concatenate order numbers with a semicolon if different
-                existing_order_number = existing_delivery.get("order_number", "")
-                new_order_number = delivery.get("order_number", "")
-                if existing_order_number and new_order_number and existing_order_number != new_order_number:
-                    existing_delivery["order_number"] = f"{existing_order_number}; {new_order_number}"
-                elif new_order_number:
-                    existing_delivery["order_number"] = new_order_number
-
-        else:
-            # If it's the first time seeing this tracking number, add it to unique deliveries
-            unique_deliveries[tracking_number] = delivery
-    
-    # Convert the unique_deliveries dict back to a list
-    return list(unique_deliveries.values())
+    start_index = text.find(start)
+    if start_index == -1:
+        return ""
+    start_index += len(start)
+    stop_index = len(text)
+    for marker in (start, end):
+        marker_index = text.find(marker, start_index)
+        if marker_index != -1:
+            stop_index = min(stop_index, marker_index)
+    return text[start_index:stop_index]
+
+def is_delivered(delivery, statuses=None):
+    """
+    True once the carrier reports the parcel as delivered (statuses from a StatusTracker) or,
+    without such a status, once the announced delivery date has passed. The emails do not
+    confirm the actual delivery, so deliveries without a delivery date never count as delivered.
+    """
+    status = delivery_status(delivery, statuses) if statuses else None
+    if status is not None and status.delivered:
+        return True
+    delivery_date = delivery.delivery_date
+    return delivery_date is not None and delivery_date < get_today()
 
 def init_imap_connection(args):
     # Initialize IMAP connection
-    mail = imaplib.IMAP4_SSL(args.imap_server)
+    mail = imaplib.IMAP4_SSL(args.imap_server, timeout=IMAP_TIMEOUT)
     mail.login(args.email, args.password)
-    mail.select(args.imap_folder)
 
     return mail
 
-if __name__ == "__main__":
-    """Main entry point for the script."""
+def sort_deliveries(deliveries):
+    """
+    Sorts deliveries by their delivery date (or the day of the email if no date was announced).
+    """
+    deliveries.sort(
+        key=Delivery.sort_date,
+        reverse=True  # Sort in descending order to have the most up-to-date or future dates on top
+    )
+    return deliveries
+
+def check_local_source(args, state=None, stats=None, parse_executor=None):
+    """
+    Returns the unmerged deliveries of a Maildir folder, mbox file or directory of .eml files.
+
+    Files are memory-mapped and every message is classified by its headers before its body is
+    parsed. With a SyncStateStore, files whose inode, mtime and size are unchanged are not read
+    again, renamed files (Maildir new/ to cur/) keep their deliveries and a grown mbox file is
+    only read from its previous end on.
+    """
+    source = os.path.abspath(args.local_path)
+    stats = (stats or NO_STATS).source("local", source)
+    mailbox = open_local_mailbox(source)
+    cutoff = get_today() - timedelta(days=args.last_days)
+    max_bytes = getattr(args, "max_message_bytes", DEFAULT_MAX_MESSAGE_BYTES)
+
+    known = {}
+    if state is not None:
+        state.evict_local(source, cutoff)
+        known = state.local_files(source)
+    known_by_fingerprint = {fingerprint: path for path, fingerprint in known.items()}
+
+    with stats.stage("search"):
+        files = list(mailbox.files())
+    stats.count("files_found", len(files))
+
+    seen = {path for path, _ in files}
+    changed = []
+    for path, fingerprint in files:
+        previous = known.get(path)
+        if previous == fingerprint:
+            continue
+        moved_from = known_by_fingerprint.get(fingerprint) if previous is None else None
+        if moved_from in known and moved_from not in seen:
+            # Renamed, e.g. a Maildir message moved from new/ to cur/ once it was read
+            state.move_local_file(source, moved_from, path)
+            known.pop(moved_from)
+            continue
+        start = 0
+        if mailbox.appends and previous is not None and previous[0] == fingerprint[0] and fingerprint[2] >= previous[2]:
+            start = previous[2]
+        elif previous is not None:
+            state.forget_local_file(source, path)
+        changed.append((path, fingerprint, start))
+
+    if state is not None:
+        # Deleted files drop out together with their deliveries
+        for path in known:
+            if path not in seen:
+                state.forget_local_file(source, path)
+    stats.count("files_new", len(changed))
+    log(f"{OKCYAN}Reading {len(changed)} of {len(files)} files of {source}...{ENDC}")
+
+    matching = {}
+    records_by_key = {}
+
+    def iter_bodies():
+        for path, _, start in changed:
+            with mapped_file(path) as data:
+                for begin, end in mailbox.messages(data, start):
+                    stats.count("emails_new")
+                    with stats.stage("classify"):
+                        headers = data[begin:header_end(data, begin, end)]
+                        if not CARRIERS.mentions_sender(headers):
+                            continue
+                        classified = classify_headers(headers, stats)
+                        if classified is None or classified[1] < cutoff.isoformat():
+                            continue
+                    message_id, received = classified
+                    matching[(path, begin)] = (message_id, received)
+                    records = state.records_by_message_id(message_id) if state is not None else None
+                    if records is not None:
+                        stats.count("cache_hits_message_id")
+                        records_by_key[(path, begin)] = records
+                        continue
+                    body = data[begin:min(end, begin + max_bytes) if max_bytes else end]
+                    stats.count("fetch_bodies_bytes", len(body))
+                    yield (path, begin), body
+
+    max_pending = 2 * (getattr(args, "workers", None) or 1)
+    for key, records in parse_bodies(iter_bodies(), max_bytes, stats, parse_executor, max_pending):
+        records_by_key[key] = records
+    stats.count("delivery_emails", len(matching))
+
+    if state is None:
+        return [record for key in matching for record in records_by_key.get(key, [])]
+
+    for (path, offset), (message_id, received) in matching.items():
+        state.store_local_records(source, path, offset, message_id, received, records_by_key.get((path, offset), []))
+    for path, fingerprint, _ in changed:
+        state.set_local_file(source, path, fingerprint)
+    return state.local_records(source)
+
+def check_source(args, state=None, pool=None, stats=None, parse_executor=None, guards=None, tokens=None):
+    """
+    Logs in to one account and returns the unmerged deliveries found in its folder.
+    Statistics are reported into a child of stats per account and folder.
+
+    With an ImapConnectionPool the session of the account is reused instead of logging in
+    and out for every scan. Sources with a local_path are read from disk instead.
+
+    With AccountGuards every scan of an account takes a token of its rate limit (shared by
+    the sources of one scan through ScanTokens) and IMAP errors count against its circuit breaker. While the breaker is open or no token is left,
+    the deliveries cached in the SyncStateStore are returned without contacting the server.
+    """
+    if getattr(args, "local_path", None):
+        return check_local_source(args, state, stats, parse_executor)
+
+    stats = (stats or NO_STATS).source(args.email, args.imap_folder)
+    if guards is None:
+        return check_imap_source(args, state, pool, stats, parse_executor)
+
+    try:
+        with guards.guard(args.imap_server, args.email).attempt((imaplib.IMAP4.error, OSError), tokens):
+            return check_imap_source(args, state, pool, stats, parse_executor)
+    except (CircuitOpenError, RateLimitedError) as e:
+        since = get_today() - timedelta(days=args.last_days)
+        cached = state.mailbox_records(args.email, args.imap_server, args.imap_folder, since) if state is not None else None
+        if cached is None:
+            raise
+        stats.count("served_from_cache")
+        log(f"{WARNING}{e}, using {len(cached)} cached deliveries of {args.imap_folder}{ENDC}")
+        return cached
+
+def check_imap_source(args, state, pool, stats, parse_executor):
+    """
+    Scans the folder of one IMAP source over a pooled session or a new connection.
+    """
+    connect_started = time.perf_counter()
+    if pool is not None:
+        with pool.connection(args.imap_server, args.email, args.password) as mail:
+            stats.add_time("connect", time.perf_counter() - connect_started)
+            return check_deliveries(args, mail, state, stats, parse_executor)
+
+    with stats.stage("connect"):
+        mail = init_imap_connection(args)
+    try:
+        return check_deliveries(args, mail, state, stats, parse_executor)
+    finally:
+        try:
+            mail.logout()
+        except (imaplib.IMAP4.error, OSError):
+            pass
+
+class IncompleteScanError(Exception):
+    """
+    Raised by scan_sources when some, but not all sources failed. deliveries holds the merged
+    deliveries of the sources that were scanned, errors the exceptions of the others.
+    """
+
+    def __init__(self, errors, deliveries):
+        super().__init__(f"{len(errors)} source(s) failed: {errors[0]}")
+        self.errors = errors
+        self.deliveries = deliveries
+
+def scan_sources(sources, state=None, pool=None, max_workers=MAX_WORKERS, stats=None, parse_executor=None, guards=None):
+    """
+    Scans several (account, folder) sources concurrently with a bounded thread pool and merges
+    all deliveries in one pass, so a parcel announced to different addresses is deduplicated.
+
+    A failing source is logged and the others are still scanned. If every source fails, the
+    first error is raised; if only some fail, IncompleteScanError carries the deliveries of
+    the others, so callers never mistake a partial result for the complete one.
+    Sources sharing a pooled session are scanned one after another.
+    Pass a ScanStats to collect per-stage timings and counters, and a ProcessPoolExecutor to
+    parse the emails of a backfill on all cores; the sources share its worker processes.
+    AccountGuards rate limit the accounts and serve cached deliveries while one is failing.
+    """
+    stats = stats or NO_STATS
+    found_deliveries = []
+    errors = []
+    # One token per account and scan, however many of its folders are scanned
+    tokens = ScanTokens() if guards is not None else None
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(sources)))) as executor:
+        futures = [executor.submit(check_source, args, state, pool, stats, parse_executor, guards, tokens) for args in sources]
+        for args, future in zip(sources, futures):
+            try:
+                found_deliveries.extend(future.result())
+            except Exception as e:
+                log(f"{FAIL}Error scanning {args.local_path or f'{args.imap_folder} of {args.email}'}: {e}{ENDC}")
+                errors.append(e)
+
+    if state is not None:
+        state.save()
+
+    if errors and len(errors) == len(sources):
+        raise errors[0]
+
+    # Merge the notifications of the same parcel by tracking and order number
+    with stats.stage("merge"):
+        merged_deliveries = merge_deliveries(found_deliveries)
+    with stats.stage("sort"):
+        deliveries = sort_deliveries(merged_deliveries)
+
+    if errors:
+        raise IncompleteScanError(errors, deliveries)
+    return deliveries
+
+def source_options(args, **overrides):
+    """
+    Copies the options of a scan for another source, e.g. source_options(args, imap_folder="Archiv").
+    """
+    source = argparse.Namespace(**vars(args))
+    for key, value in overrides.items():
+        setattr(source, key, value)
+    return source
+
+def build_parser():
     parser = argparse.ArgumentParser(description="Check package deliveries via email.")
-    parser.add_argument("--email", required=True, help="Email address to log in to.")
-    parser.add_argument("--password", required=True, help="Needs to be an app passwod, not your google accounts password.")
+    parser.add_argument("--email", help="Email address to log in to.")
+    parser.add_argument("--password", help="Needs to be an app passwod, not your google accounts password.")
     parser.add_argument("--imap_server", default="imap.gmail.com", help="IMAP email server.")
     parser.add_argument("--last_days", type=int, default=10, help="Number of days to look back.")
     parser.add_argument("--last_emails", type=int, default=50, help="Maximum number of emails to process.")
     parser.add_argument("--imap_folder", default="INBOX", help="IMAP folder to search.")
+    parser.add_argument("--local_path", default=None, help="Maildir folder, mbox file or directory of .eml files to read instead of an IMAP account.")
     parser.add_argument("--output_file", default="deliveries.json", help="Path to save the deliveries JSON.")
+    parser.add_argument("--search_mode", default="server", choices=["server", "client"], help="Match delivery emails on the IMAP server (server) or only after downloading their headers (client).")
+    parser.add_argument("--max_message_bytes", type=int, default=DEFAULT_MAX_MESSAGE_BYTES, help="Maximum number of bytes downloaded per email, 0 for no limit.")
+    parser.add_argument("--sources_file", default=None, help="JSON list of sources to scan concurrently, each overriding email, password, imap_server and imap_folder.")
+    parser.add_argument("--max_workers", type=int, default=MAX_WORKERS, help="Maximum number of sources scanned at the same time.")
+    parser.add_argument("--state_file", default=None, help="Path to the SQLite sync state file. Enables incremental scans that only fetch and parse new emails.")
+    parser.add_argument("--backfill", action="store_true", help="Parse the emails in worker processes while the next ones are downloaded, for large --last_days/--last_emails.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Number of worker processes of a backfill.")
+    parser.add_argument("--status_url", default=None, help="URL of a tracking service answering GET ?tracking_numbers=A,B with the status of each parcel in transit.")
+    parser.add_argument("--status_ttl", type=int, default=DEFAULT_TTL, help="Seconds a looked up parcel status is reused.")
+    parser.add_argument("--stats", default=None, choices=["log", "prometheus"], help="Print the timings and counters of the scan as one line or in the Prometheus text format.")
+    return parser
+
+def scan_options(email, password, **options):
+    """
+    Builds the options of a scan with the same defaults as the CLI.
+    """
+    args = build_parser().parse_args([])
+    args.email = email
+    args.password = password
+    for key, value in options.items():
+        setattr(args, key, value)
+    return args
 
+if __name__ == "__main__":
+    """Main entry point for the script."""
+    VERBOSE = True
+    parser = build_parser()
     args = parser.parse_args()
 
-    mail = init_imap_connection(args)
+    if args.sources_file:
+        with open(args.sources_file, 'r') as sources_file:
+            sources = [source_options(args, **source) for source in json.load(sources_file)]
+    else:
+        sources = [args]
+    if any(not source.local_path and (not source.email or not source.password) for source in sources):
+        parser.error("--email and --password are required for every source without --local_path")
+
+    state = SyncStateStore(args.state_file, PARSER_VERSION) if args.state_file else None
+
+    stats = ScanStats() if args.stats else None
+    parse_executor = ProcessPoolExecutor(max_workers=args.workers) if args.backfill else None
+    complete = True
+    try:
+        deliveries = scan_sources(sources, state, max_workers=args.max_workers, stats=stats, parse_executor=parse_executor)
+    except IncompleteScanError as e:
+        # Shown, but not compared with the previous output: the missing deliveries did not expire
+        deliveries = e.deliveries
+        complete = False
+    finally:
+        if parse_executor is not None:
+            parse_executor.shutdown()
+
+    statuses = {}
+    if args.status_url:
+        tracker = StatusTracker([JsonStatusProvider(args.status_url)], args.status_ttl, state)
+        statuses = tracker.update(deliveries, stats)
+
+    output = []
+    for delivery in deliveries:
+        status = delivery_status(delivery, statuses)
+        output.append({**delivery.as_dict(), **({"status": status.status} if status else {})})
 
-    check_deliveries(args, mail)
-    
-    # Remove duplicate deliveries by merging them based on tracking number
-    deliveries = merge_duplicate_deliveries(deliveries)
-    
-    # Sort deliveries by 'delivery_date' (or 'email_date' if 'delivery_date' is not available)
-    deliveries.sort(
-        key=lambda x: parse_delivery_date(x['delivery_date'], x['email_date']),
-        reverse=True  # Sort in descending order to have the most up-to-date or future dates on top
-    )
-    
     print(f"\n{HEADER_COLOR}Final Deliveries Summary (After Deduplication):{ENDC}")
-    print(json.dumps(deliveries, indent=4))
+    print(json.dumps(output, indent=4))
     
-    with open(args.output_file, 'w') as json_file:
-        json.dump(deliveries, json_file)
+    try:
+        with open(args.output_file, 'r') as json_file:
+            previous_output = json.load(json_file)
+        previous = {delivery_key(delivery): delivery for delivery in map(Delivery.from_dict, previous_output)}
+    except (OSError, ValueError):
+        previous_output, previous = [], {}
+    previous_statuses = [delivery.get("status") for delivery in previous_output]
+
+    # The output file is only rewritten if a delivery was added, updated or expired or its status changed
+    if complete:
+        _, _, changes = diff_deliveries(previous, deliveries, set(), lambda delivery: False)
+        if has_changes(changes) or not previous or previous_statuses != [delivery.get("status") for delivery in output]:
+            with open(args.output_file, 'w') as json_file:
+                json.dump(output, json_file)
+        print(f"\n{HEADER_COLOR}Changes:{ENDC} " + ", ".join(f"{len(changes[kind])} {kind}" for kind in ("added", "updated", "expired")))
+    else:
+        print(f"\n{FAIL}Incomplete scan, {args.output_file} was left unchanged.{ENDC}")
+
+    if args.stats == "log":
+        print(f"\n{HEADER_COLOR}Scan statistics:{ENDC} {stats.as_log_line()}")
+    elif args.stats == "prometheus":
+        print(format_prometheus(stats.samples()), end="")
@@ -0,0 +1,169 @@
+"""
+Locale-aware resolution of the delivery dates announced in carrier emails.
+
+Announced dates ("Morgen", "Dienstag, 3. September", "03.09.", "September 4", "mardi 3 septembre")
+are resolved once into datetime.date objects and stored as ISO dates; display strings are only
+produced by format_date. Month, weekday and relative day names of all supported locales are
+looked up in tables built at import.
+"""
+
+import re
+import unicodedata
+from datetime import date, timedelta
+from functools import lru_cache
+
+DEFAULT_LOCALE = "de"
+
+MONTH_NAMES = {
+    "de": ("Januar", "Februar", "März", "April", "Mai", "Juni", "Juli", "August", "September",
+           "Oktober", "November", "Dezember"),
+    "en": ("January", "February", "March", "April", "May", "June", "July", "August", "September",
+           "October", "November", "December"),
+    "fr": ("janvier", "février", "mars", "avril", "mai", "juin", "juillet", "août", "septembre",
+           "octobre", "novembre", "décembre"),
+}
+
+WEEKDAY_NAMES = {
+    "de": ("Montag", "Dienstag", "Mittwoch", "Donnerstag", "Freitag", "Samstag", "Sonntag"),
+    "en": ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"),
+    "fr": ("lundi", "mardi", "mercredi", "jeudi", "vendredi", "samedi", "dimanche"),
+}
+
+# Offset in days from the email date
+RELATIVE_DAYS = {
+    "heute": 0, "morgen": 1, "übermorgen": 2,
+    "today": 0, "tomorrow": 1, "day after tomorrow": 2,
+    "aujourd'hui": 0, "demain": 1, "après-demain": 2,
+}
+
+ISO_DATE_PATTERN = re.compile(r'(\d{4})-(\d{2})-(\d{2})')
+NUMERIC_DATE_PATTERN = re.compile(r'(?<!\d)(\d{1,2})[.\-/](\d{1,2})(?:[.\-/](\d{4}|\d{2})(?!\d))?')
+DAY_MONTH_PATTERN = re.compile(r'(?<!\d)(\d{1,2})(?:\.|er)?\s+([^\W\d_]+)\.?(?:\s+(\d{4}))?')
+MONTH_DAY_PATTERN = re.compile(r'([^\W\d_]+)\.?\s+(\d{1,2})(?:st|nd|rd|th)?(?!\d)(?:,?\s+(\d{4}))?')
+WORD_PATTERN = re.compile(r'[^\W\d_]+')
+
+
+def _fold(name):
+    """Lower case without accents, "März" and "Maerz" / "Marz" are found the same way."""
+    name = name.lower().replace("ä", "ae").replace("ö", "oe").replace("ü", "ue")
+    return "".join(char for char in unicodedata.normalize("NFKD", name) if not unicodedata.combining(char))
+
+
+def _build_lookup(names_by_locale, start, abbreviations=True):
+    """
+    Maps full names and unambiguous abbreviations ("Sep", "Sept", "déc") of all locales to
+    their number. Prefixes shared by different numbers ("jui" for juin / juillet) are left out.
+    """
+    lookup = {}
+    prefixes = {}
+    for names in names_by_locale.values():
+        for number, name in enumerate(names, start):
+            for variant in {name.lower(), _fold(name), _fold(name).replace("ae", "a")}:
+                lookup[variant] = number
+                for length in (3, 4) if abbreviations else ():
+                    if len(variant) > length:
+                        prefixes.setdefault(variant[:length], set()).add(number)
+    for prefix, numbers in prefixes.items():
+        if len(numbers) == 1:
+            lookup.setdefault(prefix, numbers.pop())
+    return lookup
+
+
+MONTHS = _build_lookup(MONTH_NAMES, 1)
+# Abbreviated weekdays would match words like "die" or "mit"
+WEEKDAYS = _build_lookup(WEEKDAY_NAMES, 0, abbreviations=False)
+RELATIVE_DAYS_PATTERN = re.compile(
+    r'\b(' + '|'.join(re.escape(name) for name in sorted(RELATIVE_DAYS, key=len, reverse=True)) + r')\b'
+)
+
+
+def _month_number(word):
+    return MONTHS.get(word.lower()) or MONTHS.get(_fold(word))
+
+
+def _valid_date(year, month, day):
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+def nearest_date(month, day, reference, year=None):
+    """
+    Returns the date with the given day and month. Without a year the one nearest to the
+    reference is chosen, a January date announced in December belongs to the next year.
+    """
+    if year is not None:
+        return _valid_date(year + 2000 if year < 100 else year, month, day)
+    candidates = [_valid_date(reference.year + offset, month, day) for offset in (-1, 0, 1)]
+    candidates = [candidate for candidate in candidates if candidate is not None]
+    if not candidates:
+        return None
+    return min(candidates, key=lambda candidate: abs((candidate - reference).days))
+
+
+@lru_cache(maxsize=4096)
+def resolve_date(text, reference):
+    """
+    Resolves an announced delivery date relative to the reference (the day of the email).
+    Returns a datetime.date or None if the text contains no date.
+    """
+    if not text:
+        return None
+    text = text.strip()
+
+    match = ISO_DATE_PATTERN.fullmatch(text)
+    if match:
+        return _valid_date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+
+    match = NUMERIC_DATE_PATTERN.search(text)
+    if match:
+        year = int(match.group(3)) if match.group(3) else None
+        return nearest_date(int(match.group(2)), int(match.group(1)), reference, year)
+
+    for pattern, day_group, month_group in ((DAY_MONTH_PATTERN, 1, 2), (MONTH_DAY_PATTERN, 2, 1)):
+        for match in pattern.finditer(text):
+            month = _month_number(match.group(month_group))
+            if month:
+                year = int(match.group(3)) if match.group(3) else None
+                return nearest_date(month, int(match.group(day_group)), reference, year)
+
+    match = RELATIVE_DAYS_PATTERN.search(text.lower())
+    if match:
+        return reference + timedelta(days=RELATIVE_DAYS[match.group(1)])
+
+    # A weekday on its own is the next such day from the email date on
+    for word in WORD_PATTERN.findall(text):
+        weekday = WEEKDAYS.get(_fold(word))
+        if weekday is not None:
+            return reference + timedelta(days=(weekday - reference.weekday()) % 7)
+
+    return None
+
+
+@lru_cache(maxsize=1024)
+def format_date(value, locale=DEFAULT_LOCALE):
+    """
+    Formats an ISO date (or datetime.date) for display, e.g. "Mittwoch, 4. September",
+    "Wednesday, September 4" or "mercredi 4 septembre". Other values are returned unchanged.
+    """
+    if not isinstance(value, (str, date)):
+        return value
+    if isinstance(value, str):
+        match = ISO_DATE_PATTERN.fullmatch(value)
+        if not match:
+            return value
+        value = _valid_date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+        if value is None:
+            return match.group(0)
+
+    locale = (locale or DEFAULT_LOCALE).split("-")[0].lower()
+    if locale not in MONTH_NAMES:
+        locale = DEFAULT_LOCALE
+    weekday = WEEKDAY_NAMES[locale][value.weekday()]
+    month = MONTH_NAMES[locale][value.month - 1]
+    if locale == "en":
+        return f"{weekday}, {month} {value.day}"
+    if locale == "fr":
+        return f"{weekday} {value.day} {month}"
+    return f"{weekday}, {value.day}. {month}"
@@ -0,0 +1,47 @@
+CHANGE_KINDS = ("added", "updated", "delivered", "expired")
+
+
+def delivery_key(delivery):
+    """
+    Returns the stable key of a Delivery: its tracking numbers, or service and order number
+    (or email date) for notifications without one.
+    """
+    if delivery.tracking_numbers:
+        return ", ".join(delivery.tracking_numbers)
+    if delivery.order_numbers:
+        return f"{delivery.service}:{'; '.join(delivery.order_numbers)}"
+    email_date = delivery.email_date.strftime("%Y-%m-%d %H:%M") if delivery.email_date else "Unknown"
+    return f"{delivery.service}:{email_date}"
+
+
+def diff_deliveries(previous, deliveries, delivered, is_delivered):
+    """
+    Compares the Delivery records of a scan with the previous ones ({key: delivery}).
+
+    Returns (current, delivered, changes): the new {key: delivery} map, the keys reported as
+    delivered so far and a dict with the added, updated, delivered and expired deliveries.
+    is_delivered(delivery) decides whether a parcel counts as delivered; each parcel is
+    reported as delivered once. Parcels missing from the scan are expired.
+    """
+    current = {}
+    for delivery in deliveries:
+        current.setdefault(delivery_key(delivery), delivery)
+
+    changes = {kind: [] for kind in CHANGE_KINDS}
+    for key, delivery in current.items():
+        if key not in previous:
+            changes["added"].append(delivery)
+        elif previous[key] != delivery:
+            changes["updated"].append(delivery)
+        if key not in delivered and is_delivered(delivery):
+            changes["delivered"].append(delivery)
+
+    changes["expired"] = [delivery for key, delivery in previous.items() if key not in current]
+
+    delivered = {key for key in delivered if key in current}
+    delivered.update(delivery_key(delivery) for delivery in changes["delivered"])
+    return current, delivered, changes
+
+
+def has_changes(changes):
+    return any(changes[kind] for kind in CHANGE_KINDS)
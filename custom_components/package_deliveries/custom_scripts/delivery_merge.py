@@ -0,0 +1,118 @@
+"""
+Merges the notifications of one parcel (shop confirmation, carrier announcements) into a
+single delivery.
+
+Records are linked with a union-find over two indexes: the normalized tracking references of a
+record and its order numbers. Records without a tracking number have none to link, so they no
+longer collapse into one delivery.
+"""
+
+import re
+from dataclasses import replace
+from datetime import datetime
+
+try:
+    from .delivery_record import Carrier
+except ImportError:  # Executed as a standalone script
+    from delivery_record import Carrier
+
+# Services whose emails describe the order (items, amounts), carriers add tracking and dates
+SHOP_SERVICES = (Carrier.AMAZON,)
+
+NON_REFERENCE_PATTERN = re.compile(r'[^0-9A-Z]')
+
+
+def normalize_reference(value):
+    """Tracking references are compared upper case and without spaces or dashes ("jjd 0001-2" = "JJD00012")."""
+    return NON_REFERENCE_PATTERN.sub('', value.upper())
+
+
+def _date_rank(delivery):
+    """A known date beats none, a carrier's date beats the shop's estimate, a newer email beats an older one."""
+    return (
+        delivery.delivery_date is not None,
+        delivery.service not in SHOP_SERVICES,
+        delivery.email_date or datetime.min,
+    )
+
+
+def _merge_group(records):
+    """
+    Combines the records of one parcel. The shop record is the base, its items and the order
+    amount of each order are kept; the total is summed from the Decimal amounts.
+    """
+    if len(records) == 1:
+        return records[0]
+    base = next((record for record in records if record.service in SHOP_SERVICES), records[0])
+
+    tracking_numbers = {}
+    order_numbers = {}
+    items = {}
+    amounts = {}
+    for record in records:
+        for value in record.tracking_numbers:
+            tracking_numbers.setdefault(normalize_reference(value), value)
+        if record is not base and record.service not in SHOP_SERVICES:
+            continue
+        order_numbers.update(dict.fromkeys(record.order_numbers))
+        items.update(dict.fromkeys(record.items))
+        # Every shipment mail of an order repeats the order total, it is counted once per order
+        for amount in record.amounts:
+            amounts.setdefault(record.order_numbers[0] if record.order_numbers else id(record), amount)
+
+    return replace(
+        base,
+        tracking_numbers=tuple(tracking_numbers.values()),
+        order_numbers=tuple(order_numbers),
+        items=tuple(items),
+        amounts=tuple(amounts.values()),
+        delivery_date=max(records, key=_date_rank).delivery_date,
+    )
+
+
+def merge_deliveries(deliveries):
+    """
+    Merges the deliveries of one scan in linear time and returns them in order of first appearance.
+
+    Records sharing a tracking reference belong to one parcel; a record may list several
+    references ("JJD01, JJD02") and then joins all of them. Order numbers only attach records
+    without any tracking reference (e.g. order confirmations) to a parcel of their order, so
+    the parcels of a multi-parcel order stay separate deliveries.
+    """
+    parent = list(range(len(deliveries)))
+
+    def find(index):
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    def union(first, second):
+        first, second = find(first), find(second)
+        if first != second:
+            # The earlier record stays the root, which keeps the order of first appearance
+            parent[max(first, second)] = min(first, second)
+
+    by_reference = {}
+    by_order = {}
+    untracked = []
+    for index, delivery in enumerate(deliveries):
+        references = [normalize_reference(value) for value in delivery.tracking_numbers]
+        references = [reference for reference in references if reference]
+        orders = delivery.order_numbers
+        for reference in references:
+            union(index, by_reference.setdefault(reference, index))
+        if references:
+            for order in orders:
+                by_order.setdefault(order, index)
+        elif orders:
+            untracked.append((index, orders))
+
+    for index, orders in untracked:
+        for order in orders:
+            union(index, by_order.setdefault(order, index))
+
+    groups = {}
+    for index, delivery in enumerate(deliveries):
+        groups.setdefault(find(index), []).append(delivery)
+    return [_merge_group(records) for records in groups.values()]
@@ -0,0 +1,258 @@
+"""
+Typed delivery records.
+
+Extractors build Delivery objects holding native values: the carrier, the tracking and order
+numbers as tuples, the delivery date as datetime.date and the order amounts as Decimal. Merging,
+sorting and diffing work on these values; the dicts of the sensor attributes, events and the
+CLI output are only produced at the edge by as_dict(), with amounts formatted for display by
+format_amount like dates by format_date. Caches store records in a compact,
+versioned list form (to_compact / from_compact).
+"""
+
+import re
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from enum import Enum
+from functools import lru_cache
+
+try:
+    from .dates import DEFAULT_LOCALE, resolve_date
+except ImportError:  # Executed as a standalone script
+    from dates import DEFAULT_LOCALE, resolve_date
+
+# Bump whenever the compact form changes, restoring an older one then raises ValueError
+RECORD_VERSION = 1
+
+EMAIL_DATE_FORMAT = "%Y-%m-%d %H:%M"
+MINUTES_PER_DAY = 24 * 60
+
+# Texts the extractors use for values an email lacks
+PLACEHOLDER_VALUES = ("", "N/A", "Unknown", "Unknown Tracking Number")
+
+REFERENCE_SEPARATOR_PATTERN = re.compile(r'[,;]')
+AMOUNT_NUMBER_PATTERN = re.compile(r'\d[\d.,]*')
+CURRENCY_PATTERN = re.compile(r'\b[A-Z]{3}\b|[€$£]')
+CURRENCY_SYMBOLS = {"€": "EUR", "$": "USD", "£": "GBP"}
+CURRENCY_DISPLAY = {code: symbol for symbol, code in CURRENCY_SYMBOLS.items()}
+
+
+class Carrier(str, Enum):
+    """The built-in delivery services. Carriers registered by users keep their service name as str."""
+
+    AMAZON = "Amazon"
+    DHL = "DHL"
+    DPD = "DPD"
+    HERMES = "Hermes"
+    GLS = "GLS"
+    UPS = "UPS"
+
+    def __str__(self):
+        return self.value
+
+
+def carrier_of(service):
+    """Returns the Carrier of a service name, or the name itself for carriers registered by users."""
+    try:
+        return Carrier(service)
+    except ValueError:
+        return service
+
+
+def split_values(value):
+    """Returns the single values of a field listing several ("JJD01, JJD02"), placeholders dropped."""
+    if not isinstance(value, str):
+        return []
+    if "," not in value and ";" not in value:
+        value = value.strip()
+        return [] if value in PLACEHOLDER_VALUES else [value]
+    values = (part.strip() for part in REFERENCE_SEPARATOR_PATTERN.split(value))
+    return [part for part in values if part not in PLACEHOLDER_VALUES]
+
+
+@lru_cache(maxsize=4096)
+def parse_amount(text):
+    """
+    Parses an amount like "EUR 1.234,56", "23,99 €" or "50.99 EUR" into (Decimal, currency).
+    Returns None for placeholders and texts without a number.
+    """
+    if not text or text in PLACEHOLDER_VALUES:
+        return None
+    number = AMOUNT_NUMBER_PATTERN.search(text)
+    if not number:
+        return None
+    digits = number.group(0).rstrip(".,")
+
+    # The last separator is the decimal mark unless it groups thousands ("1.234")
+    integer, fraction = digits, ""
+    last = max(digits.rfind(","), digits.rfind("."))
+    if last != -1:
+        mark = digits[last]
+        other = "." if mark == "," else ","
+        if other in digits or (digits.count(mark) == 1 and len(digits) - last - 1 != 3):
+            integer, fraction = digits[:last], digits[last + 1:]
+    integer = integer.replace(",", "").replace(".", "")
+
+    currency = CURRENCY_PATTERN.search(text)
+    currency = CURRENCY_SYMBOLS.get(currency.group(0), currency.group(0)) if currency else ""
+    try:
+        return Decimal(f"{integer}.{fraction}" if fraction else integer), currency
+    except InvalidOperation:
+        return None
+
+
+def format_amount(amount, currency, locale=DEFAULT_LOCALE):
+    """
+    Formats an amount for display, e.g. "1.234,56 €" (de), "€1,234.56" (en) or
+    "1 234,56 €" (fr). Currencies without a symbol keep their code ("12,50 CHF").
+    """
+    locale = (locale or DEFAULT_LOCALE).split("-")[0].lower()
+    number = f"{amount:,.2f}"
+    symbol = CURRENCY_DISPLAY.get(currency, currency)
+    if locale == "en":
+        return f"{symbol}{number}" if symbol != currency else f"{number} {currency}".strip()
+    grouping = " " if locale == "fr" else "."
+    number = number.replace(",", " ").replace(".", ",").replace(" ", grouping)
+    return f"{number} {symbol}".strip()
+
+
+def _parse_email_date(text):
+    try:
+        return datetime.strptime(text, EMAIL_DATE_FORMAT)
+    except (TypeError, ValueError):
+        return None
+
+
+def _items(items):
+    """Items are lists since PARSER_VERSION 4, older records carry them joined with "; "."""
+    if isinstance(items, (list, tuple)):
+        return tuple(items)
+    if not items or items in PLACEHOLDER_VALUES or items == "No items found":
+        return ()
+    return tuple(item.strip() for item in items.split(";") if item.strip())
+
+
+@dataclass(slots=True)
+class Delivery:
+    """
+    One parcel. amounts holds (Decimal, currency) per order, the email date is the local time
+    the notification was received; None and empty tuples stand for values the emails lack.
+    """
+
+    service: Carrier | str
+    tracking_numbers: tuple = ()
+    order_numbers: tuple = ()
+    delivery_date: date | None = None
+    amounts: tuple = ()
+    items: tuple = ()
+    email_date: datetime | None = None
+
+    @classmethod
+    def create(cls, service, tracking_number=None, order_number=None, delivery_date=None,
+               total_amount=None, items=(), email_date=None):
+        """Builds a record from the texts found in an email, placeholders ("N/A", "Unknown") become empty values."""
+        amount = parse_amount(total_amount)
+        return cls(
+            carrier_of(service),
+            tuple(split_values(tracking_number)),
+            tuple(split_values(order_number)),
+            delivery_date,
+            (amount,) if amount is not None else (),
+            _items(items),
+            _parse_email_date(email_date) if isinstance(email_date, str) else email_date,
+        )
+
+    @property
+    def total_amount(self):
+        """Sum of the order amounts as (Decimal, currency), None without amounts or with mixed currencies."""
+        currencies = {currency for _, currency in self.amounts}
+        if len(currencies) != 1:
+            return None
+        return sum(amount for amount, _ in self.amounts), currencies.pop()
+
+    def sort_date(self):
+        """The delivery date, or the day of the email without one."""
+        if self.delivery_date is not None:
+            return self.delivery_date
+        return self.email_date.date() if self.email_date is not None else date.min
+
+    def as_dict(self, locale=DEFAULT_LOCALE):
+        """
+        The record as JSON-compatible dict with placeholders, for attributes, events and the CLI
+        output. Amounts are written in the notation of the locale.
+        """
+        amounts = [format_amount(amount, currency, locale) for amount, currency in self.amounts]
+        total = self.total_amount
+        return {
+            "service": str(self.service),
+            "order_number": "; ".join(self.order_numbers) or "N/A",
+            "tracking_number": ", ".join(self.tracking_numbers) or "Unknown",
+            "total_amount": format_amount(*total, locale) if total else " + ".join(amounts) or "N/A",
+            "amounts": amounts,
+            "delivery_date": self.delivery_date.isoformat() if self.delivery_date else "Unknown",
+            "items": list(self.items),
+            "email_date": self.email_date.strftime(EMAIL_DATE_FORMAT) if self.email_date else "Unknown",
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Reads a record written by as_dict() or by an older version (display dates like
+        "Mittwoch, 4. September", items joined with "; "), e.g. a previous CLI output file.
+        """
+        email_date = _parse_email_date(data.get("email_date"))
+        amounts = data.get("amounts")
+        if not isinstance(amounts, list):
+            amounts = [data.get("total_amount")]
+        delivery_date = data.get("delivery_date")
+        if delivery_date not in PLACEHOLDER_VALUES and isinstance(delivery_date, str):
+            reference = email_date.date() if email_date is not None else date.today()
+            delivery_date = resolve_date(delivery_date, reference)
+        else:
+            delivery_date = None
+        return cls(
+            carrier_of(data.get("service")),
+            tuple(split_values(data.get("tracking_number"))),
+            tuple(split_values(data.get("order_number"))),
+            delivery_date,
+            tuple(amount for amount in map(parse_amount, amounts) if amount is not None),
+            _items(data.get("items")),
+            email_date,
+        )
+
+    def to_compact(self):
+        """
+        The record as a JSON-compatible list without field names: version, service, tracking
+        and order numbers, the delivery date as ordinal, the email date in minutes since
+        0001-01-01, items and [amount, currency] pairs.
+        """
+        email_date = self.email_date
+        return [
+            RECORD_VERSION,
+            str(self.service),
+            list(self.tracking_numbers),
+            list(self.order_numbers),
+            self.delivery_date.toordinal() if self.delivery_date else None,
+            email_date.toordinal() * MINUTES_PER_DAY + email_date.hour * 60 + email_date.minute if email_date else None,
+            list(self.items),
+            [[str(amount), currency] for amount, currency in self.amounts],
+        ]
+
+    @classmethod
+    def from_compact(cls, data):
+        """Restores a record from to_compact(). Raises ValueError for another version of the compact form."""
+        if not data or data[0] != RECORD_VERSION:
+            raise ValueError(f"Unsupported delivery record version: {data[0] if data else None}")
+        _, service, tracking_numbers, order_numbers, delivery_date, email_date, items, amounts = data
+        if email_date is not None:
+            days, minutes = divmod(email_date, MINUTES_PER_DAY)
+            email_date = datetime.fromordinal(days) + timedelta(minutes=minutes)
+        return cls(
+            carrier_of(service),
+            tuple(tracking_numbers),
+            tuple(order_numbers),
+            date.fromordinal(delivery_date) if delivery_date is not None else None,
+            tuple((Decimal(amount), currency) for amount, currency in amounts),
+            tuple(items),
+            email_date,
+        )
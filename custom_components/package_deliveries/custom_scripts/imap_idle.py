@@ -0,0 +1,139 @@
+import imaplib
+import logging
+import re
+import socket
+import threading
+
+try:
+    from .resilience import Backoff
+except ImportError:  # Executed as a standalone script
+    from resilience import Backoff
+
+
+_LOGGER = logging.getLogger(__name__)
+
+# IDLE is re-issued before servers or NAT gateways drop the silent connection (RFC 2177: < 29 min)
+IDLE_RENEW_SECONDS = 9 * 60
+
+# Extra seconds without any data before an IDLE connection is considered dead
+DEAD_CONNECTION_GRACE = 60
+
+# Reconnect backoff after connection errors in seconds, with jitter
+RECONNECT_MIN_SECONDS = 5
+RECONNECT_MAX_SECONDS = 600
+
+EXISTS_PATTERN = re.compile(rb'^\* \d+ EXISTS')
+
+
+class ImapIdleWatcher(threading.Thread):
+    """
+    Holds an IMAP IDLE session on one folder and calls on_new_mail() whenever the
+    server announces new messages with an EXISTS response.
+
+    The watcher uses its own connection, as a session in IDLE cannot run other commands.
+    on_new_mail() is called from the watcher thread and must not block for long.
+    """
+
+    def __init__(self, imap_server, account, password, imap_folder, on_new_mail, timeout=IDLE_RENEW_SECONDS):
+        super().__init__(name=f"imap-idle-{account}-{imap_folder}", daemon=True)
+        self.imap_server = imap_server
+        self.account = account
+        self.password = password
+        self.imap_folder = imap_folder
+        self.on_new_mail = on_new_mail
+        self.timeout = timeout
+        self._stop_event = threading.Event()
+        self._mail = None
+        self._done_lock = threading.Lock()
+        self._tag_counter = 0
+
+    def stop(self):
+        """
+        Stops the watcher. Closing the socket interrupts a pending IDLE read.
+        """
+        self._stop_event.set()
+        mail = self._mail
+        if mail is not None:
+            try:
+                mail.socket().shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def run(self):
+        backoff = Backoff(RECONNECT_MIN_SECONDS, RECONNECT_MAX_SECONDS)
+        while not self._stop_event.is_set():
+            try:
+                # The socket timeout only detects dead connections, IDLE is renewed before it expires
+                self._mail = imaplib.IMAP4_SSL(self.imap_server, timeout=self.timeout + DEAD_CONNECTION_GRACE)
+                self._mail.login(self.account, self.password)
+                if "IDLE" not in self._mail.capabilities:
+                    _LOGGER.warning(f"{self.imap_server} does not support IDLE, push updates are disabled")
+                    return
+                self._mail.select(self.imap_folder)
+                backoff.success()
+                while not self._stop_event.is_set():
+                    if self._idle():
+                        self.on_new_mail()
+            except (imaplib.IMAP4.error, OSError) as e:
+                if self._stop_event.is_set():
+                    break
+                delay = backoff.failure()
+                _LOGGER.warning(f"IDLE session on {self.imap_server} failed, reconnecting in {delay:.0f}s: {e}")
+                self._stop_event.wait(delay)
+            finally:
+                self._close()
+
+    def _idle(self):
+        """
+        Runs one IDLE command until new mail arrives or the renew interval expires.
+        Returns True if the server announced new messages.
+
+        A socket read cannot be resumed after a timeout, so the renew interval is enforced
+        by a timer that ends IDLE with DONE; the server then completes the tagged command.
+        """
+        self._tag_counter += 1
+        tag = f"IDLE{self._tag_counter}".encode()
+        self._mail.send(tag + b" IDLE\r\n")
+
+        line = self._mail.readline()
+        if not line.startswith(b"+"):
+            raise imaplib.IMAP4.error(f"IDLE rejected: {line!r}")
+
+        done_sent = threading.Event()
+        renew_timer = threading.Timer(self.timeout, self._send_done, (done_sent,))
+        renew_timer.daemon = True
+        renew_timer.start()
+
+        new_mail = False
+        try:
+            while True:
+                line = self._mail.readline()
+                if not line:
+                    raise imaplib.IMAP4.abort("connection closed during IDLE")
+                if line.startswith(tag + b" "):
+                    break
+                if EXISTS_PATTERN.match(line):
+                    new_mail = True
+                    self._send_done(done_sent)
+        finally:
+            renew_timer.cancel()
+        return new_mail
+
+    def _send_done(self, done_sent):
+        with self._done_lock:
+            if done_sent.is_set() or self._mail is None:
+                return
+            done_sent.set()
+            try:
+                self._mail.send(b"DONE\r\n")
+            except OSError:
+                pass
+
+    def _close(self):
+        mail, self._mail = self._mail, None
+        if mail is None:
+            return
+        try:
+            mail.logout()
+        except (imaplib.IMAP4.error, OSError):
+            pass
@@ -0,0 +1,113 @@
+import imaplib
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    from .resilience import Backoff
+except ImportError:  # Executed as a standalone script
+    from resilience import Backoff
+
+
+# Sessions idle for longer than this are probed with NOOP before they are reused
+NOOP_INTERVAL = 60
+
+
+class ImapBackoffError(imaplib.IMAP4.error):
+    """Raised while a pooled session is waiting for its reconnect backoff to expire."""
+
+
+class _PooledSession:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.mail = None
+        self.password = None
+        self.last_used = 0.0
+        # Reconnect backoff after failed logins
+        self.backoff = Backoff()
+
+
+class ImapConnectionPool:
+    """
+    Keeps one authenticated IMAP session per (server, account) alive between scans.
+
+    Scans of the same account share the session, even when they look at different folders,
+    as every scan selects its folder itself. A session is used by one scan at a time.
+    """
+
+    def __init__(self, timeout=30):
+        self.timeout = timeout
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def _session(self, imap_server, account):
+        with self._lock:
+            return self._sessions.setdefault((imap_server, account), _PooledSession())
+
+    @contextmanager
+    def connection(self, imap_server, account, password):
+        """
+        Yields an authenticated IMAP connection. A connection that fails while in use is
+        discarded, the next scan reconnects.
+        """
+        session = self._session(imap_server, account)
+        with session.lock:
+            mail = self._ensure_connected(session, imap_server, account, password)
+            try:
+                yield mail
+            except (imaplib.IMAP4.abort, OSError):
+                self._discard(session)
+                raise
+            finally:
+                session.last_used = time.monotonic()
+
+    def _ensure_connected(self, session, imap_server, account, password):
+        if session.mail is not None and session.password != password:
+            self._discard(session, logout=True)
+
+        if session.mail is not None and time.monotonic() - session.last_used > NOOP_INTERVAL:
+            try:
+                session.mail.noop()
+            except (imaplib.IMAP4.error, OSError):
+                self._discard(session)
+
+        if session.mail is not None:
+            return session.mail
+
+        remaining = session.backoff.remaining()
+        if remaining > 0:
+            raise ImapBackoffError(
+                f"Reconnect to {imap_server} delayed for {int(remaining)}s after {session.backoff.failures} failed attempts"
+            )
+
+        try:
+            mail = imaplib.IMAP4_SSL(imap_server, timeout=self.timeout)
+            mail.login(account, password)
+        except (imaplib.IMAP4.error, OSError):
+            session.backoff.failure()
+            raise
+
+        session.mail = mail
+        session.password = password
+        session.backoff.success()
+        return mail
+
+    def _discard(self, session, logout=False):
+        if logout:
+            try:
+                session.mail.logout()
+            except (imaplib.IMAP4.error, OSError):
+                pass
+        session.mail = None
+
+    def close(self):
+        """
+        Logs out of all pooled sessions.
+        """
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            with session.lock:
+                if session.mail is not None:
+                    self._discard(session, logout=True)
@@ -0,0 +1,110 @@
+"""
+Local mail sources: Maildir folders, mbox files and directories of .eml files, e.g. kept in sync
+by offlineimap or mbsync. Files are read through mmap, so classifying a message by its headers
+does not read its body, and only the bytes of delivery notifications are copied.
+"""
+
+import mmap
+import os
+from contextlib import contextmanager
+
+
+def file_fingerprint(stat_result):
+    """(inode, mtime in ns, size): a file whose fingerprint is unchanged has not been modified."""
+    return stat_result.st_ino, stat_result.st_mtime_ns, stat_result.st_size
+
+
+@contextmanager
+def mapped_file(path):
+    """Maps a file read-only into memory, empty files (which cannot be mapped) give b''."""
+    with open(path, 'rb') as mail_file:
+        if os.fstat(mail_file.fileno()).st_size == 0:
+            yield b''
+            return
+        with mmap.mmap(mail_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            yield data
+
+
+def header_end(data, start, end):
+    """Returns the offset after the blank line ending the headers of the message at start."""
+    # find() on the mapped data is much faster than a regex over it; a bare \n\n only counts
+    # before the first \r\n\r\n, so CRLF messages are not scanned to their end for it
+    crlf = data.find(b'\r\n\r\n', start, end)
+    lf = data.find(b'\n\n', start, end if crlf == -1 else crlf)
+    if lf != -1:
+        return lf + 2
+    return end if crlf == -1 else crlf + 4
+
+
+class LocalMailbox:
+    """
+    A local mail source. files() yields (path, fingerprint) of every file holding messages and
+    messages(data, start) the (begin, end) offsets of the messages in a mapped file from start on.
+    """
+
+    # Files only grow by appending messages, a grown file is read from its previous end on
+    appends = False
+
+    def __init__(self, path):
+        self.path = path
+
+    def files(self):
+        raise NotImplementedError
+
+    def messages(self, data, start=0):
+        # One message per file
+        if len(data) > start:
+            yield start, len(data)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.path!r})"
+
+
+class MaildirMailbox(LocalMailbox):
+    """A Maildir folder: one file per message in new/ and cur/, moved from new/ to cur/ once seen."""
+
+    def files(self):
+        for subdirectory in ("new", "cur"):
+            with os.scandir(os.path.join(self.path, subdirectory)) as entries:
+                for entry in entries:
+                    if entry.is_file() and not entry.name.startswith("."):
+                        yield entry.path, file_fingerprint(entry.stat())
+
+
+class EmlDirectoryMailbox(LocalMailbox):
+    """A directory tree of .eml files, one message each."""
+
+    def files(self):
+        for directory, _, names in os.walk(self.path):
+            for name in sorted(names):
+                if name.lower().endswith(".eml"):
+                    path = os.path.join(directory, name)
+                    yield path, file_fingerprint(os.stat(path))
+
+
+class MboxMailbox(LocalMailbox):
+    """An mbox file: messages follow each other, each starting with a "From " envelope line."""
+
+    appends = True
+
+    def files(self):
+        yield self.path, file_fingerprint(os.stat(self.path))
+
+    def messages(self, data, start=0):
+        begin = data.find(b'From ', start)
+        while begin != -1:
+            following = data.find(b'\nFrom ', begin)
+            end = len(data) if following == -1 else following + 1
+            # The envelope line is not part of the message
+            envelope_end = data.find(b'\n', begin, end)
+            yield (end if envelope_end == -1 else envelope_end + 1), end
+            begin = -1 if following == -1 else following + 1
+
+
+def open_local_mailbox(path):
+    """Returns the mailbox type for path: a Maildir (has cur/ and new/), a directory of .eml files or an mbox file."""
+    if os.path.isdir(path):
+        if os.path.isdir(os.path.join(path, "cur")) and os.path.isdir(os.path.join(path, "new")):
+            return MaildirMailbox(path)
+        return EmlDirectoryMailbox(path)
+    return MboxMailbox(path)
@@ -0,0 +1,273 @@
+"""
+Resilience of the access to a mail account.
+
+A token bucket bounds how often an account is contacted, however many sensors and push
+updates ask for scans; a scan takes one token per account, however many of its folders it
+scans. Failed attempts are spaced by an exponential backoff with jitter, so
+sensors failing together do not retry in lockstep. A circuit breaker stops contacting an
+account after repeated failures until its backoff expires; meanwhile scans serve the cached
+deliveries instead of failing.
+"""
+
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+# From best to worst, the state of several accounts is the worst of them
+BREAKER_STATES = (CLOSED, HALF_OPEN, OPEN)
+
+# Scans per account by default: bursts of up to DEFAULT_CAPACITY, then one every 30 seconds
+DEFAULT_RATE = 1 / 30
+DEFAULT_CAPACITY = 5
+# Seconds a scan waits for a token before it is served from the cache
+DEFAULT_MAX_WAIT = 10
+
+# Consecutive failures that open the breaker
+DEFAULT_FAILURE_THRESHOLD = 3
+
+# Backoff after failures in seconds: up to BACKOFF_BASE * 2^(failures - 1), capped at BACKOFF_MAX
+BACKOFF_BASE = 5
+BACKOFF_MAX = 900
+
+
+class RateLimitedError(ConnectionError):
+    """Raised when an account's token bucket has no token within the allowed wait."""
+
+
+class CircuitOpenError(ConnectionError):
+    """Raised while the circuit breaker of an account is open."""
+
+
+class TokenBucket:
+    """
+    Holds up to capacity tokens, refilled by rate tokens per second. A rate of 0 or less
+    disables the limit.
+    """
+
+    def __init__(self, rate, capacity=1, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, max_wait=float("inf")):
+        """
+        Takes a token, waiting up to max_wait seconds for one to be refilled. Returns False
+        without taking one if that would take longer.
+        """
+        if self.rate <= 0:
+            return True
+        with self._lock:
+            now = self._clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = max(0.0, (1 - self.tokens) / self.rate)
+            if wait > max_wait:
+                return False
+            # The token is taken now, callers waiting at the same time queue up behind it
+            self.tokens -= 1
+        if wait > 0:
+            self._sleep(wait)
+        return True
+
+
+class Backoff:
+    """
+    Exponential backoff with jitter: after the n-th consecutive failure the next attempt waits
+    between half and all of base * 2^(n - 1) seconds, capped at maximum.
+    """
+
+    def __init__(self, base=BACKOFF_BASE, maximum=BACKOFF_MAX, clock=time.monotonic, jitter=random.random):
+        self.base = base
+        self.maximum = maximum
+        self.failures = 0
+        self.retry_at = 0.0
+        self._clock = clock
+        self._jitter = jitter
+
+    def failure(self):
+        """Records a failure and returns the delay until the next attempt."""
+        self.failures += 1
+        ceiling = min(self.maximum, self.base * 2 ** min(self.failures - 1, 32))
+        delay = ceiling / 2 * (1 + self._jitter())
+        self.retry_at = self._clock() + delay
+        return delay
+
+    def success(self):
+        self.failures = 0
+        self.retry_at = 0.0
+
+    def remaining(self):
+        """Seconds until the next attempt is allowed."""
+        return max(0.0, self.retry_at - self._clock())
+
+
+class CircuitBreaker:
+    """
+    Closed, calls pass and consecutive failures are counted. After failure_threshold of them
+    the breaker opens for the backoff delay; then a single trial call is let through (half
+    open). Its success closes the breaker, its failure opens it again for a longer delay.
+    """
+
+    def __init__(self, failure_threshold=DEFAULT_FAILURE_THRESHOLD, backoff=None):
+        self.failure_threshold = failure_threshold
+        self.backoff = backoff or Backoff()
+        self.state = CLOSED
+        self.failures = 0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """True if a call may be made now. In the half open state only one call at a time is allowed."""
+        with self._lock:
+            if self.state == OPEN and self.backoff.remaining() <= 0:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN:
+                if self._trial:
+                    return False
+                self._trial = True
+            return self.state != OPEN
+
+    def cancel(self):
+        """Gives back an allowed call that was not made."""
+        with self._lock:
+            self._trial = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._trial = False
+            self.backoff.success()
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = OPEN
+                self.backoff.failure()
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "failures": self.failures,
+                "retry_in": round(self.backoff.remaining()) if self.state == OPEN else 0,
+            }
+
+
+class AccountGuard:
+    """Token bucket and circuit breaker of one account."""
+
+    def __init__(self, name, bucket, breaker, max_wait=DEFAULT_MAX_WAIT):
+        self.name = name
+        self.bucket = bucket
+        self.breaker = breaker
+        self.max_wait = max_wait
+
+    @contextmanager
+    def attempt(self, failures=(OSError,), tokens=None):
+        """
+        Guards one access to the account. Raises CircuitOpenError while the breaker is open
+        and RateLimitedError if no token becomes available within max_wait. Exceptions of the
+        failures types count as failure of the account, a normal exit as success. With
+        ScanTokens, accesses of the same scan share the token taken by the first of them.
+        """
+        if not self.breaker.allow():
+            retry_in = self.breaker.as_dict()["retry_in"]
+            raise CircuitOpenError(f"Circuit breaker of {self.name} is open, next attempt in {retry_in}s")
+        taken = tokens.take(self) if tokens is not None else self.bucket.acquire(self.max_wait)
+        if not taken:
+            self.breaker.cancel()
+            raise RateLimitedError(f"Rate limit of {self.name} reached")
+        try:
+            yield
+        except failures:
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            self.breaker.cancel()
+            raise
+        self.breaker.record_success()
+
+
+class ScanTokens:
+    """
+    The tokens taken during one scan. Each account is charged once, so a sensor scanning
+    several folders of one account costs a single token per scan.
+    """
+
+    def __init__(self):
+        self._taken = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def take(self, guard):
+        """Takes the token of the guard's account on first use, later calls return that result."""
+        with self._lock:
+            lock = self._locks.setdefault(guard.name, threading.Lock())
+        # Other accounts do not wait while this one waits for its token
+        with lock:
+            if guard.name not in self._taken:
+                self._taken[guard.name] = guard.bucket.acquire(guard.max_wait)
+            return self._taken[guard.name]
+
+
+class AccountGuards:
+    """
+    The AccountGuards of all accounts, keyed by (server, account). Share one instance between
+    everything accessing the same accounts, so the limits hold for all of them together.
+    """
+
+    def __init__(self, rate=DEFAULT_RATE, capacity=DEFAULT_CAPACITY, max_wait=DEFAULT_MAX_WAIT,
+                 failure_threshold=DEFAULT_FAILURE_THRESHOLD, backoff_base=BACKOFF_BASE, backoff_max=BACKOFF_MAX):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_wait = max_wait
+        self.failure_threshold = failure_threshold
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._guards = {}
+        self._lock = threading.Lock()
+
+    def guard(self, server, account):
+        with self._lock:
+            guard = self._guards.get((server, account))
+            if guard is None:
+                guard = self._guards[(server, account)] = AccountGuard(
+                    f"{account} on {server}",
+                    TokenBucket(self.rate, self.capacity),
+                    CircuitBreaker(self.failure_threshold, Backoff(self.backoff_base, self.backoff_max)),
+                    self.max_wait,
+                )
+            return guard
+
+    def configure(self, server, account, rate=None, capacity=None, max_wait=None):
+        """
+        Overrides the rate limit of one account; None keeps the current value. Changing the
+        rate or capacity starts the account with a full bucket.
+        """
+        guard = self.guard(server, account)
+        if rate is not None or capacity is not None:
+            guard.bucket = TokenBucket(
+                guard.bucket.rate if rate is None else rate,
+                guard.bucket.capacity if capacity is None else capacity,
+            )
+        if max_wait is not None:
+            guard.max_wait = max_wait
+
+    def breaker_state(self, server, account):
+        """The breaker of an account as dict (state, failures, retry_in), closed for unknown accounts."""
+        with self._lock:
+            guard = self._guards.get((server, account))
+        if guard is None:
+            return {"state": CLOSED, "failures": 0, "retry_in": 0}
+        return guard.breaker.as_dict()
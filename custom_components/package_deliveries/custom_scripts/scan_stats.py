@@ -0,0 +1,180 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+class ScanStats:
+    """
+    Collects the time spent per stage of a scan and simple counters (emails, bytes, ...).
+    Sources scanned in parallel report into the same instance, so updates are locked.
+
+    Each source can report into its own child (see source()), which forwards everything to
+    its parent, so the parent holds the totals and the children the split per account and folder.
+    """
+
+    def __init__(self, parent=None, labels=None):
+        self.timings = {}
+        self.counters = {}
+        self.carriers = {}
+        self.sources = {}
+        self.labels = labels or {}
+        self._parent = parent
+        self._lock = threading.Lock()
+
+    def source(self, account, folder):
+        """
+        Returns the child collecting the statistics of one (account, folder) source.
+        """
+        with self._lock:
+            if (account, folder) not in self.sources:
+                self.sources[(account, folder)] = ScanStats(self, {"account": account, "folder": folder})
+            return self.sources[(account, folder)]
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Measures the wall time of a block and adds it to the stage.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name, seconds):
+        with self._lock:
+            self.timings[name] = self.timings.get(name, 0.0) + seconds
+        if self._parent is not None:
+            self._parent.add_time(name, seconds)
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+        if self._parent is not None:
+            self._parent.count(name, amount)
+
+    def add_carrier_time(self, service, seconds, emails=1):
+        """
+        Adds the time one extractor spent on an email (or on several emails) of its carrier.
+        """
+        with self._lock:
+            count, total = self.carriers.get(service, (0, 0.0))
+            self.carriers[service] = (count + emails, total + seconds)
+        if self._parent is not None:
+            self._parent.add_carrier_time(service, seconds, emails)
+
+    def add_worker_stats(self, timings, carriers, counters=None):
+        """
+        Adds the stage timings, carrier times and counters a worker process collected in its own ScanStats.
+        """
+        for name, seconds in timings.items():
+            self.add_time(name, seconds)
+        for service, (emails, seconds) in carriers.items():
+            self.add_carrier_time(service, seconds, emails)
+        for name, amount in (counters or {}).items():
+            self.count(name, amount)
+
+    def as_dict(self):
+        """
+        Returns the timings in milliseconds, the counters and the extraction time per carrier,
+        plus the same per source if the sources reported separately.
+        """
+        with self._lock:
+            result = {
+                "timings_ms": {name: round(seconds * 1000, 1) for name, seconds in self.timings.items()},
+                "counters": dict(self.counters),
+                "carriers": {
+                    service: {"emails": emails, "parse_ms": round(seconds * 1000, 1)}
+                    for service, (emails, seconds) in self.carriers.items()
+                },
+            }
+            sources = list(self.sources.values())
+        if sources:
+            result["sources"] = [{**source.labels, **source.as_dict()} for source in sources]
+        return result
+
+    def as_log_line(self):
+        """
+        Returns the totals as one line of key=value pairs, e.g. for the log.
+        """
+        with self._lock:
+            parts = [f"{name}={seconds * 1000:.1f}ms" for name, seconds in self.timings.items()]
+            parts += [f"{name}={value}" for name, value in self.counters.items()]
+            parts += [f"parse_{service}={seconds * 1000:.1f}ms/{emails}" for service, (emails, seconds) in self.carriers.items()]
+        return " ".join(parts)
+
+    def samples(self, labels=None):
+        """
+        Yields (metric, labels, value) for every source, or for the totals if the sources did
+        not report separately. Stages run once for all sources (merge, sort) are yielded without
+        source labels. Stage and parse times are in seconds.
+        """
+        with self._lock:
+            sources = list(self.sources.values())
+        if sources:
+            for source in sources:
+                yield from source.samples(labels)
+            with self._lock:
+                for name, seconds in self.timings.items():
+                    if not any(name in source.timings for source in sources):
+                        yield "stage_seconds", {**(labels or {}), "stage": name}, round(seconds, 6)
+            return
+
+        labels = {**(labels or {}), **self.labels}
+        with self._lock:
+            for name, seconds in self.timings.items():
+                yield "stage_seconds", {**labels, "stage": name}, round(seconds, 6)
+            for name, value in self.counters.items():
+                yield name, labels, value
+            for service, (emails, seconds) in self.carriers.items():
+                yield "parse_seconds", {**labels, "carrier": service}, round(seconds, 6)
+                yield "parsed_emails", {**labels, "carrier": service}, emails
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_prometheus(samples, prefix="package_deliveries_last_scan"):
+    """
+    Renders (metric, labels, value) samples in the Prometheus text exposition format.
+    All values describe the last scan, so every metric is a gauge.
+    """
+    metrics = {}
+    for metric, labels, value in samples:
+        metrics.setdefault(metric, []).append((labels, value))
+
+    lines = []
+    for metric, values in metrics.items():
+        name = f"{prefix}_{metric}"
+        lines.append(f"# TYPE {name} gauge")
+        for labels, value in values:
+            label_text = ",".join(f'{key}="{_escape_label(label)}"' for key, label in labels.items())
+            lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+class _NoScanStats:
+    """Stand-in used when no statistics are requested."""
+
+    def source(self, account, folder):
+        return self
+
+    @contextmanager
+    def stage(self, name):
+        yield
+
+    def add_time(self, name, seconds):
+        pass
+
+    def count(self, name, amount=1):
+        pass
+
+    def add_carrier_time(self, service, seconds, emails=1):
+        pass
+
+    def add_worker_stats(self, timings, carriers, counters=None):
+        pass
+
+
+NO_STATS = _NoScanStats()
@@ -0,0 +1,287 @@
+import json
+import sqlite3
+import threading
+
+try:
+    from .delivery_record import Delivery
+    from .tracking_status import TrackingStatus
+except ImportError:  # Executed as a standalone script
+    from delivery_record import Delivery
+    from tracking_status import TrackingStatus
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS mailboxes (
+    account TEXT NOT NULL,
+    imap_server TEXT NOT NULL,
+    imap_folder TEXT NOT NULL,
+    uidvalidity INTEGER NOT NULL,
+    parser_version INTEGER NOT NULL,
+    last_uid INTEGER NOT NULL,
+    PRIMARY KEY (account, imap_server, imap_folder)
+);
+CREATE TABLE IF NOT EXISTS messages (
+    account TEXT NOT NULL,
+    imap_server TEXT NOT NULL,
+    imap_folder TEXT NOT NULL,
+    uidvalidity INTEGER NOT NULL,
+    uid INTEGER NOT NULL,
+    message_id TEXT,
+    received TEXT NOT NULL,
+    parser_version INTEGER NOT NULL,
+    records TEXT NOT NULL,
+    PRIMARY KEY (account, imap_server, imap_folder, uidvalidity, uid)
+);
+CREATE INDEX IF NOT EXISTS messages_by_message_id ON messages (message_id);
+CREATE TABLE IF NOT EXISTS local_files (
+    source TEXT NOT NULL,
+    path TEXT NOT NULL,
+    inode INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    parser_version INTEGER NOT NULL,
+    PRIMARY KEY (source, path)
+);
+CREATE TABLE IF NOT EXISTS local_messages (
+    source TEXT NOT NULL,
+    path TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    message_id TEXT,
+    received TEXT NOT NULL,
+    parser_version INTEGER NOT NULL,
+    records TEXT NOT NULL,
+    PRIMARY KEY (source, path, offset)
+);
+CREATE TABLE IF NOT EXISTS tracking_status (
+    tracking_number TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    description TEXT NOT NULL,
+    checked REAL NOT NULL
+);
+"""
+
+
+def dump_records(records):
+    """Serializes the Delivery records of one email in their compact form."""
+    return json.dumps([record.to_compact() for record in records], separators=(",", ":"))
+
+
+def load_records(records):
+    return [Delivery.from_compact(record) for record in json.loads(records)]
+
+
+class SyncStateStore:
+    """
+    SQLite store for incremental scans. It persists the UID cursor per account/folder and
+    the Delivery records extracted from each delivery notification, keyed by
+    (account, folder, UIDVALIDITY, UID) and looked up by Message-ID as well.
+
+    For local sources (Maildir, mbox, .eml) it keeps the fingerprint (inode, mtime, size) of
+    every file read and the deliveries of each notification, keyed by file and offset.
+
+    The carrier status last looked up per tracking number is kept as well; it does not depend
+    on the parser and survives a change of PARSER_VERSION.
+
+    Entries written by another parser_version are ignored and purged, so changing an
+    extractor only requires bumping PARSER_VERSION.
+    """
+
+    def __init__(self, path, parser_version):
+        self.path = path
+        self.parser_version = parser_version
+        self._lock = threading.Lock()
+        # Scans run in executor threads, access is serialized by the lock
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+        with self._lock:
+            for table in ("messages", "local_files", "local_messages"):
+                self._db.execute(f"DELETE FROM {table} WHERE parser_version != ?", (parser_version,))
+            self._db.commit()
+
+    def last_uid(self, account, imap_server, imap_folder, uidvalidity):
+        """
+        Returns the highest UID processed in the folder. Starts over at 0 when the server
+        reports a different UIDVALIDITY or the cursor was written by another parser version.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT uidvalidity, parser_version, last_uid FROM mailboxes"
+                " WHERE account = ? AND imap_server = ? AND imap_folder = ?",
+                (account, imap_server, imap_folder),
+            ).fetchone()
+        if row is None or row[0] != uidvalidity or row[1] != self.parser_version:
+            return 0
+        return row[2]
+
+    def set_last_uid(self, account, imap_server, imap_folder, uidvalidity, last_uid):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO mailboxes VALUES (?, ?, ?, ?, ?, ?)",
+                (account, imap_server, imap_folder, uidvalidity, self.parser_version, last_uid),
+            )
+
+    def cached_records(self, account, imap_server, imap_folder, uidvalidity, uids):
+        """
+        Returns {uid: records} for the UIDs with cached records.
+        """
+        cached = {}
+        uids = list(uids)
+        with self._lock:
+            # Stay below SQLite's limit of bound parameters per statement
+            for offset in range(0, len(uids), 500):
+                batch = uids[offset:offset + 500]
+                rows = self._db.execute(
+                    "SELECT uid, records FROM messages"
+                    " WHERE account = ? AND imap_server = ? AND imap_folder = ? AND uidvalidity = ?"
+                    f" AND uid IN ({','.join('?' * len(batch))})",
+                    (account, imap_server, imap_folder, uidvalidity, *batch),
+                ).fetchall()
+                cached.update((uid, load_records(records)) for uid, records in rows)
+        return cached
+
+    def mailbox_records(self, account, imap_server, imap_folder, since):
+        """
+        Returns the records cached for a folder received since the given date, in UID order,
+        e.g. to serve a scan while the server cannot be reached. None if the folder was never scanned.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT uidvalidity FROM mailboxes WHERE account = ? AND imap_server = ? AND imap_folder = ? AND parser_version = ?",
+                (account, imap_server, imap_folder, self.parser_version),
+            ).fetchone()
+            if row is None:
+                return None
+            rows = self._db.execute(
+                "SELECT records FROM messages"
+                " WHERE account = ? AND imap_server = ? AND imap_folder = ? AND uidvalidity = ? AND received >= ?"
+                " ORDER BY uid",
+                (account, imap_server, imap_folder, row[0], since.isoformat()),
+            ).fetchall()
+        return [record for (records,) in rows for record in load_records(records)]
+
+    def records_by_message_id(self, message_id):
+        """
+        Returns the records cached for a Message-ID, e.g. after the email was moved to another
+        folder or the folder's UIDVALIDITY changed, or None.
+        """
+        if not message_id:
+            return None
+        with self._lock:
+            row = self._db.execute(
+                "SELECT records FROM messages WHERE message_id = ? LIMIT 1", (message_id,)
+            ).fetchone()
+        return load_records(row[0]) if row else None
+
+    def store_records(self, account, imap_server, imap_folder, uidvalidity, uid, message_id, received, records):
+        """
+        Caches the records extracted from one email. received is an ISO date used for expiry.
+        """
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (account, imap_server, imap_folder, uidvalidity, uid, message_id,
+                 received, self.parser_version, dump_records(records)),
+            )
+
+    def evict(self, account, imap_server, imap_folder, cutoff):
+        """
+        Drops the cached emails of a folder received before the cutoff date (outside last_days).
+        """
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM messages WHERE account = ? AND imap_server = ? AND imap_folder = ? AND received < ?",
+                (account, imap_server, imap_folder, cutoff.isoformat()),
+            )
+
+    def local_files(self, source):
+        """
+        Returns {path: (inode, mtime_ns, size)} of the files of a local source read before.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT path, inode, mtime_ns, size FROM local_files WHERE source = ?", (source,)
+            ).fetchall()
+        return {path: (inode, mtime_ns, size) for path, inode, mtime_ns, size in rows}
+
+    def set_local_file(self, source, path, fingerprint):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO local_files VALUES (?, ?, ?, ?, ?, ?)",
+                (source, path, *fingerprint, self.parser_version),
+            )
+
+    def move_local_file(self, source, old_path, new_path):
+        """
+        Keeps the cached deliveries of a renamed file, e.g. a Maildir message moved from new/ to cur/.
+        """
+        with self._lock:
+            for table in ("local_files", "local_messages"):
+                self._db.execute(
+                    f"UPDATE {table} SET path = ? WHERE source = ? AND path = ?", (new_path, source, old_path)
+                )
+
+    def forget_local_file(self, source, path):
+        """
+        Drops a deleted or rewritten file together with the deliveries cached from it.
+        """
+        with self._lock:
+            for table in ("local_files", "local_messages"):
+                self._db.execute(f"DELETE FROM {table} WHERE source = ? AND path = ?", (source, path))
+
+    def store_local_records(self, source, path, offset, message_id, received, records):
+        """
+        Caches the records extracted from the message at offset of a local file.
+        """
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO local_messages VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (source, path, offset, message_id, received, self.parser_version, dump_records(records)),
+            )
+
+    def local_records(self, source):
+        """
+        Returns the cached records of all messages of a local source, in file and offset order.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT records FROM local_messages WHERE source = ? ORDER BY path, offset", (source,)
+            ).fetchall()
+        return [record for (records,) in rows for record in load_records(records)]
+
+    def evict_local(self, source, cutoff):
+        """
+        Drops the cached messages of a local source received before the cutoff date.
+        """
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM local_messages WHERE source = ? AND received < ?", (source, cutoff.isoformat())
+            )
+
+    def tracking_statuses(self):
+        """
+        Returns {tracking_number: TrackingStatus} of all stored carrier statuses.
+        """
+        with self._lock:
+            rows = self._db.execute("SELECT tracking_number, status, description, checked FROM tracking_status").fetchall()
+        return {number: TrackingStatus(status, description, checked) for number, status, description, checked in rows}
+
+    def store_tracking_status(self, tracking_number, status, description, checked):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO tracking_status VALUES (?, ?, ?, ?)", (tracking_number, status, description, checked)
+            )
+
+    def forget_tracking_statuses(self, tracking_numbers):
+        with self._lock:
+            self._db.executemany(
+                "DELETE FROM tracking_status WHERE tracking_number = ?", [(number,) for number in tracking_numbers]
+            )
+
+    def save(self):
+        with self._lock:
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.commit()
+            self._db.close()
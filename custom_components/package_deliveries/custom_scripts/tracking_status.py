@@ -0,0 +1,217 @@
+"""
+Carrier status lookups for the parcels in transit.
+
+A StatusTracker keeps an index of the tracking numbers of the current deliveries and asks a
+StatusProvider for those whose cached status is older than the TTL. Lookups are batched up to
+the provider's batch size and spaced by its rate limit. Parcels reported as delivered are not
+looked up again, so the number of requests follows the parcels in transit, not the scans.
+"""
+
+import json
+import logging
+import threading
+import time
+import urllib.request
+from dataclasses import dataclass
+from urllib.parse import urlencode
+
+try:
+    from .resilience import TokenBucket
+except ImportError:  # Executed as a standalone script
+    from resilience import TokenBucket
+
+_LOGGER = logging.getLogger(__name__)
+
+STATUS_DELIVERED = "delivered"
+STATUS_UNKNOWN = "unknown"
+STATUSES = ("pre_transit", "transit", "out_for_delivery", STATUS_DELIVERED, "failure", STATUS_UNKNOWN)
+
+# Seconds a looked up status is reused before the parcel is looked up again
+DEFAULT_TTL = 30 * 60
+DEFAULT_BATCH_SIZE = 20
+# Requests per second sent to one provider
+DEFAULT_RATE = 1.0
+LOOKUP_TIMEOUT = 10
+
+
+@dataclass(slots=True)
+class TrackingStatus:
+    """The status a carrier reports for a tracking number, checked is the time of the lookup (epoch seconds)."""
+
+    status: str
+    description: str = ""
+    checked: float = 0.0
+
+    @property
+    def delivered(self):
+        return self.status == STATUS_DELIVERED
+
+
+def normalize_status(value):
+    """Maps the status of a response to one of STATUSES ("Out-For-Delivery" -> "out_for_delivery")."""
+    status = str(value or "").strip().lower().replace("-", "_").replace(" ", "_")
+    return status if status in STATUSES else STATUS_UNKNOWN
+
+
+class StatusProvider:
+    """
+    Looks up the status of tracking numbers. services lists the services it answers for (empty
+    for all), batch_size how many numbers one request may carry and rate the requests per second
+    it allows. Subclasses implement lookup().
+    """
+
+    services = ()
+    batch_size = DEFAULT_BATCH_SIZE
+    rate = DEFAULT_RATE
+
+    def supports(self, service):
+        return not self.services or service in self.services
+
+    def lookup(self, tracking_numbers):
+        """
+        Returns {tracking_number: TrackingStatus} for the numbers the carrier knows. Raises
+        OSError or ValueError if the request fails.
+        """
+        raise NotImplementedError
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(self.services) or 'all services'})"
+
+
+class JsonStatusProvider(StatusProvider):
+    """
+    Queries a tracking service speaking a small JSON protocol, e.g. a self-hosted tracking proxy
+    or the stub server in benchmarks/: GET <url>?tracking_numbers=A,B returns
+    {"A": {"status": "transit", "description": "..."}, ...}; unknown numbers are left out.
+    """
+
+    def __init__(self, url, services=(), batch_size=DEFAULT_BATCH_SIZE, rate=DEFAULT_RATE, api_key=None,
+                 timeout=LOOKUP_TIMEOUT):
+        self.url = url
+        self.services = tuple(services)
+        self.batch_size = batch_size
+        self.rate = rate
+        self.api_key = api_key
+        self.timeout = timeout
+
+    def lookup(self, tracking_numbers):
+        separator = "&" if "?" in self.url else "?"
+        request = urllib.request.Request(
+            f"{self.url}{separator}{urlencode({'tracking_numbers': ','.join(tracking_numbers)})}",
+            headers={"Accept": "application/json"},
+        )
+        if self.api_key:
+            request.add_header("Authorization", f"Bearer {self.api_key}")
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            data = json.load(response)
+        if not isinstance(data, dict):
+            raise ValueError(f"Unexpected status response: {type(data).__name__}")
+
+        checked = time.time()
+        return {
+            number: TrackingStatus(normalize_status(entry.get("status")), str(entry.get("description") or ""), checked)
+            for number, entry in data.items()
+            if number in tracking_numbers and isinstance(entry, dict)
+        }
+
+
+def delivery_status(delivery, statuses):
+    """
+    Returns the TrackingStatus of a delivery, or None if none of its tracking numbers has one.
+    A delivery listing several numbers only counts as delivered once all of them are.
+    """
+    known = [statuses[number] for number in delivery.tracking_numbers if number in statuses]
+    if not known:
+        return None
+    if len(known) == len(delivery.tracking_numbers) and all(status.delivered for status in known):
+        return known[0]
+    return next((status for status in known if not status.delivered), known[0])
+
+
+class StatusTracker:
+    """
+    Index of the tracking numbers of the current deliveries with their last known status.
+
+    update() adds the numbers of a scan, drops those no longer found and looks up the stale
+    ones. With a SyncStateStore the statuses survive restarts, so the TTL also holds across them.
+    """
+
+    def __init__(self, providers, ttl=DEFAULT_TTL, state=None, clock=time.time):
+        self.providers = list(providers)
+        self.ttl = ttl
+        self.state = state
+        self._clock = clock
+        # One token per request, without bursts
+        self._buckets = {id(provider): TokenBucket(provider.rate) for provider in self.providers}
+        self._statuses = None
+        self._lock = threading.Lock()
+
+    def _provider(self, service):
+        return next((provider for provider in self.providers if provider.supports(service)), None)
+
+    def update(self, deliveries, stats=None):
+        """
+        Looks up the statuses of the parcels in transit that are not cached or older than the
+        TTL and returns {tracking_number: TrackingStatus} for all tracked numbers with a status.
+        A failing provider is logged and skipped until the next update.
+        """
+        with self._lock:
+            if self._statuses is None:
+                self._statuses = self.state.tracking_statuses() if self.state is not None else {}
+
+            tracked = {}
+            for delivery in deliveries:
+                provider = self._provider(delivery.service)
+                if provider is not None:
+                    for number in delivery.tracking_numbers:
+                        tracked.setdefault(number, provider)
+
+            dropped = [number for number in self._statuses if number not in tracked]
+            for number in dropped:
+                del self._statuses[number]
+            if dropped and self.state is not None:
+                self.state.forget_tracking_statuses(dropped)
+
+            now = self._clock()
+            due = {}
+            for number, provider in tracked.items():
+                status = self._statuses.get(number)
+                if status is not None and (status.delivered or now - status.checked < self.ttl):
+                    if stats is not None:
+                        stats.count("status_cache_hits")
+                    continue
+                due.setdefault(provider, []).append(number)
+
+            for provider, numbers in due.items():
+                self._lookup(provider, numbers, stats)
+            if self.state is not None:
+                self.state.save()
+            return dict(self._statuses)
+
+    def _lookup(self, provider, numbers, stats):
+        bucket = self._buckets[id(provider)]
+        batch_size = max(1, provider.batch_size)
+        for offset in range(0, len(numbers), batch_size):
+            batch = numbers[offset:offset + batch_size]
+            bucket.acquire()
+            started = time.perf_counter()
+            try:
+                found = provider.lookup(batch)
+            except (OSError, ValueError) as e:
+                _LOGGER.warning(f"Status lookup of {len(batch)} parcels at {provider!r} failed: {e}")
+                return
+            finally:
+                if stats is not None:
+                    stats.add_time("status", time.perf_counter() - started)
+                    stats.count("status_requests")
+            if stats is not None:
+                stats.count("status_lookups", len(batch))
+
+            checked = self._clock()
+            for number in batch:
+                # Numbers the carrier does not know yet are asked again after the TTL
+                status = found.get(number) or TrackingStatus(STATUS_UNKNOWN, "", checked)
+                status.checked = checked
+                self._statuses[number] = status
+                if self.state is not None:
+                    self.state.store_tracking_status(number, status.status, status.description, checked)
@@ -0,0 +1,65 @@
+"""
+Persistenter Stand der Lieferungen je Sensor, geschlüsselt nach Sendungsnummer.
+"""
+
+import logging
+
+from homeassistant.helpers.storage import Store
+
+from .custom_scripts import check_package_deliveries as engine
+
+DOMAIN = "package_deliveries"
+STORAGE_VERSION = 1
+SAVE_DELAY = 10  # Sekunden, mehrere Änderungen kurz hintereinander werden zusammen gespeichert
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def _restore_delivery(data):
+    """Gespeichert wird die kompakte Form, ältere Versionen speicherten die Lieferungen als Dicts."""
+    if isinstance(data, dict):
+        return engine.Delivery.from_dict(data)
+    return engine.Delivery.from_compact(data)
+
+
+class DeliveryStore:
+    """Merkt sich die Lieferungen des letzten Scans und berechnet die Änderungen des nächsten."""
+
+    def __init__(self, hass, unique_id):
+        """Initialisiere den Speicher unter .storage/package_deliveries.<unique_id>."""
+        self._store = Store(hass, STORAGE_VERSION, f"{DOMAIN}.{unique_id}")
+        self.deliveries = {}
+        self.delivered = set()
+
+    async def async_load(self):
+        """Lädt den zuletzt gespeicherten Stand."""
+        data = await self._store.async_load() or {}
+        try:
+            deliveries = [_restore_delivery(delivery) for delivery in data.get("deliveries", {}).values()]
+        except (TypeError, ValueError) as e:
+            # Unbekanntes Format: der nächste Scan meldet alle Lieferungen als neu
+            _LOGGER.warning(f"Discarding stored deliveries of {self._store.key}: {e}")
+            return
+        self.deliveries = {engine.delivery_key(delivery): delivery for delivery in deliveries}
+        self.delivered = set(data.get("delivered", []))
+
+    def async_apply(self, deliveries, statuses=None):
+        """
+        Übernimmt die Lieferungen eines Scans und gibt die Änderungen zurück
+        (added, updated, delivered, expired). Gespeichert wird nur bei Änderungen.
+        Nur für vollständige Scans: jede fehlende Lieferung gilt als abgelaufen.
+        Meldet der Paketdienst (statuses) eine Sendung als zugestellt, gilt sie als geliefert.
+        """
+        self.deliveries, self.delivered, changes = engine.diff_deliveries(
+            self.deliveries, deliveries, self.delivered, lambda delivery: engine.is_delivered(delivery, statuses)
+        )
+        if engine.has_changes(changes):
+            self._store.async_delay_save(self._data_to_save, SAVE_DELAY)
+        return changes
+
+    def _data_to_save(self):
+        """Daten für die Speicherdatei."""
+        return {
+            "deliveries": {key: delivery.to_compact() for key, delivery in self.deliveries.items()},
+            "delivered": sorted(self.delivered),
+        }
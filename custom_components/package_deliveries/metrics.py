@@ -0,0 +1,42 @@
+"""
+Prometheus-Endpunkt mit den Statistiken des letzten Scans aller Package-Deliveries-Sensoren.
+"""
+
+from aiohttp import web
+from homeassistant.components.http import HomeAssistantView
+
+from .custom_scripts import check_package_deliveries as engine
+
+DOMAIN = "package_deliveries"
+
+
+class PackageDeliveriesMetricsView(HomeAssistantView):
+    """Liefert Zeiten je Stufe, Zähler und Parse-Zeiten je Paketdienst im Prometheus-Textformat."""
+
+    url = "/api/package_deliveries/metrics"
+    name = "api:package_deliveries:metrics"
+    requires_auth = True
+
+    async def get(self, request):
+        """Gibt die Metriken aller Koordinatoren mit einem abgeschlossenen Scan zurück."""
+        hass = request.app["hass"]
+        samples = []
+        for coordinator in hass.data.get(DOMAIN, {}).values():
+            stats = coordinator.scan_stats
+            if stats is None:
+                continue
+            labels = {"sensor": coordinator.slug}
+            samples.append(("duration_seconds", labels, round(coordinator.scan_duration, 6)))
+            samples.append(("success", labels, int(coordinator.scan_succeeded)))
+            if coordinator.circuit_breaker is not None:
+                samples.append(("circuit_open", labels, int(coordinator.circuit_breaker["state"] != "closed")))
+            samples.extend(stats.samples(labels))
+        return web.Response(text=engine.format_prometheus(samples), content_type="text/plain")
+
+
+def async_register_metrics_view(hass):
+    """Registriert den Endpunkt einmalig, sofern die HTTP-Komponente geladen ist."""
+    if getattr(hass, "http", None) is None or hass.data.get(f"{DOMAIN}_metrics_view"):
+        return
+    hass.http.register_view(PackageDeliveriesMetricsView())
+    hass.data[f"{DOMAIN}_metrics_view"] = True
@@ -0,0 +1,55 @@
+"""
+Adaptive Planung der Scans anhand der angekündigten Liefertermine.
+"""
+
+from datetime import timedelta
+
+DEFAULT_MIN_INTERVAL = timedelta(minutes=3)
+DEFAULT_MAX_INTERVAL = timedelta(hours=2)
+DEFAULT_NOTIFICATION_HOURS = (6, 21)  # Paketdienste verschicken ihre E-Mails tagsüber
+BACKOFF_FACTOR = 2
+
+
+class AdaptiveScheduler:
+    """
+    Berechnet den Abstand bis zum nächsten Scan:
+
+    - Lieferung heute und innerhalb der Benachrichtigungszeiten: min_interval
+    - sonst innerhalb der Benachrichtigungszeiten: exponentiell wachsend ab min_interval
+      mit jedem Scan ohne Änderungen, höchstens max_interval; Sendungen unterwegs
+      begrenzen den Abstand auf die Hälfte von max_interval
+    - außerhalb der Benachrichtigungszeiten: max_interval, höchstens bis zu deren Beginn
+    """
+
+    def __init__(self, min_interval=DEFAULT_MIN_INTERVAL, max_interval=DEFAULT_MAX_INTERVAL,
+                 notification_hours=DEFAULT_NOTIFICATION_HOURS):
+        """Initialisiere den Planer, min_interval und max_interval als timedelta."""
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.notification_hours = tuple(notification_hours)
+        self._quiet_scans = 0
+
+    def record_scan(self, changed):
+        """Merkt sich, ob der letzte Scan Änderungen brachte; Änderungen setzen das Backoff zurück."""
+        self._quiet_scans = 0 if changed else self._quiet_scans + 1
+
+    def next_interval(self, deliveries, now):
+        """Gibt den Abstand bis zum nächsten Scan zurück, now als lokale Zeit mit Zeitzone."""
+        start_hour, end_hour = self.notification_hours
+        if not start_hour <= now.hour < end_hour:
+            next_start = now.replace(hour=start_hour, minute=0, second=0, microsecond=0)
+            if next_start <= now:
+                next_start += timedelta(days=1)
+            return max(self.min_interval, min(self.max_interval, next_start - now))
+
+        today = now.date()
+        due_dates = [delivery.delivery_date for delivery in deliveries]
+        if today in due_dates:
+            return self.min_interval
+
+        # Sendungen unterwegs: mit kommendem oder ohne angekündigten Liefertermin
+        in_transit = any(due_date is None or due_date > today for due_date in due_dates)
+        limit = max(self.min_interval, self.max_interval / 2) if in_transit else self.max_interval
+        # Der Exponent ist begrenzt, der Abstand erreicht das Limit lange vorher
+        backoff = self.min_interval * BACKOFF_FACTOR ** min(self._quiet_scans, 16)
+        return min(backoff, limit)
@@ -1,39 +1,43 @@
 import logging
-import subprocess
-import json
-import os
-from datetime import timedelta
-from homeassistant.helpers.entity import Entity
+from homeassistant.components.sensor import SensorDeviceClass, SensorEntity, SensorStateClass
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+from homeassistant.helpers.device_registry import DeviceEntryType, DeviceInfo
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
+
+from .coordinator import DOMAIN, PackageDeliveriesCoordinator, slugify_name
+from .custom_scripts import check_package_deliveries as engine
+from .metrics import async_register_metrics_view
 
 # Logging konfigurieren
 _LOGGER = logging.getLogger(__name__)
 
-MAX_EXECUTION_TIME = 60  # Maximale Ausführungsdauer des Skripts in Sekunden
+ATTRIBUTES_FULL = "full"
+ATTRIBUTES_COMPACT = "compact"
+# Felder je Lieferung im kompakten Modus, alle Details liefert der Service get_deliveries
+COMPACT_FIELDS = ("service", "tracking_number", "delivery_date")
+
+
+def _compact_delivery(delivery):
+    """Nur die Felder des kompakten Modus einer Lieferung."""
+    attributes = delivery.as_dict()
+    return {field: attributes[field] for field in COMPACT_FIELDS}
 
-class PackageDeliveriesSensor(Entity):
+
+class PackageDeliveriesSensor(CoordinatorEntity):
     """Sensor für die Verfolgung von Paketlieferungen per E-Mail."""
 
-    def __init__(self, hass, config):
+    # Die Scan-Statistik ändert sich bei jedem Scan und gehört nicht in den Verlauf
+    _unrecorded_attributes = frozenset({"scan_stats"})
+
+    def __init__(self, coordinator, unique_id, device_info=None):
         """Initialisiere den Sensor."""
-        self.hass = hass
-        self._state = None
-        self._attributes = {}
-        self.config = config
-        self.script_path = hass.config.path(
-            "custom_components", "package_deliveries", "custom_scripts", "check_package_deliveries.py"
-        )
-        self.json_file_path = hass.config.path(
-            "custom_components", "package_deliveries", "custom_scripts",
-            f"deliveries_{self.config['name'].lower().replace(' ', '_')}.json"
-        )
-        scan_interval = config.get("scan_interval", 180)
-        if isinstance(scan_interval, timedelta):
-            self.scan_interval = scan_interval
-        else:
-            self.scan_interval = timedelta(seconds=int(scan_interval))
-
-        self._unique_id = config["name"].lower().replace(" ", "_")
-        self._name = config["name"]
+        super().__init__(coordinator)
+        self._unique_id = unique_id
+        self._name = coordinator.name
+        self._attr_device_info = device_info
+
+        # Im kompakten Modus stehen nur Zusammenfassungen in den Attributen
+        self.attributes_mode = coordinator.config.get("attributes", ATTRIBUTES_FULL)
 
     @property
     def name(self):
@@ -48,77 +52,146 @@ class PackageDeliveriesSensor(Entity):
     @property
     def state(self):
         """Gibt die Anzahl der Lieferungen zurück."""
-        return self._state
+        return self.coordinator.state
 
     @property
     def extra_state_attributes(self):
         """Gibt zusätzliche Attribute zurück."""
-        return self._attributes
-
-    async def async_update(self):
-        """Aktualisiert den Sensor asynchron durch Ausführen des Skripts und Laden des JSON-Ergebnisses."""
-        await self.hass.async_add_executor_job(self._run_and_update_from_script)
-
-    def _run_and_update_from_script(self):
-        """Führt das Skript aus und aktualisiert den Sensor basierend auf der resultierenden JSON-Datei."""
-        command = [
-            "python3", self.script_path,
-            "--email", self.config.get("email"),
-            "--password", self.config.get("password"),
-            "--imap_server", self.config.get("imap_server", "imap.gmail.com"),
-            "--last_days", str(self.config.get("last_days", 10)),
-            "--last_emails", str(self.config.get("last_emails", 50)),
-            "--imap_folder", self.config.get("imap_folder", "INBOX"),
-            "--output_file", self.json_file_path
-        ]
-
-        try:
-            _LOGGER.info(f"Starting script execution with command: {command}")
-
-            subprocess.run(
-                command,
-                check=True,
-                timeout=MAX_EXECUTION_TIME,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL
-            )
-
-            if os.path.exists(self.json_file_path):
-                with open(self.json_file_path, "r") as json_file:
-                    deliveries = json.load(json_file)
-                    self._state = len(deliveries)
-                    self._attributes["deliveries"] = deliveries
-                    _LOGGER.info(f"Package deliveries updated: {len(deliveries)} deliveries found.")
-            else:
-                self._state = "error"
-                self._attributes["error"] = f"{self.json_file_path} Datei nicht gefunden"
-                _LOGGER.error(f"JSON file not found: {self.json_file_path}")
-
-        except subprocess.TimeoutExpired as e:
-            self._state = "unavailable"
-            self._attributes["error"] = f"Skript-Zeitüberschreitung: {e}"
-            _LOGGER.error(f"Script timed out after {MAX_EXECUTION_TIME} seconds: {e}")
-
-        except subprocess.CalledProcessError as e:
-            self._state = "error"
-            self._attributes["error"] = f"Skriptfehler: {e}"
-            _LOGGER.error(f"Script execution failed: {e}")
-
-        except Exception as e:
-            self._state = "error"
-            self._attributes["error"] = str(e)
-            _LOGGER.error(f"Unexpected error occurred: {e}")
+        attributes = self._delivery_attributes(self.coordinator.deliveries)
+        if self.coordinator.error:
+            attributes["error"] = self.coordinator.error
+        if self.coordinator.circuit_breaker is not None:
+            attributes["circuit_breaker"] = self.coordinator.circuit_breaker
+        if self.coordinator.scan_stats is not None:
+            attributes["scan_stats"] = {
+                "duration_ms": round(self.coordinator.scan_duration * 1000, 1),
+                **self.coordinator.scan_stats.as_dict(),
+            }
+        return attributes
+
+    def _delivery_attributes(self, deliveries):
+        """Erzeugt die Attribute zu den Lieferungen, im kompakten Modus nur Anzahlen und Zusammenfassungen."""
+        if self.attributes_mode != ATTRIBUTES_COMPACT:
+            # Gespeichert sind ISO-Daten, für Dashboards kommt das Datum in der Sprache von Home Assistant dazu
+            language = self.hass.config.language
+            return {
+                "deliveries": [
+                    {
+                        **self.coordinator.delivery_details(delivery),
+                        "delivery_date_display": engine.format_date(delivery.delivery_date, language) or "Unknown",
+                    }
+                    for delivery in deliveries
+                ]
+            }
+
+        count_by_service = {}
+        for delivery in deliveries:
+            service = str(delivery.service)
+            count_by_service[service] = count_by_service.get(service, 0) + 1
+        return {
+            "count_by_service": count_by_service,
+            "deliveries": [_compact_delivery(delivery) for delivery in deliveries],
+        }
+
+
+class PackageCarrierSensor(CoordinatorEntity, SensorEntity):
+    """Anzahl der Lieferungen eines Paketdienstes."""
+
+    _attr_icon = "mdi:package-variant-closed"
+    _attr_state_class = SensorStateClass.MEASUREMENT
+
+    def __init__(self, coordinator, service, unique_id, device_info=None):
+        """Initialisiere den Sensor für einen Paketdienst."""
+        super().__init__(coordinator)
+        self.service = service
+        self._attr_name = f"{coordinator.name} {service}"
+        self._attr_unique_id = unique_id
+        self._attr_device_info = device_info
+
+    @property
+    def native_value(self):
+        """Gibt die Anzahl der Lieferungen des Paketdienstes zurück."""
+        return sum(1 for delivery in self.coordinator.deliveries if delivery.service == self.service)
+
+
+class PackageNextDeliverySensor(CoordinatorEntity, SensorEntity):
+    """Datum der nächsten angekündigten Lieferung."""
+
+    _attr_device_class = SensorDeviceClass.DATE
+    _attr_icon = "mdi:truck-delivery"
+
+    def __init__(self, coordinator, unique_id, device_info=None):
+        """Initialisiere den Sensor für die nächste Lieferung."""
+        super().__init__(coordinator)
+        self._attr_name = f"{coordinator.name} Next Delivery"
+        self._attr_unique_id = unique_id
+        self._attr_device_info = device_info
+
+    def _next_deliveries(self):
+        """Gibt das Datum der nächsten Lieferung ab heute und die an diesem Tag erwarteten Lieferungen zurück."""
+        today = engine.get_today()
+        upcoming = {}
+        for delivery in self.coordinator.deliveries:
+            delivery_date = delivery.delivery_date
+            if delivery_date is not None and delivery_date >= today:
+                upcoming.setdefault(delivery_date, []).append(delivery)
+        if not upcoming:
+            return None, []
+        next_date = min(upcoming)
+        return next_date, upcoming[next_date]
+
+    @property
+    def native_value(self):
+        """Gibt das Datum der nächsten Lieferung zurück."""
+        return self._next_deliveries()[0]
+
+    @property
+    def extra_state_attributes(self):
+        """Gibt die an diesem Tag erwarteten Lieferungen zurück."""
+        return {
+            "deliveries": [_compact_delivery(delivery) for delivery in self._next_deliveries()[1]]
+        }
+
+
+async def async_setup_entry(hass, entry, async_add_entities):
+    """Richtet die Sensoren eines Konfigurationseintrags ein, alle teilen sich einen Scan."""
+    coordinator = hass.data[DOMAIN][entry.entry_id]
+    device_info = DeviceInfo(
+        identifiers={(DOMAIN, entry.entry_id)},
+        name=entry.title,
+        entry_type=DeviceEntryType.SERVICE,
+    )
+    entities = [
+        PackageDeliveriesSensor(coordinator, entry.entry_id, device_info),
+        PackageNextDeliverySensor(coordinator, f"{entry.entry_id}_next_delivery", device_info),
+    ]
+    entities.extend(
+        PackageCarrierSensor(coordinator, carrier.service, f"{entry.entry_id}_{carrier.service.lower()}", device_info)
+        for carrier in engine.CARRIERS
+    )
+    async_add_entities(entities)
+
 
 async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
-    """Richtet die Sensorplattform ein."""
+    """Richtet die Sensorplattform aus der YAML-Konfiguration ein."""
     if "name" not in config:
         raise ValueError("Das Feld 'name' ist für den package_deliveries-Sensor erforderlich.")
 
-    sensor = PackageDeliveriesSensor(hass, config)
-    async_add_entities([sensor], False)  # Verhindert sofortiges Update beim Setup
+    coordinator = PackageDeliveriesCoordinator(hass, config, slugify_name(config["name"]))
+    # Der letzte bekannte Stand ist sofort sichtbar, gescannt wird erst verzögert nach dem Start
+    await coordinator.async_restore()
+    async_add_entities([PackageDeliveriesSensor(coordinator, coordinator.slug)])
+
+    hass.data.setdefault(DOMAIN, {})
+    hass.data[DOMAIN][coordinator.slug] = coordinator
+
+    coordinator.async_start_delayed()
+
+    if config.get("metrics", False):
+        async_register_metrics_view(hass)
 
-    # Optional: Async-Initialisierung im Hintergrund
-    hass.loop.create_task(sensor.async_update())
+    async def async_stop_coordinator(event):
+        """Beendet beim Herunterfahren die IDLE-Sitzungen und Timer."""
+        await coordinator.async_stop()
 
-    hass.data.setdefault("package_deliveries", {})
-    hass.data["package_deliveries"][sensor.unique_id] = sensor
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, async_stop_coordinator)
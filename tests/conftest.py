@@ -0,0 +1,13 @@
+"""
+The engine in custom_scripts runs without Home Assistant; it is imported the way the CLI and
+the benchmarks run it, next to the IMAP stand-in, corpus and status stub in benchmarks/.
+"""
+
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "custom_components", "package_deliveries", "custom_scripts"))
+# Modules of the integration without Home Assistant imports, such as the scheduler
+sys.path.insert(0, os.path.join(ROOT, "custom_components", "package_deliveries"))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
@@ -0,0 +1,72 @@
+import os
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+import check_package_deliveries as engine
+from corpus import generate_corpus, write_eml
+from fake_imap import FakeConnectionPool, FakeIMAP4
+
+CORPUS = generate_corpus(120, 0.2, days=30, seed=2)
+
+
+@pytest.fixture(scope="module")
+def executor():
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        yield executor
+
+
+def options(**overrides):
+    return engine.scan_options("a@example", "secret", imap_server="imap.example", last_days=30, last_emails=1000, **overrides)
+
+
+def test_backfill_without_stats(executor):
+    serial = engine.scan_sources([options()], None, FakeConnectionPool(FakeIMAP4(CORPUS)))
+    backfill = engine.scan_sources([options(backfill=True, workers=2)], None, FakeConnectionPool(FakeIMAP4(CORPUS)), parse_executor=executor)
+    assert serial and backfill == serial
+
+
+def test_cli_backfill_of_a_local_source(tmp_path):
+    write_eml(CORPUS, str(tmp_path / "eml"))
+    output_file = tmp_path / "deliveries.json"
+    result = subprocess.run(
+        [sys.executable, engine.__file__, "--local_path", str(tmp_path / "eml"), "--last_days", "30",
+         "--output_file", str(output_file), "--backfill", "--workers", "2"],
+        capture_output=True, text=True, timeout=120,
+    )
+    assert result.returncode == 0, result.stderr
+    assert os.path.getsize(output_file) > 2
+
+
+def test_backfill_counts_like_a_serial_scan(executor):
+    serial_stats, backfill_stats = engine.ScanStats(), engine.ScanStats()
+    serial = engine.scan_sources([options()], None, FakeConnectionPool(FakeIMAP4(CORPUS)), stats=serial_stats)
+    backfill = engine.scan_sources(
+        [options(backfill=True, workers=2)], None, FakeConnectionPool(FakeIMAP4(CORPUS)), stats=backfill_stats, parse_executor=executor
+    )
+
+    assert backfill == serial
+    assert backfill_stats.counters == serial_stats.counters
+    assert {service: emails for service, (emails, _) in backfill_stats.carriers.items()} == \
+        {service: emails for service, (emails, _) in serial_stats.carriers.items()}
+
+
+def test_incremental_backfill_fills_the_cache(executor, tmp_path):
+    mail = FakeIMAP4(CORPUS)
+    state = engine.SyncStateStore(str(tmp_path / "state.db"), engine.PARSER_VERSION)
+    backfill = engine.scan_sources([options(backfill=True, workers=2)], state, FakeConnectionPool(mail), parse_executor=executor)
+
+    stats = engine.ScanStats()
+    assert engine.scan_sources([options()], state, FakeConnectionPool(mail), stats=stats) == backfill
+    assert stats.counters["emails_new"] == 0
+    assert stats.counters["cache_hits_uid"] > 0
+    state.close()
+
+
+def test_backfill_of_a_local_source(executor, tmp_path):
+    write_eml(CORPUS, str(tmp_path))
+    local = engine.scan_options(None, None, local_path=str(tmp_path), last_days=30)
+    serial = engine.scan_sources([local], None)
+    assert engine.scan_sources([engine.source_options(local, backfill=True, workers=2)], None, parse_executor=executor) == serial
@@ -0,0 +1,42 @@
+from datetime import date
+
+import pytest
+
+from dates import format_date, resolve_date
+
+
+@pytest.mark.parametrize("text, reference, expected", [
+    # Dates without a year are placed in the year nearest to the email
+    ("3. Januar", date(2024, 12, 28), date(2025, 1, 3)),
+    ("03.01.", date(2024, 12, 28), date(2025, 1, 3)),
+    ("30. Dezember", date(2025, 1, 2), date(2024, 12, 30)),
+    ("Dienstag, 3 September", date(2024, 9, 1), date(2024, 9, 3)),
+    ("September 4", date(2024, 9, 1), date(2024, 9, 4)),
+    ("mardi 3 septembre", date(2024, 9, 1), date(2024, 9, 3)),
+    ("29.02.", date(2024, 2, 27), date(2024, 2, 29)),
+    ("03.09.2023", date(2024, 9, 1), date(2023, 9, 3)),
+    ("2024-09-03", date(2024, 9, 1), date(2024, 9, 3)),
+])
+def test_resolve_date(text, reference, expected):
+    assert resolve_date(text, reference) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Morgen", date(2024, 12, 31)),
+    ("übermorgen", date(2025, 1, 1)),
+    ("tomorrow", date(2024, 12, 31)),
+    ("Freitag", date(2025, 1, 3)),
+])
+def test_resolve_relative_date_across_new_year(text, expected):
+    assert resolve_date(text, date(2024, 12, 30)) == expected
+
+
+def test_resolve_date_without_date():
+    assert resolve_date("Ihr Paket kommt bald", date(2024, 9, 1)) is None
+    assert resolve_date("", date(2024, 9, 1)) is None
+
+
+def test_format_date():
+    assert format_date(date(2024, 9, 4)) == "Mittwoch, 4. September"
+    assert format_date("2024-09-04", "en-GB") == "Wednesday, September 4"
+    assert format_date("Unknown") == "Unknown"
@@ -0,0 +1,66 @@
+from datetime import date
+
+from delivery_diff import delivery_key, diff_deliveries, has_changes
+from delivery_record import Delivery
+
+
+def parcel(number, delivery_date=date(2024, 9, 5)):
+    return Delivery.create("DHL", tracking_number=number, delivery_date=delivery_date)
+
+
+def never_delivered(delivery):
+    return False
+
+
+def only_a1_delivered(delivery):
+    return delivery.tracking_numbers == ("A1",)
+
+
+def test_delivery_key():
+    assert delivery_key(parcel("A1, B2")) == "A1, B2"
+    assert delivery_key(Delivery.create("Amazon", order_number="302-1")) == "Amazon:302-1"
+    assert delivery_key(Delivery.create("Hermes", email_date="2024-09-01 10:00")) == "Hermes:2024-09-01 10:00"
+    assert delivery_key(Delivery.create("Hermes")) == "Hermes:Unknown"
+
+
+def test_first_scan_adds_everything():
+    current, delivered, changes = diff_deliveries({}, [parcel("A1"), parcel("B2")], set(), never_delivered)
+    assert list(current) == ["A1", "B2"]
+    assert changes["added"] == [parcel("A1"), parcel("B2")]
+    assert not changes["updated"] and not changes["expired"] and delivered == set()
+
+
+def test_unchanged_scan_has_no_changes():
+    previous, _, _ = diff_deliveries({}, [parcel("A1")], set(), never_delivered)
+    _, _, changes = diff_deliveries(previous, [parcel("A1")], set(), never_delivered)
+    assert not has_changes(changes)
+
+
+def test_updated_and_expired_deliveries():
+    previous, _, _ = diff_deliveries({}, [parcel("A1"), parcel("B2")], set(), never_delivered)
+    current, _, changes = diff_deliveries(previous, [parcel("A1", date(2024, 9, 6))], set(), never_delivered)
+
+    assert changes["updated"] == [parcel("A1", date(2024, 9, 6))]
+    assert changes["expired"] == [parcel("B2")]
+    assert list(current) == ["A1"]
+
+
+def test_delivered_is_reported_once():
+    previous, delivered, changes = diff_deliveries({}, [parcel("A1"), parcel("B2")], set(), only_a1_delivered)
+    assert changes["delivered"] == [parcel("A1")]
+    assert delivered == {"A1"}
+
+    previous, delivered, changes = diff_deliveries(previous, [parcel("A1"), parcel("B2")], delivered, only_a1_delivered)
+    assert not has_changes(changes)
+
+    # Once expired, the parcel is forgotten
+    _, delivered, changes = diff_deliveries(previous, [parcel("B2")], delivered, only_a1_delivered)
+    assert changes["expired"] == [parcel("A1")]
+    assert delivered == set()
+
+
+def test_duplicate_keys_keep_the_first_delivery():
+    first = parcel("A1")
+    current, _, changes = diff_deliveries({}, [first, parcel("A1", date(2024, 9, 9))], set(), never_delivered)
+    assert current == {"A1": first}
+    assert changes["added"] == [first]
@@ -0,0 +1,51 @@
+from datetime import date
+from decimal import Decimal
+
+from delivery_merge import merge_deliveries
+from delivery_record import Carrier, Delivery
+
+
+def amazon(tracking, order, amount="EUR 12,99", items=("Buch",)):
+    return Delivery.create("Amazon", tracking_number=tracking, order_number=order, total_amount=amount,
+                           delivery_date=date(2024, 9, 5), items=list(items), email_date="2024-09-01 10:00")
+
+
+def dhl(tracking, delivery_date=date(2024, 9, 4)):
+    return Delivery.create("DHL", tracking_number=tracking, delivery_date=delivery_date, email_date="2024-09-02 08:00")
+
+
+def test_carrier_notification_joins_shop_record():
+    merged = merge_deliveries([amazon("JJD 0001-2", "302-1"), dhl("jjd00012")])
+
+    assert len(merged) == 1
+    delivery = merged[0]
+    assert delivery.service == Carrier.AMAZON
+    assert delivery.order_numbers == ("302-1",)
+    assert delivery.items == ("Buch",)
+    # The carrier's date beats the shop's estimate
+    assert delivery.delivery_date == date(2024, 9, 4)
+
+
+def test_record_listing_several_numbers_joins_all():
+    merged = merge_deliveries([dhl("A1"), amazon("A1, B2", "302-1"), dhl("B2")])
+    assert len(merged) == 1
+    assert merged[0].tracking_numbers == ("A1", "B2")
+
+
+def test_parcels_of_one_order_stay_separate_and_count_the_total_once():
+    confirmation = Delivery.create("Amazon", order_number="302-1", total_amount="EUR 20,00", email_date="2024-09-01 09:00")
+    merged = merge_deliveries([amazon("A1", "302-1", "EUR 20,00"), amazon("B2", "302-1", "EUR 20,00"), confirmation])
+
+    assert [delivery.tracking_numbers for delivery in merged] == [("A1",), ("B2",)]
+    assert merged[0].total_amount == (Decimal("20.00"), "EUR")
+
+
+def test_records_without_references_are_not_merged():
+    first = Delivery.create("Hermes", email_date="2024-09-01 10:00")
+    second = Delivery.create("Hermes", email_date="2024-09-02 10:00")
+    assert merge_deliveries([first, second]) == [first, second]
+
+
+def test_order_of_first_appearance_is_kept():
+    merged = merge_deliveries([dhl("C3"), dhl("A1"), amazon("C3", "302-9")])
+    assert [delivery.tracking_numbers[0] for delivery in merged] == ["C3", "A1"]
@@ -0,0 +1,121 @@
+import os
+
+import pytest
+
+import check_package_deliveries as engine
+from corpus import generate_corpus, write_eml
+from fake_imap import FakeConnectionPool, FakeIMAP4
+from local_mail import EmlDirectoryMailbox, MaildirMailbox, MboxMailbox, mapped_file, open_local_mailbox
+
+CORPUS = generate_corpus(120, 0.2, days=30, seed=3)
+ENVELOPE = b"From MAILER-DAEMON Mon Sep  2 10:00:00 2024\n"
+
+
+def write_mbox(messages, path, mode="wb"):
+    with open(path, mode) as mbox_file:
+        for message in messages:
+            mbox_file.write(ENVELOPE + message.as_bytes() + b"\n")
+
+
+def write_maildir(messages, path):
+    for subdirectory in ("cur", "new", "tmp"):
+        os.makedirs(os.path.join(path, subdirectory), exist_ok=True)
+    for index, message in enumerate(messages):
+        with open(os.path.join(path, "new", f"{index}.host"), "wb") as mail_file:
+            mail_file.write(message.as_bytes())
+
+
+def by_key(deliveries):
+    # Maildir files are listed in directory order, parcels due the same day may swap places
+    return {engine.delivery_key(delivery): delivery for delivery in deliveries}
+
+
+def scan(path, state=None, stats=None):
+    return engine.scan_sources([engine.scan_options(None, None, local_path=str(path), last_days=30)], state, stats=stats)
+
+
+@pytest.fixture(scope="module")
+def expected():
+    return engine.scan_sources(
+        [engine.scan_options("a@example", "secret", imap_server="imap.example", last_days=30, last_emails=1000)],
+        None, FakeConnectionPool(FakeIMAP4(CORPUS)),
+    )
+
+
+@pytest.fixture
+def state(tmp_path):
+    store = engine.SyncStateStore(str(tmp_path / "state.db"), engine.PARSER_VERSION)
+    yield store
+    store.close()
+
+
+def test_open_local_mailbox(tmp_path):
+    write_maildir(CORPUS[:1], str(tmp_path / "maildir"))
+    write_eml(CORPUS[:1], str(tmp_path / "eml"))
+    write_mbox(CORPUS[:1], str(tmp_path / "mbox"))
+
+    assert isinstance(open_local_mailbox(str(tmp_path / "maildir")), MaildirMailbox)
+    assert isinstance(open_local_mailbox(str(tmp_path / "eml")), EmlDirectoryMailbox)
+    assert isinstance(open_local_mailbox(str(tmp_path / "mbox")), MboxMailbox)
+
+
+def test_mbox_messages_leave_out_the_envelope(tmp_path):
+    path = str(tmp_path / "mbox")
+    write_mbox(CORPUS[:3], path)
+    with mapped_file(path) as data:
+        messages = [data[begin:end] for begin, end in MboxMailbox(path).messages(data)]
+    assert messages == [message.as_bytes() + b"\n" for message in CORPUS[:3]]
+
+
+@pytest.mark.parametrize("write", [write_eml, write_maildir, write_mbox])
+def test_local_sources_find_the_same_deliveries_as_imap(tmp_path, expected, write):
+    path = str(tmp_path / "mail")
+    write(CORPUS, path)
+    assert by_key(scan(path)) == by_key(expected)
+
+
+def test_grown_mbox_is_read_from_its_previous_end(tmp_path, state, expected):
+    path = str(tmp_path / "mbox")
+    write_mbox(CORPUS[:60], path)
+    scan(path, state)
+
+    write_mbox(CORPUS[60:], path, mode="ab")
+    stats = engine.ScanStats()
+    assert scan(path, state, stats) == expected
+    assert stats.counters["emails_new"] == len(CORPUS) - 60
+
+
+def test_rewritten_mbox_is_read_again(tmp_path, state, expected):
+    path = str(tmp_path / "mbox")
+    write_mbox(CORPUS, path)
+    assert scan(path, state) == expected
+
+    # Deleting messages rewrites the file, the remaining ones are read again
+    write_mbox(CORPUS[:1], path)
+    stats = engine.ScanStats()
+    assert scan(path, state, stats) == scan(path)
+    assert stats.counters["emails_new"] == 1
+
+
+def test_maildir_rename_keeps_the_deliveries(tmp_path, state, expected):
+    path = str(tmp_path / "maildir")
+    write_maildir(CORPUS, path)
+    assert by_key(scan(path, state)) == by_key(expected)
+
+    # A mail client marks the messages as seen
+    for name in os.listdir(os.path.join(path, "new")):
+        os.rename(os.path.join(path, "new", name), os.path.join(path, "cur", f"{name}:2,S"))
+    stats = engine.ScanStats()
+    assert by_key(scan(path, state, stats)) == by_key(expected)
+    assert stats.counters.get("files_new", 0) == 0
+    assert "emails_new" not in stats.counters
+
+
+def test_deleted_files_drop_their_deliveries(tmp_path, state, expected):
+    path = str(tmp_path / "eml")
+    write_eml(CORPUS, path)
+    assert scan(path, state) == expected
+
+    for name in os.listdir(path):
+        os.remove(os.path.join(path, name))
+    assert scan(path, state) == []
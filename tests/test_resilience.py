@@ -0,0 +1,115 @@
+import pytest
+
+from resilience import (
+    CLOSED, HALF_OPEN, OPEN, AccountGuards, Backoff, CircuitBreaker, CircuitOpenError, RateLimitedError,
+    ScanTokens, TokenBucket,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_token_bucket_allows_bursts_then_the_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=0.5, capacity=2, clock=clock, sleep=clock.sleep)
+
+    assert bucket.acquire(0) and bucket.acquire(0)
+    assert not bucket.acquire(0)
+    # Waiting for the next token sleeps until it is refilled
+    assert bucket.acquire(max_wait=5)
+    assert clock.now == pytest.approx(2.0)
+    assert not bucket.acquire(max_wait=1)
+
+
+def test_token_bucket_without_rate_is_unlimited():
+    bucket = TokenBucket(rate=0, capacity=1)
+    assert all(bucket.acquire(0) for _ in range(100))
+
+
+def test_backoff_grows_with_jitter_and_is_capped():
+    clock = FakeClock()
+    backoff = Backoff(base=5, maximum=60, clock=clock, jitter=lambda: 1.0)
+    assert [backoff.failure() for _ in range(5)] == [5, 10, 20, 40, 60]
+    assert backoff.remaining() == 60
+
+    low = Backoff(base=5, maximum=60, clock=clock, jitter=lambda: 0.0)
+    assert low.failure() == 2.5
+
+    backoff.success()
+    assert backoff.remaining() == 0
+
+
+def test_circuit_breaker_opens_and_lets_one_trial_through():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, backoff=Backoff(base=10, clock=clock, jitter=lambda: 1.0))
+
+    breaker.record_failure()
+    assert breaker.state == CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN and not breaker.allow()
+    assert breaker.as_dict() == {"state": OPEN, "failures": 2, "retry_in": 10}
+
+    clock.now = 10
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    # Only one trial at a time
+    assert not breaker.allow()
+
+    # A failed trial opens the breaker for longer
+    breaker.record_failure()
+    assert breaker.state == OPEN and breaker.as_dict()["retry_in"] == 20
+
+    clock.now = 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.as_dict() == {"state": CLOSED, "failures": 0, "retry_in": 0}
+
+
+def test_account_guard_counts_only_failures():
+    guards = AccountGuards(rate=0, failure_threshold=1)
+    guard = guards.guard("imap.example", "a@example")
+
+    with pytest.raises(ValueError):
+        with guard.attempt((OSError,)):
+            raise ValueError("not an account failure")
+    assert guards.breaker_state("imap.example", "a@example")["state"] == CLOSED
+
+    with pytest.raises(OSError):
+        with guard.attempt((OSError,)):
+            raise OSError("connection refused")
+    assert guards.breaker_state("imap.example", "a@example")["state"] == OPEN
+    with pytest.raises(CircuitOpenError):
+        with guard.attempt((OSError,)):
+            pass
+
+
+def test_scan_tokens_charge_an_account_once_per_scan():
+    guards = AccountGuards(rate=0.0001, capacity=1, max_wait=0)
+    guard = guards.guard("imap.example", "a@example")
+
+    tokens = ScanTokens()
+    for _ in range(3):
+        with guard.attempt((OSError,), tokens):
+            pass
+
+    with pytest.raises(RateLimitedError):
+        with guard.attempt((OSError,), ScanTokens()):
+            pass
+
+
+def test_configure_overrides_the_limits_of_one_account():
+    guards = AccountGuards(rate=0.0001, capacity=1, max_wait=0)
+    guards.configure("imap.example", "a@example", rate=0)
+    guard = guards.guard("imap.example", "a@example")
+    for _ in range(3):
+        with guard.attempt((OSError,)):
+            pass
+    assert guards.breaker_state("imap.example", "b@example") == {"state": CLOSED, "failures": 0, "retry_in": 0}
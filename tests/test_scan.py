@@ -0,0 +1,143 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime
+
+import pytest
+
+import check_package_deliveries as engine
+from corpus import CorpusMessage, generate_corpus
+from fake_imap import FakeConnectionPool, FakeIMAP4
+from resilience import OPEN, AccountGuards, CircuitOpenError
+
+NOW = datetime.now(timezone.utc)
+CORPUS = generate_corpus(150, 0.2, days=30, seed=1, now=NOW)
+
+
+def message(sender, subject, body, content_type="text/plain; charset=utf-8"):
+    headers = (
+        f"From: {sender}\r\nSubject: {subject}\r\nDate: {format_datetime(NOW)}\r\n"
+        f"Message-ID: <{abs(hash((sender, subject)))}@test>\r\nContent-Type: {content_type}\r\n"
+    )
+    return CorpusMessage(NOW, headers.encode(), body.encode())
+
+
+def options(**overrides):
+    return engine.scan_options("a@example", "secret", imap_server="imap.example", last_days=30, last_emails=1000, **overrides)
+
+
+class ThrottledIMAP4(FakeIMAP4):
+    """Answers UID SEARCH with NO once throttled, like a server enforcing a rate limit."""
+
+    throttled = False
+
+    def uid(self, command, *args):
+        if self.throttled and command.upper() == "SEARCH":
+            return "NO", [b"[THROTTLED] Too many requests"]
+        return super().uid(command, *args)
+
+
+@pytest.fixture(scope="module")
+def expected():
+    return len(engine.scan_sources([options()], None, FakeConnectionPool(FakeIMAP4(CORPUS))))
+
+
+def test_decode_mime_subject_with_unknown_charset():
+    assert engine.decode_mime_subject("=?unknown-8bit?Q?Gro=C3=9Fe_Aktion?=") == "Große Aktion"
+    assert engine.decode_mime_subject("=?utf-8?B?/w==?=") == "�"
+
+
+@pytest.mark.parametrize("search_mode", ["client", "server"])
+def test_undecodable_emails_do_not_abort_the_scan(expected, search_mode):
+    broken = [
+        message("news@shop.example", "=?unknown-8bit?Q?Gro=DFe_Aktion?=", "Hallo"),
+        message("news@shop.example", "=?utf-8?B?/w==?= Angebot", "Hallo"),
+        message(
+            "DHL Paket <noreply@dhl.de>", "Ihre Sendung ist unterwegs",
+            "Ihre Sendung kommt voraussichtlich am Montag, den 01.01.\r\n"
+            "https://www.dhl.de/de/privatkunden.html?piececode=00340434161234567890&lang=de\r\n",
+            content_type="text/plain; charset=x-klingon",
+        ),
+    ]
+    deliveries = engine.scan_sources([options(search_mode=search_mode)], None, FakeConnectionPool(FakeIMAP4(CORPUS + broken)))
+    assert len(deliveries) == expected + 1
+    assert any("00340434161234567890" in delivery.tracking_numbers for delivery in deliveries)
+
+
+@pytest.mark.parametrize("sender, subject, service", [
+    ("DHL Paket <noreply@dhl.de>", "Ihre Sendung ist unterwegs", "DHL"),
+    ("UPS <mcinfo@ups.com>", "UPS Update: Paketzustellung", "UPS"),
+    ("Hermes <noreply@myhermes.de>", "Hermes Sendung unterwegs", "Hermes"),
+    ("GLS <noreply@mail.gls-pakete.de>", "Ihr GLS Paket kommt", "GLS"),
+    ("Digest <noreply@googlegroups.com>", "UPS Update: Paketzustellung", None),
+    ("Newsletter <news@hermes-fans.example>", "Hermes Sendung", None),
+    ("Groups <noreply@ups.com>", "GROUPS digest", None),
+])
+def test_carrier_matching(sender, subject, service):
+    assert engine.match_delivery_service(sender, subject) == service
+
+
+def test_notification_without_tracking_number_is_ignored():
+    newsletter = message("Hermes <noreply@myhermes.de>", "Hermes Sendung: Neuigkeiten", "Jetzt Paketshop finden!")
+    assert not engine.process_message(newsletter.as_bytes())
+
+
+def test_incremental_scan_only_fetches_new_emails(expected, tmp_path):
+    mail = FakeIMAP4(CORPUS)
+    pool = FakeConnectionPool(mail)
+    state = engine.SyncStateStore(str(tmp_path / "state.db"), engine.PARSER_VERSION)
+    first = engine.scan_sources([options()], state, pool)
+    full_bytes = mail.bytes_sent
+
+    mail.bytes_sent = 0
+    assert engine.scan_sources([options()], state, pool) == first
+    assert mail.bytes_sent < full_bytes / 10
+
+    mail.append(message(
+        "DHL Paket <noreply@dhl.de>", "Ihre Sendung ist unterwegs",
+        "https://www.dhl.de/de/privatkunden.html?piececode=00340434169999999999&lang=de\r\n",
+    ))
+    assert len(engine.scan_sources([options()], state, pool)) == expected + 1
+    state.close()
+
+
+def test_failing_source_makes_the_scan_incomplete(expected, tmp_path):
+    pool = FakeConnectionPool(FakeIMAP4(CORPUS))
+    missing = engine.source_options(options(), local_path=str(tmp_path / "missing"))
+
+    with pytest.raises(engine.IncompleteScanError) as error:
+        engine.scan_sources([options(), missing], None, pool)
+    assert len(error.value.deliveries) == expected
+    assert len(error.value.errors) == 1
+
+    with pytest.raises(Exception) as error:
+        engine.scan_sources([missing], None, pool)
+    assert not isinstance(error.value, engine.IncompleteScanError)
+
+
+def test_throttled_search_fails_the_scan(expected, tmp_path):
+    mail = ThrottledIMAP4(CORPUS)
+    pool = FakeConnectionPool(mail)
+    state = engine.SyncStateStore(str(tmp_path / "state.db"), engine.PARSER_VERSION)
+    guards = AccountGuards(rate=0, failure_threshold=2)
+    assert len(engine.scan_sources([options()], state, pool, guards=guards)) == expected
+
+    mail.throttled = True
+    for _ in range(2):
+        with pytest.raises(engine.imaplib.IMAP4.error):
+            engine.scan_sources([options()], state, pool, guards=guards)
+    assert guards.breaker_state("imap.example", "a@example")["state"] == OPEN
+
+    # While the breaker is open the cached deliveries are served without contacting the server
+    commands = mail.commands
+    assert len(engine.scan_sources([options()], state, pool, guards=guards)) == expected
+    assert mail.commands == commands
+    state.close()
+
+
+def test_open_breaker_without_cache_fails():
+    mail = ThrottledIMAP4(CORPUS)
+    mail.throttled = True
+    guards = AccountGuards(rate=0, failure_threshold=1)
+    with pytest.raises(engine.imaplib.IMAP4.error):
+        engine.scan_sources([options()], None, FakeConnectionPool(mail), guards=guards)
+    with pytest.raises(CircuitOpenError):
+        engine.scan_sources([options()], None, FakeConnectionPool(mail), guards=guards)
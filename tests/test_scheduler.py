@@ -0,0 +1,56 @@
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+from delivery_record import Delivery
+from scheduler import AdaptiveScheduler
+
+MINUTES = timedelta(minutes=1)
+NOON = datetime(2024, 9, 4, 12, 0, tzinfo=timezone.utc)
+
+
+def parcel(delivery_date):
+    return Delivery.create("DHL", tracking_number="A1", delivery_date=delivery_date)
+
+
+@pytest.fixture
+def scheduler():
+    return AdaptiveScheduler(min_interval=3 * MINUTES, max_interval=120 * MINUTES, notification_hours=(6, 21))
+
+
+def test_delivery_today_polls_at_the_minimum(scheduler):
+    for _ in range(10):
+        scheduler.record_scan(changed=False)
+    assert scheduler.next_interval([parcel(date(2024, 9, 4))], NOON) == 3 * MINUTES
+
+
+def test_quiet_scans_back_off_exponentially_up_to_the_maximum(scheduler):
+    intervals = []
+    for _ in range(8):
+        intervals.append(scheduler.next_interval([], NOON))
+        scheduler.record_scan(changed=False)
+    assert intervals == [minutes * MINUTES for minutes in (3, 6, 12, 24, 48, 96, 120, 120)]
+
+    scheduler.record_scan(changed=True)
+    assert scheduler.next_interval([], NOON) == 3 * MINUTES
+
+
+@pytest.mark.parametrize("delivery_date", [date(2024, 9, 6), None])
+def test_parcels_in_transit_halve_the_maximum(scheduler, delivery_date):
+    for _ in range(20):
+        scheduler.record_scan(changed=False)
+    assert scheduler.next_interval([parcel(delivery_date)], NOON) == 60 * MINUTES
+    # Parcels due in the past are no longer in transit
+    assert scheduler.next_interval([parcel(date(2024, 9, 1))], NOON) == 120 * MINUTES
+
+
+def test_outside_notification_hours_waits_for_their_start(scheduler):
+    assert scheduler.next_interval([parcel(date(2024, 9, 5))], NOON.replace(hour=5, minute=30)) == 30 * MINUTES
+    assert scheduler.next_interval([parcel(date(2024, 9, 5))], NOON.replace(hour=23)) == 120 * MINUTES
+    assert scheduler.next_interval([], NOON.replace(hour=5, minute=59)) == 3 * MINUTES
+
+
+def test_max_interval_is_at_least_the_minimum():
+    scheduler = AdaptiveScheduler(min_interval=10 * MINUTES, max_interval=5 * MINUTES)
+    assert scheduler.max_interval == 10 * MINUTES
+    assert scheduler.next_interval([], NOON) == 10 * MINUTES
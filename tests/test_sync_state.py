@@ -0,0 +1,108 @@
+from datetime import date
+
+import pytest
+
+from delivery_record import Delivery
+from sync_state import SyncStateStore
+
+MAILBOX = ("a@example", "imap.example", "INBOX")
+
+
+@pytest.fixture
+def state(tmp_path):
+    store = SyncStateStore(str(tmp_path / "sync_state.db"), parser_version=1)
+    yield store
+    store.close()
+
+
+def record(number):
+    return [Delivery.create("DHL", tracking_number=number, delivery_date=date(2024, 9, 3), email_date="2024-09-01 10:00")]
+
+
+def test_cursor_is_kept_per_uidvalidity(state):
+    assert state.last_uid(*MAILBOX, 7) == 0
+    state.set_last_uid(*MAILBOX, 7, 42)
+    assert state.last_uid(*MAILBOX, 7) == 42
+    # A new UIDVALIDITY invalidates the UIDs, the scan starts over
+    assert state.last_uid(*MAILBOX, 8) == 0
+
+
+def test_cursor_is_kept_per_mailbox(state):
+    state.set_last_uid(*MAILBOX, 7, 42)
+    assert state.last_uid("a@example", "imap.example", "Archiv", 7) == 0
+    assert state.last_uid("b@example", "imap.example", "INBOX", 7) == 0
+
+
+def test_cursor_survives_reopening(tmp_path):
+    path = str(tmp_path / "sync_state.db")
+    store = SyncStateStore(path, parser_version=1)
+    store.set_last_uid(*MAILBOX, 7, 42)
+    store.save()
+    store.close()
+
+    store = SyncStateStore(path, parser_version=1)
+    assert store.last_uid(*MAILBOX, 7) == 42
+    store.close()
+
+
+def test_cursor_of_another_parser_version_starts_over(tmp_path):
+    path = str(tmp_path / "sync_state.db")
+    old = SyncStateStore(path, parser_version=1)
+    old.set_last_uid(*MAILBOX, 7, 42)
+    old.save()
+    old.close()
+
+    new = SyncStateStore(path, parser_version=2)
+    assert new.last_uid(*MAILBOX, 7) == 0
+    new.close()
+
+
+def test_records_of_another_parser_version_are_not_used(tmp_path):
+    path = str(tmp_path / "sync_state.db")
+    old = SyncStateStore(path, parser_version=1)
+    old.store_records(*MAILBOX, 7, 1, "<m1@x>", "2024-09-01", record("A1"))
+    old.save()
+    old.close()
+
+    new = SyncStateStore(path, parser_version=2)
+    assert new.cached_records(*MAILBOX, 7, [1]) == {}
+    assert new.records_by_message_id("<m1@x>") is None
+    assert new.mailbox_records(*MAILBOX, date(2024, 1, 1)) is None
+    new.close()
+
+
+def test_records_are_found_by_uid_and_message_id(state):
+    state.store_records(*MAILBOX, 7, 1, "<m1@x>", "2024-09-01", record("A1"))
+    state.store_records(*MAILBOX, 7, 2, "<m2@x>", "2024-09-02", record("B2"))
+
+    assert state.cached_records(*MAILBOX, 7, [1, 2, 3]) == {1: record("A1"), 2: record("B2")}
+    assert state.records_by_message_id("<m2@x>") == record("B2")
+    assert state.records_by_message_id(None) is None
+
+
+def test_evict_drops_emails_outside_the_window(state):
+    state.set_last_uid(*MAILBOX, 7, 2)
+    state.store_records(*MAILBOX, 7, 1, "<m1@x>", "2024-08-01", record("A1"))
+    state.store_records(*MAILBOX, 7, 2, "<m2@x>", "2024-09-02", record("B2"))
+
+    state.evict(*MAILBOX, date(2024, 9, 1))
+
+    assert list(state.cached_records(*MAILBOX, 7, [1, 2])) == [2]
+    assert state.mailbox_records(*MAILBOX, date(2024, 1, 1)) == record("B2")
+    # The cursor is not moved back by eviction
+    assert state.last_uid(*MAILBOX, 7) == 2
+
+
+def test_tracking_statuses_survive_a_parser_change(tmp_path):
+    path = str(tmp_path / "sync_state.db")
+    old = SyncStateStore(path, parser_version=1)
+    old.store_tracking_status("A1", "transit", "unterwegs", 100.0)
+    old.save()
+    old.close()
+
+    new = SyncStateStore(path, parser_version=2)
+    status = new.tracking_statuses()["A1"]
+    assert (status.status, status.checked) == ("transit", 100.0)
+    new.forget_tracking_statuses(["A1"])
+    assert new.tracking_statuses() == {}
+    new.close()
@@ -0,0 +1,86 @@
+import pytest
+
+from delivery_record import Delivery
+from status_stub import StubStatusServer
+from tracking_status import JsonStatusProvider, StatusTracker, TrackingStatus, delivery_status, normalize_status
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def parcels(*numbers):
+    return [Delivery.create("DHL", tracking_number=number) for number in numbers]
+
+
+# The stub leaves out numbers whose CRC32 is divisible by 10, these ones it knows
+KNOWN = ["JJD0001", "JJD0002", "JJD0003"]
+
+
+@pytest.fixture
+def stub():
+    with StubStatusServer(max_batch=2) as server:
+        yield server
+
+
+def test_lookups_are_batched_and_cached_for_the_ttl(stub):
+    clock = FakeClock()
+    tracker = StatusTracker([JsonStatusProvider(stub.url, batch_size=2, rate=0)], ttl=60, clock=clock)
+
+    statuses = tracker.update(parcels(*KNOWN))
+    assert {number: status.status for number, status in statuses.items()} == dict.fromkeys(KNOWN, "pre_transit")
+    assert (stub.requests, stub.lookups) == (2, 3)
+
+    clock.now += 59
+    tracker.update(parcels(*KNOWN))
+    assert stub.requests == 2
+
+    clock.now += 1
+    statuses = tracker.update(parcels(*KNOWN))
+    assert stub.requests == 4
+    assert statuses["JJD0001"].status == "transit"
+
+
+def test_delivered_parcels_drop_out_of_polling(stub):
+    clock = FakeClock()
+    tracker = StatusTracker([JsonStatusProvider(stub.url, batch_size=2, rate=0)], ttl=0, clock=clock)
+
+    for _ in range(4):
+        clock.now += 1
+        statuses = tracker.update(parcels(*KNOWN))
+    assert all(status.delivered for status in statuses.values())
+    requests = stub.requests
+
+    clock.now += 1000
+    tracker.update(parcels(*KNOWN))
+    assert stub.requests == requests
+
+
+def test_numbers_no_longer_found_are_dropped(stub):
+    tracker = StatusTracker([JsonStatusProvider(stub.url, rate=0)], clock=FakeClock())
+    tracker.update(parcels(*KNOWN))
+    assert set(tracker.update(parcels("JJD0001"))) == {"JJD0001"}
+
+
+def test_failing_provider_does_not_fail_the_update():
+    tracker = StatusTracker([JsonStatusProvider("http://127.0.0.1:9/track", rate=0, timeout=1)], clock=FakeClock())
+    assert tracker.update(parcels("JJD0001")) == {}
+
+
+def test_delivery_status_needs_all_numbers_delivered():
+    delivery = Delivery.create("DHL", tracking_number="A1, B2")
+    delivered, transit = TrackingStatus("delivered"), TrackingStatus("transit")
+
+    assert delivery_status(delivery, {}) is None
+    assert delivery_status(delivery, {"A1": delivered}) is delivered
+    assert delivery_status(delivery, {"A1": delivered, "B2": transit}) is transit
+    assert delivery_status(delivery, {"A1": delivered, "B2": delivered}).delivered
+
+
+def test_normalize_status():
+    assert normalize_status("Out-For-Delivery") == "out_for_delivery"
+    assert normalize_status("lost in space") == "unknown"